@@ -221,9 +221,30 @@ def main_simul(yml_files: list,
                diagram: bool=False,
                diagram_title: str=None,
                diagram_filename: str=None,
-               diagram_colors_on: bool=False):
-
-    if mpi:
+               diagram_colors_on: bool=False,
+               profile_objects: bool=False,
+               procs: int=1,
+               resume: str=None,
+               plan: bool=False,
+               comm=None):
+
+    if resume is not None and nsimul > 1:
+        raise ValueError('The resume option can only be used with a single simulation')
+
+    if procs > 1 and comm is None:
+        if mpi:
+            raise ValueError('The procs and mpi options cannot be used together')
+        # Launch one local process for each rank, connected through shared memory.
+        # Each process calls again this function with its own communicator.
+        kwargs = dict(locals())
+        del kwargs['comm']
+        from specula.lib.shm_transport import run_processes
+        run_processes(procs, kwargs)
+        return
+
+    if comm is not None:
+        rank = comm.Get_rank()
+    elif mpi:
         try:
             from mpi4py import MPI
             from mpi4py.util import pkl5
@@ -259,17 +280,23 @@ def main_simul(yml_files: list,
         pr = cProfile.Profile()
         pr.enable()
 
+    # A single Simul instance is reused for all runs, so that
+    # reusable calibration data is only loaded once
+    simul = Simul(*yml_files,
+                  overrides=overrides,
+                  stepping=stepping,
+                  diagram=diagram,
+                  diagram_filename=diagram_filename,
+                  diagram_title=diagram_title,
+                  diagram_colors_on=diagram_colors_on,
+                  profile_objects=profile_objects,
+                  resume=resume,
+                  plan=plan
+    )
     for simul_idx in range(nsimul):
         print(yml_files)
-        Simul(*yml_files,
-            simul_idx=simul_idx,
-            overrides=overrides,
-            stepping=stepping,
-            diagram=diagram,
-            diagram_filename=diagram_filename,
-            diagram_title=diagram_title,
-            diagram_colors_on=diagram_colors_on
-        ).run()
+        simul.reset(simul_idx=simul_idx, overrides=overrides)
+        simul.run()
 
     if profile:
         pr.disable
@@ -5,6 +5,7 @@ from functools import lru_cache
 
 from specula import cp, np, array_types
 from specula.base_time_obj import BaseTimeObj
+from specula.lib.checkpoint import to_state, from_state
 
 
 # We use lru_cache() instead of cache() for python 3.8 compatibility
@@ -18,6 +19,15 @@ def get_properties(cls):
 
 
 class BaseDataObj(BaseTimeObj):
+
+    # Set to True in classes whose restored data is never modified in place,
+    # so that Simul can share the same arrays between consecutive runs
+    reusable = False
+
+    # Processing objects reading this data object as a local input,
+    # marked as dirty every time generation_time is set. See add_consumer()
+    _consumers = ()
+
     def __init__(self, target_device_idx=None, precision=None):
         """
         Initialize the base data object.
@@ -33,6 +43,54 @@ class BaseDataObj(BaseTimeObj):
         self.generation_time = -1
         self.tag = ''
 
+    @property
+    def generation_time(self):
+        return self._generation_time
+
+    @generation_time.setter
+    def generation_time(self, value):
+        self._generation_time = value
+        for obj in self._consumers:
+            obj.inputs_dirty = True
+
+    def add_consumer(self, obj):
+        '''
+        Register processing object *obj* to be marked as dirty
+        (obj.inputs_dirty = True) when this object's generation_time is set
+        '''
+        if obj not in self._consumers:
+            self._consumers = self._consumers + (obj,)
+
+    def __getstate__(self):
+        # Consumers are local to this process, and copies
+        # (including remote ones) must not mark them as dirty
+        state = super().__getstate__()
+        state.pop('_consumers', None)
+        return state
+
+    def get_state(self):
+        '''
+        Return a snapshot of the dynamic state of this object,
+        used by simulation checkpoints (see specula.lib.checkpoint).
+        The default implementation saves all CPU/GPU arrays
+        and the generation time.
+        '''
+        pp = get_properties(type(self))
+        state = {}
+        for attr in dir(self):
+            if attr not in pp and type(getattr(self, attr)) in array_types:
+                state[attr] = to_state(getattr(self, attr))
+        state['generation_time'] = self.generation_time
+        return state
+
+    def set_state(self, state):
+        '''
+        Restore a snapshot returned by get_state(). Arrays with unchanged
+        shape and dtype are overwritten in place.
+        '''
+        for attr, value in state.items():
+            setattr(self, attr, from_state(value, getattr(self, attr, None), self.xp))
+
     def transferDataTo(self, destobj, force_reallocation=False):
         '''
         Copy CPU/GPU arrays into an existing data object:
@@ -5,12 +5,21 @@ from specula import show_in_profiler
 from specula import process_comm, process_rank
 from specula.base_time_obj import BaseTimeObj
 from specula.data_objects.layer import Layer
+from specula.lib.checkpoint import to_state, from_state
 
 
 class BaseProcessingObj(BaseTimeObj):
 
     _streams = {}
 
+    # Attributes holding the dynamic state of this object, saved
+    # in simulation checkpoints together with all outputs. See get_state()
+    checkpoint_attrs = ()
+
+    # Set to True in classes with side effects (e.g. saving data to disk),
+    # which are never removed when pruning the simulation graph. See Simul.prune()
+    sink = False
+
     def __init__(self, target_device_idx=None, precision=None):
         """
         Initialize the base processing object.
@@ -31,12 +40,21 @@ class BaseProcessingObj(BaseTimeObj):
         self.inputs_changed = False
         self.cuda_graph = None
 
+        # Event-driven scheduling, see enable_event_driven()
+        self.event_driven = False
+        self.inputs_dirty = True
+
+        # Multi-rate scheduling, see set_trigger_period()
+        self.trigger_period = None
+        self.trigger_phase = 0
+
         # Will be populated by derived class
         self.inputs = {}
         self.local_inputs = {}
         self.outputs = {}
         self.remote_outputs = defaultdict(list)
         self.sent_valid = {}
+        self.send_packets = []
 
         # Use the correct CUDA device for allocations in derived classes'  __init__
         if self.target_device_idx >= 0:
@@ -54,6 +72,96 @@ class BaseProcessingObj(BaseTimeObj):
     def addRemoteOutput(self, name, remote_output):
         self.remote_outputs[name].append(remote_output)
 
+    def enable_event_driven(self):
+        '''
+        Register this object as a consumer of all its inputs, so that
+        their producers mark it as dirty when they update them, and
+        LoopControl can skip it without checking its inputs when it is not.
+
+        Objects that have no inputs, remote inputs (which must be received
+        at every step) or a custom readiness check are never skipped.
+        Returns True if event-driven scheduling was enabled.
+        '''
+        cls = type(self)
+        if cls.check_ready is not BaseProcessingObj.check_ready or \
+           cls.checkInputTimes is not BaseProcessingObj.checkInputTimes:
+            return False
+
+        items = []
+        for input_obj in self.inputs.values():
+            items.extend(getattr(input_obj, 'input_values', [None]))
+        if len(items) == 0:
+            return False
+        for item in items:
+            if item is None or item.remote_rank is not None or item.output_ref is None:
+                return False
+
+        for item in items:
+            item.output_ref.add_consumer(self)
+        self.event_driven = True
+        return True
+
+    def set_trigger_period(self, period, phase=0):
+        '''
+        Declare that this object only needs to run at times
+        *phase* + k * *period* (in seconds, k >= 0). LoopControl does not check
+        it at any other time, and can jump over the steps where
+        no object needs to run.
+        '''
+        if period <= 0:
+            raise ValueError(f'Trigger period must be positive instead of {period}')
+        if phase < 0:
+            raise ValueError(f'Trigger phase must not be negative instead of {phase}')
+        self.trigger_period = self.seconds_to_t(period)
+        self.trigger_phase = self.seconds_to_t(phase)
+
+    def next_trigger_time(self, t):
+        '''
+        Return the first time >= *t* at which this object may run,
+        or None if it has no trigger period.
+        '''
+        if self.trigger_period is None:
+            return None
+        k = max(-((self.trigger_phase - t) // self.trigger_period), 0)
+        return self.trigger_phase + k * self.trigger_period
+
+    def estimate_flops(self):
+        '''
+        Override this method to return the number of floating point
+        operations of a single trigger, as a dictionary with the 'fft' and
+        'matmul' keys (see specula.lib.plan). Called after setup().
+        The default implementation returns None (no estimate).
+        '''
+        return None
+
+    def get_state(self):
+        '''
+        Return a snapshot of the dynamic state of this object, used by
+        simulation checkpoints (see specula.lib.checkpoint): the current time,
+        the attributes listed in *checkpoint_attrs* and all outputs.
+        Attributes that have not been allocated yet are skipped.
+        '''
+        state = {'current_time': self.current_time, 'attrs': {}, 'outputs': {}}
+        for attr in self.checkpoint_attrs:
+            if hasattr(self, attr):
+                state['attrs'][attr] = to_state(getattr(self, attr))
+        for name, output in self.outputs.items():
+            state['outputs'][name] = to_state(output)
+        return state
+
+    def set_state(self, state):
+        '''
+        Restore a snapshot returned by get_state(). Must be called after setup(),
+        since outputs and arrays allocated there are restored in place.
+        '''
+        self.current_time = state['current_time']
+        for attr, value in state['attrs'].items():
+            setattr(self, attr, from_state(value, getattr(self, attr, None), self.xp))
+        for name, value in state['outputs'].items():
+            if name in self.outputs:
+                from_state(value, self.outputs[name], self.xp)
+        self.inputs_dirty = True
+
     def checkInputTimes(self):
         if len(self.inputs)==0:
             return True
@@ -134,7 +242,8 @@ class BaseProcessingObj(BaseTimeObj):
                 self.stream.synchronize()
 
 
-    def send_remote_output(self, item, dest_rank, dest_tag, first_mpi_send=True, out_name=''):
+    def send_remote_output(self, item, dest_rank, dest_tag, first_mpi_send=True, out_name='',
+                           start_packet=False):
         if MPI_SEND_DBG: print(process_rank, f'SEND to rank {dest_rank} {dest_tag=} {(dest_tag in self.sent_valid)=} (from {self.name}.{out_name})', flush=True)
         if first_mpi_send or not dest_tag in self.sent_valid:
             if MPI_SEND_DBG: print(process_rank, 'SEND with Pickle', dest_tag, flush=True)
@@ -148,9 +257,17 @@ class BaseProcessingObj(BaseTimeObj):
             if MPI_SEND_DBG: print(process_rank, 'SEND with Buffer', dest_tag, type(buffer), buffer, flush=True)
             if MPI_SEND_DBG: print(process_rank, 'SEND with Buffer type', dest_tag, buffer.dtype, flush=True)
 
-            process_comm.Ibsend(cpuArray(buffer), dest=dest_rank, tag=dest_tag)
+            if getattr(process_comm, 'shared_memory', False):
+                # Buffer and generation time are copied together into shared memory
+                process_comm.send_value(buffer, item.generation_time, dest=dest_rank, tag=dest_tag)
+            else:
+                process_comm.Ibsend(cpuArray(buffer), dest=dest_rank, tag=dest_tag)
 
-            process_comm.ibsend(item.generation_time, dest=dest_rank, tag=dest_tag+1)
+                if start_packet:
+                    # Tell the receiver that the next values will come in a packet
+                    process_comm.ibsend(('packet', item.generation_time), dest=dest_rank, tag=dest_tag+1)
+                else:
+                    process_comm.ibsend(item.generation_time, dest=dest_rank, tag=dest_tag+1)
         if item.get_value() is not None:
             self.sent_valid[dest_tag] = True
 
@@ -165,6 +282,11 @@ class BaseProcessingObj(BaseTimeObj):
         If *delayed_only* is True, only send the delayed outputs.
             Used while setting up the simulation, to initialize outputs
             that are delayed and thus would not be received otherwise.
+
+        Outputs belonging to a packet of the batched MPI transport
+        (see specula.lib.mpi_transport) are sent with the usual messages
+        until all of them have a valid value, and then with a single
+        persistent message per packet.
         '''
         if MPI_DBG:
             print(process_rank, self.name, 'My outputs are:')
@@ -172,9 +294,23 @@ class BaseProcessingObj(BaseTimeObj):
                 print(process_rank, out_name, out_value, flush=True)
 
         if MPI_DBG: print(process_rank, 'send_outputs', flush=True)
+        batched_tags = set()
+        starting_packets = []
+        for packet in self.send_packets:
+            if (packet.delayed and skip_delayed) or (not packet.delayed and delayed_only):
+                continue
+            if packet.active:
+                packet.send(self.outputs)
+                batched_tags.update(dest_tag for _, dest_tag in packet.items)
+            elif not first_mpi_send and packet.can_start(self.outputs, self.sent_valid):
+                starting_packets.append(packet)
+        starting_tags = set(dest_tag for packet in starting_packets for _, dest_tag in packet.items)
+
         for out_name, remote_specs in self.remote_outputs.items():
             for remote_spec in remote_specs:
                 dest_rank, dest_tag, delay = remote_spec
+                if dest_tag in batched_tags:
+                    continue
                 # avoid sending outputs that will not be received
                 # because the simulation is ending
                 if delay < 0 and skip_delayed:
@@ -186,7 +322,11 @@ class BaseProcessingObj(BaseTimeObj):
                 if MPI_DBG: print(process_rank, 'Sending ', out_name, 'to ', dest_rank, 'with tag',  dest_tag, type(self.outputs[out_name]), flush=True)
                 # workaround because module objects cannot be pickled
                 for item in self.outputs[out_name] if isinstance(self.outputs[out_name], list) else [self.outputs[out_name]]:
-                    self.send_remote_output(item, dest_rank, dest_tag, first_mpi_send, out_name)
+                    self.send_remote_output(item, dest_rank, dest_tag, first_mpi_send, out_name,
+                                            start_packet=dest_tag in starting_tags)
+
+        for packet in starting_packets:
+            packet.start(self.outputs)
 
     @classmethod
     def device_stream(cls, target_device_idx):
@@ -215,6 +355,7 @@ class BaseProcessingObj(BaseTimeObj):
 
     def check_ready(self, t):
         self.current_time = t
+        self.inputs_dirty = False
         if self.target_device_idx >= 0:
             self._target_device.use()
         if self.checkInputTimes():
@@ -256,6 +397,13 @@ class BaseProcessingObj(BaseTimeObj):
             if self.local_inputs[input_name] is None and not input.optional:
                 raise ValueError(f'Input {input_name} for object {self} has not been set')
 
+    def enable_profiling(self, profiler):
+        '''
+        Record wall time and memory allocations of the main loop
+        methods of this object into *profiler* (an ObjectProfiler instance).
+        '''
+        profiler.instrument(self)
+
     def finalize(self):
         '''
         Override this method to perform any actions after
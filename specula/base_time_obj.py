@@ -1,4 +1,6 @@
 
+import functools
+import importlib
 from functools import wraps
 from inspect import signature
 
@@ -6,6 +8,17 @@ from specula import np, cp, to_xp, process_rank
 from specula import global_precision, default_target_device, default_target_device_idx
 from specula import cpu_float_dtype_list, gpu_float_dtype_list
 from specula import cpu_complex_dtype_list, gpu_complex_dtype_list
+from specula.lib.fft_backend import get_fft_backend
+
+
+@functools.lru_cache(maxsize=None)
+def _scipy_function(gpu, module, name):
+    '''
+    Return function *name* from scipy.<module>, or from
+    cupyx.scipy.<module> if *gpu* is True
+    '''
+    package = 'cupyx.scipy' if gpu else 'scipy'
+    return getattr(importlib.import_module(f'{package}.{module}'), name)
 
 
 class BaseTimeObj:
@@ -44,27 +57,46 @@ class BaseTimeObj:
             self.xp_str = 'np'
 
         if self.target_device_idx>=0:
-            from cupyx.scipy.ndimage import rotate as ndimage_rotate
-            from cupyx.scipy.ndimage import shift as ndimage_shift
-            from cupyx.scipy.fft import ifft2 as scipy_ifft2
-            from cupyx.scipy.linalg import lu_factor, lu_solve
-
             self._target_device.use()
             self.gpu_bytes_used_before = cp.get_default_memory_pool().used_bytes()
             from cupy._util import PerformanceWarning
             self.PerformanceWarning = PerformanceWarning
         else:
-            from scipy.ndimage import rotate as ndimage_rotate
-            from scipy.ndimage import shift as ndimage_shift
-            from scipy.fft import ifft2 as scipy_ifft2
-            from scipy.linalg import lu_factor, lu_solve
             self.PerformanceWarning = None
 
-        self.ndimage_rotate = ndimage_rotate
-        self.ndimage_shift = ndimage_shift
-        self._lu_factor = lu_factor
-        self._lu_solve = lu_solve
-        self._scipy_ifft2 = scipy_ifft2
+    def __getstate__(self):
+        # Array modules cannot be pickled, and are
+        # restored from xp_str when unpickling
+        state = self.__dict__.copy()
+        state.pop('xp', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.xp = cp if self.xp_str == 'cp' else np
+
+    # scipy (or cupyx.scipy) functions are imported the first time
+    # they are used, and then shared by all objects on the same device type
+
+    @property
+    def ndimage_rotate(self):
+        return _scipy_function(self.target_device_idx >= 0, 'ndimage', 'rotate')
+
+    @property
+    def ndimage_shift(self):
+        return _scipy_function(self.target_device_idx >= 0, 'ndimage', 'shift')
+
+    @property
+    def _lu_factor(self):
+        return _scipy_function(self.target_device_idx >= 0, 'linalg', 'lu_factor')
+
+    @property
+    def _lu_solve(self):
+        return _scipy_function(self.target_device_idx >= 0, 'linalg', 'lu_solve')
+
+    @property
+    def _coo_matrix(self):
+        return _scipy_function(self.target_device_idx >= 0, 'sparse', 'coo_matrix')
 
     def t_to_seconds(self, t):
         return float(t) / float(self._time_resolution)
@@ -107,6 +139,20 @@ class BaseTimeObj:
             if name in methods:
                 setattr(cls, name, BaseTimeObj.monitorMem(attr))
 
+    def fft2(self, x, axes=(-2, -1), norm=None, overwrite_x=False):
+        '''
+        2D FFT using the FFT backend selected in the main parameters.
+        With overwrite_x=True, the memory of x may be reused for the result.
+        '''
+        return get_fft_backend(self.xp).fft2(x, axes=axes, norm=norm, overwrite_x=overwrite_x)
+
+    def ifft2(self, x, axes=(-2, -1), norm=None, overwrite_x=False):
+        '''
+        2D inverse FFT using the FFT backend selected in the main parameters.
+        With overwrite_x=True, the memory of x may be reused for the result.
+        '''
+        return get_fft_backend(self.xp).ifft2(x, axes=axes, norm=norm, overwrite_x=overwrite_x)
+
     def to_xp(self, v, dtype=None, force_copy=False):
         '''
         Method wrapping the global to_xp function.
@@ -60,7 +60,8 @@ class CalibManager():
             'vibrations': 'vibrations/',
             'Layer': 'layers/',
             'data': 'data/',
-            'projection': 'popt/'
+            'projection': 'popt/',
+            'AtmoPropagation': 'interp_cache/'
         }
         self.root_dir = root_dir
 
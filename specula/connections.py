@@ -28,6 +28,11 @@ class _InputItem():
         self.requesting_obj_name = requesting_obj_name
         self.input_name = input_name
 
+        # Set by Simul when the batched MPI transport is used
+        self.packet = None
+        self.packet_index = None
+        self.packet_active = False
+
 
     def receive_new_value(self, first_mpi_receive=True):
         if MPI_SEND_DBG: print(process_rank,
@@ -40,6 +45,21 @@ class _InputItem():
                 new_value.xp = cp
             else:
                 new_value.xp = np
+        elif self.packet_active:
+            # Copy our item out of the persistent packet buffer
+            new_value = self.cloned_value
+            buffer, gen_time = self.packet.get(self.packet_index)
+            self.cloned_value.generation_time = gen_time
+            self.cloned_value.set_value(buffer)
+            self.packet.release(self.packet_index)
+        elif getattr(process_comm, 'shared_memory', False):
+            # Copy directly from the shared memory view into our buffer
+            new_value = self.cloned_value
+            buffer, gen_time = process_comm.recv_value(source=self.remote_rank, tag=self.tag)
+            self.cloned_value.generation_time = gen_time
+            self.cloned_value.set_value(buffer)
+            del buffer
+            process_comm.release(source=self.remote_rank, tag=self.tag)
         else:            
             if MPI_SEND_DBG: print(process_rank, f'Recv with Buffer', flush=True)
             new_value = self.cloned_value
@@ -49,6 +69,11 @@ class _InputItem():
             process_comm.Recv(buffer, source=self.remote_rank, tag=self.tag)
             if MPI_SEND_DBG:  print(process_rank, self.tag+1, 'RECV .bufftimeer')
             gen_time = process_comm.recv(source=self.remote_rank, tag=self.tag+1)
+            if isinstance(gen_time, tuple):
+                # The sender switched to packets, starting from the next value
+                _, gen_time = gen_time
+                self.packet.setup()
+                self.packet_active = True
             self.cloned_value.generation_time = gen_time
             self.cloned_value.set_value(buffer)
 
@@ -71,7 +96,7 @@ class _InputItem():
 
         if self.cloned_value is None:
             self.cloned_value = value.copyTo(target_device_idx)
-        else:
+        elif value is not self.cloned_value:
             value.transferDataTo(self.cloned_value)
         return self.cloned_value
 
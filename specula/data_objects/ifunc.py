@@ -18,6 +18,9 @@ class IFunc(BaseDataObj):
     '''
     Influence functions are stored as [modes, pixels]
     '''
+
+    reusable = True
+
     def __init__(self,
                  ifunc=None,
                  type_str: str=None,
@@ -4,6 +4,8 @@ from astropy.io import fits
 
 
 class IFuncInv(BaseDataObj):
+    reusable = True
+
     def __init__(self,
                  ifunc_inv,
                  mask,
@@ -3,7 +3,12 @@ from symao.turbolence import createTurbolenceFormulary, ft_phase_screen0
 
 turbolenceFormulas = createTurbolenceFormulary()
 
+import os
+
+from astropy.io import fits
+
 from specula.base_data_obj import BaseDataObj
+from specula.lib.checkpoint import to_state
 from specula import ASEC2RAD, RAD2ASEC, cpuArray, np
 
 def seeing_to_r0(seeing, wvl=500.e-9):
@@ -23,9 +28,22 @@ def cn2_to_seeing(cn2, wvl=500.e-9):
 
 
 class InfinitePhaseScreen(BaseDataObj):
+    """
+    Phase screen of infinite length, extruded one line (row or column)
+    at a time from the stencil of the current screen (Assemat et al. 2006).
+
+    The screen is stored in a circular buffer: adding a line overwrites
+    the line leaving the screen and moves the logical row/column offset,
+    without copying the rest of the screen. Use add_lines() to add
+    several lines with a single call.
+
+    If *cache_dir* is given, the A and B extrusion matrices are saved there
+    and loaded instead of computed when a screen with the same size,
+    pixel scale, r0, L0 and stencil size factor is created.
+    """
 
     def __init__(self, mx_size, pixel_scale, r0, L0, random_seed=None, stencil_size_factor=1, xp=None,
-                 target_device_idx=None, precision=None):
+                 cache_dir=None, target_device_idx=None, precision=None):
         super().__init__(target_device_idx=target_device_idx, precision=precision)
 
         self.random_data_col = None
@@ -38,6 +56,7 @@ class InfinitePhaseScreen(BaseDataObj):
         if xp is not None:
             self.xp = xp
         self.stencil_size_factor = stencil_size_factor
+        self.cache_dir = cache_dir
 
         # stencil size must be odd and >= 257
         base_stencil_size = int(stencil_size_factor * self.mx_size/2)*2 + 1
@@ -53,10 +72,15 @@ class InfinitePhaseScreen(BaseDataObj):
         self.cov_mat_xx = None
         self.cov_mat_zx = None
         self.cov_mat_xz = None
-        self.full_scrn = None
         self.A_mat = None
         self.B_mat = None
 
+        # Circular buffer: the logical screen element [i, j] is stored
+        # in self._scrn[(i + self._row_offset) % N, (j + self._col_offset) % N]
+        self._scrn = None
+        self._row_offset = 0
+        self._col_offset = 0
+
         if random_seed is None:
             raise ValueError("random_seed must be provided")
         else:
@@ -146,6 +170,36 @@ class InfinitePhaseScreen(BaseDataObj):
         B_mat = u.dot(L_mat)
         return A_mat, B_mat
 
+    def AB_cache_filename(self):
+        '''Name of the file caching the A and B matrices, in *cache_dir*'''
+        return os.path.join(self.cache_dir,
+                            f'infinite_ps_AB_dim{self.mx_size}_pixpit{self.pixel_scale:.4f}'
+                            f'_r0{float(self.r0):.6f}_L0{float(self.L0):.4f}_stencil{self.stencil_size_factor}.fits')
+
+    def load_or_compute_AB(self, positions):
+        '''
+        Return the A and B matrices for *positions*, from the cache file
+        if *cache_dir* is set and the file exists, computing and
+        saving them otherwise.
+        '''
+        if self.cache_dir is None:
+            return self.AB_from_positions(positions)
+
+        filename = self.AB_cache_filename()
+        if os.path.exists(filename):
+            with fits.open(filename) as hdul:
+                return self.to_xp(hdul[0].data.astype(hdul[0].data.dtype.newbyteorder('='))), \
+                       self.to_xp(hdul[1].data.astype(hdul[1].data.dtype.newbyteorder('=')))
+
+        A_mat, B_mat = self.AB_from_positions(positions)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        hdul = fits.HDUList([fits.PrimaryHDU(cpuArray(A_mat)), fits.ImageHDU(cpuArray(B_mat))])
+        # Written with a temporary name, so that concurrent processes never read incomplete files
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        hdul.writeto(tmp_filename, overwrite=True)
+        os.replace(tmp_filename, filename)
+        return A_mat, B_mat
+
     def setup(self):
         # set X coords
         self.new_col_coords1 = self.xp.zeros((self.stencil_size, 2))
@@ -155,7 +209,7 @@ class InfinitePhaseScreen(BaseDataObj):
         # calc separations
         positions1 = self.xp.concatenate((self.stencil_positions[0], self.new_col_positions1), axis=0)
         self.A_mat, self.B_mat = [], []
-        A_mat, B_mat = self.AB_from_positions(positions1)
+        A_mat, B_mat = self.load_or_compute_AB(positions1)
         self.A_mat.append(A_mat)
         self.B_mat.append(B_mat)
         self.A_mat.append(self.xp.fliplr(self.xp.flipud(A_mat)))
@@ -163,8 +217,8 @@ class InfinitePhaseScreen(BaseDataObj):
         # make initial screen
         tmp, _, _ = ft_phase_screen0( turbolenceFormulas, self.r0, self.stencil_size, self.pixel_scale, self.L0, seed=self.random_seed)
         self.full_scrn = self.to_xp(tmp)
-        self.full_scrn *= (2 * np.pi) ** (11/6) # this is to compensate SYMAO bug that uses PSD(k) instead of PSD(f)
-        self.full_scrn -= self.xp.mean(self.full_scrn[:self.requested_mx_size, :self.requested_mx_size])
+        self._scrn *= (2 * np.pi) ** (11/6) # this is to compensate SYMAO bug that uses PSD(k) instead of PSD(f)
+        self._scrn -= self.xp.mean(self._scrn[:self.requested_mx_size, :self.requested_mx_size])
         # print(self.full_scrn.shape)
 
     def prepare_random_data_col(self):
@@ -183,50 +237,151 @@ class InfinitePhaseScreen(BaseDataObj):
             pass
 #            print('using old random data row')
 
+    def _stencil_data(self, row, after):
+        coords = self.stencil_coords[after]
+        n = self.stencil_size
+        if row:
+            return self._scrn[(coords[:, 1] + self._row_offset) % n, (coords[:, 0] + self._col_offset) % n]
+        else:
+            return self._scrn[(coords[:, 0] + self._row_offset) % n, (coords[:, 1] + self._col_offset) % n]
+
     def get_new_line(self, row, after):
         if row:
             self.prepare_random_data_row()
-            stencil_data = self.to_xp(self.full_scrn[self.stencil_coords[after][:, 1], self.stencil_coords[after][:, 0]])
-            new_line = self.A_mat[after].dot(stencil_data) + self.B_mat[after].dot(self.random_data_row)
+            random_data = self.random_data_row
         else:
             self.prepare_random_data_col()
-            stencil_data = self.to_xp(self.full_scrn[self.stencil_coords[after][:, 0], self.stencil_coords[after][:, 1]])
-            new_line = self.A_mat[after].dot(stencil_data) + self.B_mat[after].dot(self.random_data_col)
-        return new_line
+            random_data = self.random_data_col
+        return self.A_mat[after].dot(self._stencil_data(row, after)) + self.B_mat[after].dot(random_data)
 
-    def add_line(self, row, after, flush=True):
-        new_line = self.get_new_line(row, after)
+    def _insert_line(self, row, after, new_line):
+        '''
+        Insert *new_line* at the end (if *after*) or at the beginning of the screen,
+        replacing the line at the opposite side. Return what is needed
+        to undo the insertion with _remove_line().
+        '''
+        n = self.stencil_size
+        offsets = (self._row_offset, self._col_offset)
         if row:
-            new_line = new_line[:,self.xp.newaxis]
+            # New column, whose element i goes in buffer row (i + row offset)
+            if not after:
+                self._col_offset -= 1
+            idx = self._col_offset % n
+            old_line = self._scrn[:, idx].copy()
+            self._scrn[:, idx] = self.xp.roll(new_line, self._row_offset)
             if after:
-                self.full_scrn = self.xp.concatenate((self.full_scrn, new_line), axis=row)[:self.stencil_size, 1:]
-            #    self.ndimage_shift(self.full_scrn, [-1, 0], self.full_scrn, order=0, mode='constant', cval=0.0, prefilter=False)
-            #    self.full_scrn[-1, :] = new_line
-            else:
-                self.full_scrn = self.xp.concatenate((new_line, self.full_scrn), axis=row)[:self.stencil_size, :self.stencil_size]
-            #    self.ndimage_shift(self.full_scrn, [1, 0], self.full_scrn, order=0, mode='constant', cval=0.0, prefilter=False)
-            #    self.full_scrn[0, :] = new_line
+                self._col_offset += 1
         else:
-            new_line = new_line[self.xp.newaxis, :]
+            if not after:
+                self._row_offset -= 1
+            idx = self._row_offset % n
+            old_line = self._scrn[idx, :].copy()
+            self._scrn[idx, :] = self.xp.roll(new_line, self._col_offset)
             if after:
-                self.full_scrn = self.xp.concatenate((self.full_scrn, new_line), axis=row)[1:, :self.stencil_size]
-            #    self.ndimage_shift(self.full_scrn, [0, -1], self.full_scrn, order=0, mode='constant', cval=0.0, prefilter=False)
-            #    self.full_scrn[:, -1] = new_line
-            else:
-                self.full_scrn = self.xp.concatenate((new_line, self.full_scrn), axis=row)[:self.stencil_size, :self.stencil_size]
-            #    self.ndimage_shift(self.full_scrn, [0, 1], self.full_scrn, order=0, mode='constant', cval=0.0, prefilter=False)
-            #    self.full_scrn[:, 0] = new_line
+                self._row_offset += 1
+        return row, idx, old_line, offsets
+
+    def _remove_line(self, undo):
+        row, idx, old_line, offsets = undo
+        if row:
+            self._scrn[:, idx] = old_line
+        else:
+            self._scrn[idx, :] = old_line
+        self._row_offset, self._col_offset = offsets
+
+    def add_line(self, row, after, flush=True):
+        self.add_lines(row, after, 1, flush=flush)
+
+    def add_lines(self, row, after, n_lines, flush=True):
+        '''
+        Add *n_lines* lines, all new columns if *row* is True and new rows otherwise,
+        at the end of the screen if *after* is True and at the beginning otherwise.
+
+        The random part of all lines is computed with a single matrix product,
+        while the stencil part depends on the previous lines and is computed
+        for each line. The result is the same as *n_lines* calls to add_line().
+        If *flush* is False, the random data of the last line is kept
+        for the next one (see preview()).
+        '''
+        if n_lines <= 0:
+            return
+        after = 1 if after else 0
+        if row:
+            self.prepare_random_data_row()
+            first = self.random_data_row
+        else:
+            self.prepare_random_data_col()
+            first = self.random_data_col
+        if n_lines > 1:
+            random_data = self.xp.concatenate((first[self.xp.newaxis, :],
+                                               self.rng.standard_normal(size=(n_lines - 1, self.stencil_size))))
+        else:
+            random_data = first[self.xp.newaxis, :]
+        random_part = self.B_mat[after].dot(random_data.T)
+
+        for i in range(n_lines):
+            new_line = self.A_mat[after].dot(self._stencil_data(row, after)) + random_part[:, i]
+            self._insert_line(row, after, new_line)
+
         if flush:
             self.random_data_col = None
             self.random_data_row = None
+        elif row:
+            self.random_data_row = random_data[-1]
+        else:
+            self.random_data_col = random_data[-1]
+
+    def preview(self, lines):
+        '''
+        Return a copy of the screen (see scrnRaw) after adding one line
+        for each (row, after) tuple in *lines*, leaving this screen unchanged.
+        The random data of the previewed lines is kept, so that the lines
+        added next are the previewed ones.
+        '''
+        undo = []
+        for row, after in lines:
+            after = 1 if after else 0
+            undo.append(self._insert_line(row, after, self.get_new_line(row, after)))
+        scrn = self.scrnRaw.copy()
+        for u in reversed(undo):
+            self._remove_line(u)
+        return scrn
+
+    def _logical(self, size):
+        '''Top-left *size* x *size* part of the logical screen, a view when it does not wrap around'''
+        n = self.stencil_size
+        r, c = self._row_offset % n, self._col_offset % n
+        if r + size <= n and c + size <= n:
+            return self._scrn[r:r + size, c:c + size]
+        rows = (self.xp.arange(size) + r) % n
+        cols = (self.xp.arange(size) + c) % n
+        return self._scrn[rows[:, self.xp.newaxis], cols]
+
+    def get_state(self):
+        # The stencil and the A/B matrices do not change after setup()
+        return {'full_scrn': to_state(self.full_scrn),
+                'random_data_col': to_state(self.random_data_col),
+                'random_data_row': to_state(self.random_data_row),
+                'rng': to_state(self.rng),
+                'generation_time': self.generation_time}
+
+    @property
+    def full_scrn(self):
+        return self._logical(self.stencil_size)
+
+    @full_scrn.setter
+    def full_scrn(self, value):
+        self._scrn = value
+        self._row_offset = 0
+        self._col_offset = 0
 
     @property
     def scrn(self):
-        return cpuArray(self.full_scrn[:self.requested_mx_size, :self.requested_mx_size])
+        return cpuArray(self._logical(self.requested_mx_size))
 
     @property
     def scrnRaw(self):
-        return self.full_scrn[:self.requested_mx_size, :self.requested_mx_size]
+        return self._logical(self.requested_mx_size)
 
     @property
     def scrnRawAll(self):
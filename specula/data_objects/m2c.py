@@ -7,6 +7,8 @@ from specula.base_data_obj import BaseDataObj
 
 
 class M2C(BaseDataObj):
+    reusable = True
+
     def __init__(self,
                  m2c,
                  nmodes: int=None,
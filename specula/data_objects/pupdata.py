@@ -12,6 +12,9 @@ class PupData(BaseDataObj):
     to avoid the later initialization (see test/test_slopec.py for an example),
     where things can be forgotten easily
     '''
+
+    reusable = True
+
     def __init__(self,
                  ind_pup=None,
                  radius=None,
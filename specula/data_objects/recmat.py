@@ -10,6 +10,9 @@ class Recmat(BaseDataObj):
     '''
     Reconstruction matrix axes are [modes, slopes]
     '''
+
+    reusable = True
+
     def __init__(self,
                  recmat,
                  modes2recLayer=None,  # TODO not used
@@ -22,6 +22,33 @@ class SimulParams(BaseDataObj):
         The zenith angle of the telescope in degrees
     display_server : bool
         Activate web server for simulation display
+    parallel_levels : int
+        If greater than 1, objects sharing the same trigger order are executed
+        in parallel using a pool of this many threads
+    fft_backend : str
+        FFT library used by the processing objects running on CPU:
+        'numpy' (default), 'scipy' or 'pyfftw'. See specula.lib.fft_backend
+    fft_workers : int
+        Number of threads used by the 'scipy' and 'pyfftw' FFT backends.
+        Negative values count from the number of CPUs (-1 means all CPUs)
+    mpi_batched : bool
+        When running with MPI, send all outputs of an object going to the same
+        rank as a single persistent message, after the first exchange.
+        See specula.lib.mpi_transport
+    event_driven : bool
+        If True (default), objects whose inputs have not been updated
+        since their last check are skipped by the loop without checking them
+    checkpoint_interval : int
+        If greater than 0, the dynamic state of the simulation is saved every
+        this many iterations, so that it can be resumed with the --resume option.
+        See specula.lib.checkpoint
+    checkpoint_dir : str
+        Checkpoint directory. Defaults to a "checkpoint" subdirectory of root_dir
+    prune : bool
+        If True, objects that are not needed to compute the inputs of sinks
+        (DataStore, calibrators, DataPrint) or of the objects in *keep* are not built
+    keep : list
+        Objects (e.g. "psf") or outputs (e.g. "psf.out_sr") to keep when pruning
     '''
     def __init__(self,
                 pixel_pupil: int = None,
@@ -33,6 +60,15 @@ class SimulParams(BaseDataObj):
                 display_server: bool = False,
                 stepping: bool = False,
                 add_modules: List[str] = [],
+                parallel_levels: int = 0,
+                fft_backend: str = 'numpy',
+                fft_workers: int = None,
+                mpi_batched: bool = False,
+                event_driven: bool = True,
+                checkpoint_interval: int = 0,
+                checkpoint_dir: str = None,
+                prune: bool = False,
+                keep: List[str] = [],
     ):
         super().__init__()
 
@@ -50,3 +86,12 @@ class SimulParams(BaseDataObj):
         self.display_server = display_server
         self.stepping = stepping
         self.add_modules = add_modules
+        self.parallel_levels = parallel_levels
+        self.fft_backend = fft_backend
+        self.fft_workers = fft_workers
+        self.mpi_batched = mpi_batched
+        self.event_driven = event_driven
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_dir = checkpoint_dir
+        self.prune = prune
+        self.keep = keep
@@ -8,6 +8,8 @@ from specula.base_data_obj import BaseDataObj
 
 
 class SubapData(BaseDataObj):
+    reusable = True
+
     def __init__(self,
                  idxs,
                  display_map,
@@ -1,12 +1,41 @@
-from specula.base_processing_obj import BaseProcessingObj
+import time
+import pickle
+import multiprocessing as mp
+from copy import copy
+
+import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
 
+from specula.base_processing_obj import BaseProcessingObj
+from specula.base_data_obj import BaseDataObj
+from specula.lib.shm_snapshot import ShmSnapshot
+from specula.display.render_process import render_main
+
 
 class BaseDisplay(BaseProcessingObj):
+    '''
+    Base class for matplotlib displays.
+
+    By default, figures are redrawn in trigger_code(), in the simulation loop.
+    With *render_process* set, the figure is drawn by a separate process instead:
+    the simulation loop only copies the input values into a shared memory
+    snapshot, at most *max_fps* times per second, and never waits for
+    the render process. The render process redraws the latest snapshot
+    at most *max_fps* times per second, dropping the intermediate ones,
+    and only blits the images and lines when the axes did not change.
+    Displays accumulating a history (e.g. PlotDisplay) only see the
+    published snapshots. When the shapes or types of the input values
+    change, the render process is restarted with the new ones.
+    '''
     def __init__(self,
                  title='',
-                 figsize=(8, 6)):
+                 figsize=(8, 6),
+                 render_process: bool=False,
+                 max_fps: float=10.0):
         super().__init__()
+        if max_fps <= 0:
+            raise ValueError(f'max_fps must be positive, got {max_fps}')
         self._title = title
         self._figsize = figsize
         self._opened = False
@@ -17,6 +46,17 @@ class BaseDisplay(BaseProcessingObj):
         self.img = None
         self.line = None
 
+        self._render_process = render_process
+        self._max_fps = max_fps
+        self._rendering = False   # True in the render process
+        self._renderer = None
+        self._snapshot = None
+        self._snapshot_layout = None
+        self._stop_event = None
+        self._last_publish = 0
+        self._background = None
+        self._layout = None
+
     def _create_figure(self):
         """Create the matplotlib figure and axes"""
         if self._opened:
@@ -43,6 +83,9 @@ class BaseDisplay(BaseProcessingObj):
         return data
 
     def trigger_code(self):
+        if self._render_process:
+            self._publish_snapshot()
+            return
         try:
             if not self._opened:
                 self._create_figure()
@@ -51,6 +94,162 @@ class BaseDisplay(BaseProcessingObj):
         except Exception as e:
             self._show_error(f"Display error: {str(e)}")
 
+    def finalize(self):
+        if self._renderer is not None:
+            self._stop_renderer(timeout=5)
+
+    # ============ RENDER PROCESS ============
+
+    def _input_objects(self):
+        """List of the data objects in local_inputs, in a fixed order"""
+        objs = []
+        for name in sorted(self.local_inputs):
+            value = self.local_inputs[name]
+            if isinstance(value, list):
+                objs += value
+            elif value is not None:
+                objs.append(value)
+        return objs
+
+    def _publish_snapshot(self):
+        """Copy the input values into the shared memory snapshot, rate-limited to max_fps"""
+        now = time.time()
+        if now - self._last_publish < 1.0 / self._max_fps:
+            return
+        if self._renderer is not None and not self._renderer.is_alive():
+            # Figure closed by the user
+            return
+
+        arrays = []
+        for obj in self._input_objects():
+            value = obj.get_value()
+            if value is None:
+                return
+            arrays.append(np.asarray(value) if np.isscalar(value) else value)
+
+        layout = [(a.shape, a.dtype) for a in arrays]
+        if self._renderer is not None and layout != self._snapshot_layout:
+            # The copies of the inputs in the render process
+            # cannot hold the new values, and the segment may be too small
+            self._stop_renderer(timeout=0)
+        if self._renderer is None:
+            self._start_renderer(arrays)
+            self._snapshot_layout = layout
+        self._snapshot.publish(arrays, generation_time=self.current_time)
+        self._last_publish = now
+
+    def _start_renderer(self, arrays):
+        """Start the render process with a CPU copy of this display"""
+        render_copy = copy(self)
+        # Methods wrapped by ObjectProfiler.instrument() are instance attributes
+        # that cannot be pickled, and are not profiled in the render process
+        for attr, value in list(vars(render_copy).items()):
+            if callable(value) and callable(getattr(type(render_copy), attr, None)):
+                delattr(render_copy, attr)
+        render_copy.inputs = {}
+        render_copy.outputs = {}
+        render_copy.local_inputs = {}
+        for name, value in self.local_inputs.items():
+            if isinstance(value, list):
+                value = [obj.copyTo(-1) for obj in value]
+            elif value is not None:
+                value = value.copyTo(-1)
+            render_copy.local_inputs[name] = value
+        for attr, value in vars(self).items():
+            if isinstance(value, BaseDataObj):
+                setattr(render_copy, attr, value.copyTo(-1))
+        render_copy.target_device_idx = -1
+        render_copy.xp_str = 'np'
+        render_copy._target_device = None
+        render_copy.PerformanceWarning = None
+        render_copy.stream = None
+        render_copy.cuda_graph = None
+        render_copy._render_process = False
+        render_copy._rendering = True
+
+        self._snapshot = ShmSnapshot.create(None, arrays)
+        if not self._snapshot.fits(arrays):
+            self._snapshot.close(unlink=True)
+            self._snapshot = None
+            raise ValueError(f'Display {self.name} cannot publish {len(arrays)} arrays'
+                             f' with shapes {[a.shape for a in arrays]} to its render process')
+        ctx = mp.get_context('spawn')
+        self._stop_event = ctx.Event()
+        self._renderer = ctx.Process(target=render_main,
+                                     args=(pickle.dumps(render_copy), matplotlib.get_backend(),
+                                           self._snapshot.name, self._stop_event, self.precision),
+                                     daemon=True)
+        self._renderer.start()
+
+    def _stop_renderer(self, timeout):
+        """Stop the render process, waiting up to *timeout* seconds for it to draw the last snapshot"""
+        self._stop_event.set()
+        self._renderer.join(timeout=timeout)
+        if self._renderer.is_alive():
+            self._renderer.terminate()
+            self._renderer.join()
+        self._snapshot.close(unlink=True)
+        self._renderer = None
+        self._snapshot = None
+        self._snapshot_layout = None
+        self._stop_event = None
+
+    def render_loop(self, snapshot, stop_event):
+        """Main loop of the render process: redraw new snapshots at most max_fps times per second"""
+        parent = mp.parent_process()
+        objs = self._input_objects()
+        last_seq = 0
+        self._create_figure()
+        while plt.fignum_exists(self.fig.number):
+            t0 = time.time()
+            # The last snapshot is drawn before stopping
+            stop = stop_event.is_set() or (parent is not None and not parent.is_alive())
+            data = snapshot.read()
+            if data is not None and data[0] != last_seq:
+                last_seq, generation_time, arrays = data
+                self._render_snapshot(objs, generation_time, arrays)
+            if stop:
+                break
+            self.fig.canvas.start_event_loop(max(1.0 / self._max_fps - (time.time() - t0), 0.01))
+
+    def _render_snapshot(self, objs, generation_time, arrays):
+        for obj, value in zip(objs, arrays):
+            obj.set_value(value)
+            obj.generation_time = generation_time
+        self.current_time = generation_time
+        self.current_time_seconds = self.t_to_seconds(generation_time)
+        try:
+            self._update_display(self._get_data())
+        except Exception as e:
+            self._show_error(f"Display error: {str(e)}")
+        self._draw_frame()
+
+    def _draw_frame(self):
+        """
+        Draw the figure in the render process. When the canvas size, axes limits,
+        color limits and artists are unchanged, only the images and lines are
+        redrawn over the cached background.
+        """
+        canvas = self.fig.canvas
+        if not canvas.supports_blit:
+            canvas.draw_idle()
+            return
+        artists = [a for ax in self.fig.axes for a in [*ax.images, *ax.lines]]
+        layout = (canvas.get_width_height(),
+                  [(ax.get_xlim(), ax.get_ylim(), len(ax.texts), len(ax.collections)) for ax in self.fig.axes],
+                  [(id(a), a.get_clim() if hasattr(a, 'get_clim') else None) for a in artists])
+        if self._background is None or layout != self._layout:
+            for a in artists:
+                a.set_animated(True)
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+            self._layout = layout
+        else:
+            canvas.restore_region(self._background)
+        for a in artists:
+            self.fig.draw_artist(a)
+        canvas.blit(self.fig.bbox)
+
     # ============ UTILITY METHODS ============
 
     def set_y_range(self, ymin, ymax):
@@ -91,6 +290,9 @@ class BaseDisplay(BaseProcessingObj):
 
     def _safe_draw(self):
         """Thread-safe drawing method"""
+        if self._rendering:
+            # The render loop draws once per snapshot, see _draw_frame()
+            return
         try:
             if self.fig and self.fig.canvas:
                 self.fig.canvas.draw_idle()
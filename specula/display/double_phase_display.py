@@ -12,11 +12,15 @@ from symao.turbolence import ft_ft2
 class DoublePhaseDisplay(BaseDisplay):
     def __init__(self,
                  title='Double Phase Display',
-                 figsize=(12, 3)):  # 4 subplots side by side
+                 figsize=(12, 3),  # 4 subplots side by side
+                 render_process: bool=False,
+                 max_fps: float=10.0):
 
         super().__init__(
             title=title,
-            figsize=figsize
+            figsize=figsize,
+            render_process=render_process,
+            max_fps=max_fps
         )
 
         self.img1 = None
@@ -129,14 +133,3 @@ class DoublePhaseDisplay(BaseDisplay):
         self.ax4.legend()
 
         self._safe_draw()
-
-    def trigger_code(self):
-        """Override to handle dual phase inputs"""
-        try:
-            if not self._opened:
-                self._create_figure()
-
-            # DoublePhaseDisplay handles dual inputs
-            self._update_display()
-        except Exception as e:
-            self._show_error(f"Double phase display error: {str(e)}")
@@ -11,11 +11,15 @@ class ModesDisplay(BaseDisplay):
                  title='Modes Display',
                  figsize=(6, 3),
                  xrange=None,
-                 yrange=(-500, 500)):
+                 yrange=(-500, 500),
+                 render_process: bool=False,
+                 max_fps: float=10.0):
 
         super().__init__(
             title=title,
-            figsize=figsize
+            figsize=figsize,
+            render_process=render_process,
+            max_fps=max_fps
         )
 
         self._xrange = xrange
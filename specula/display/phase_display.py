@@ -10,10 +10,14 @@ from specula.data_objects.electric_field import ElectricField
 class PhaseDisplay(BaseDisplay):
     def __init__(self,
                  title='Phase Display',
-                 figsize=(8, 6)):  # Default size in inches
+                 figsize=(8, 6),  # Default size in inches
+                 render_process: bool=False,
+                 max_fps: float=10.0):
         super().__init__(
             title=title,
-            figsize=figsize
+            figsize=figsize,
+            render_process=render_process,
+            max_fps=max_fps
         )
 
         # Setup input
@@ -34,6 +34,10 @@ class PixelsDisplay(BaseDisplay):
     crop_mode : str, optional
         'slice' (default): crop = (x_start, x_end, y_start, y_end)
         'center': crop = (x_center, y_center, half_width, half_height)
+    render_process : bool
+        If True, draw in a separate process (see BaseDisplay)
+    max_fps : float
+        Maximum number of redraws per second in the render process
     """
 
     def __init__(self,
@@ -43,11 +47,15 @@ class PixelsDisplay(BaseDisplay):
                  subapdata: SubapData = None,
                  log_scale=False,
                  crop=None,
-                 crop_mode='slice'):
+                 crop_mode='slice',
+                 render_process: bool=False,
+                 max_fps: float=10.0):
 
         super().__init__(
             title=title,
-            figsize=figsize
+            figsize=figsize,
+            render_process=render_process,
+            max_fps=max_fps
         )
 
         self._sh_as_pyr = sh_as_pyr
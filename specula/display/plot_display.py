@@ -12,11 +12,15 @@ class PlotDisplay(BaseDisplay):
                  figsize=(8, 6),
                  histlen=200,
                  yrange=(0, 0),
-                 x_axis='time'):  # can be time or iteration
+                 x_axis='time',  # can be time or iteration
+                 render_process: bool=False,
+                 max_fps: float=10.0):
 
         super().__init__(
             title=title,
-            figsize=figsize
+            figsize=figsize,
+            render_process=render_process,
+            max_fps=max_fps
         )
 
         self._histlen = histlen
@@ -35,6 +35,10 @@ class PlotVectorDisplay(BaseDisplay):
         Labels for legend. If None, use "Elem. 0", "Elem. 1", etc.
     max_elements : int, optional
         Maximum number of elements to plot. Default 20. Set to None for no limit.
+    render_process : bool
+        If True, draw in a separate process (see BaseDisplay)
+    max_fps : float
+        Maximum number of redraws per second in the render process
     """
 
     def __init__(self,
@@ -46,11 +50,15 @@ class PlotVectorDisplay(BaseDisplay):
                  indices=None,
                  slice_args=None,
                  legend_labels=None,
-                 max_elements=20):
+                 max_elements=20,
+                 render_process: bool=False,
+                 max_fps: float=10.0):
 
         super().__init__(
             title=title,
-            figsize=figsize
+            figsize=figsize,
+            render_process=render_process,
+            max_fps=max_fps
         )
 
         # Validate that indices and slice_args are not both set
@@ -13,11 +13,15 @@ class PsfDisplay(BaseDisplay):
                  title='PSF Display',
                  figsize=(6, 6),
                  log_scale=False,
-                 image_p2v=0.0):
+                 image_p2v=0.0,
+                 render_process: bool=False,
+                 max_fps: float=10.0):
 
         super().__init__(
             title=title,
-            figsize=figsize
+            figsize=figsize,
+            render_process=render_process,
+            max_fps=max_fps
         )
 
         self._log_scale = log_scale
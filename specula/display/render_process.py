@@ -0,0 +1,27 @@
+import pickle
+
+# This module is the entry point of the display render processes,
+# and must not import SPECULA modules before specula.init() is called
+
+
+def render_main(payload, backend, snapshot_name, stop_event, precision):
+    '''
+    Entry point of a display render process (see BaseDisplay).
+    *payload* is the pickled CPU copy of the display object, which
+    redraws the snapshots published in *snapshot_name* until
+    *stop_event* is set or its figure is closed.
+    '''
+    import specula
+    specula.init(-1, precision=precision)
+
+    import matplotlib
+    matplotlib.use(backend)
+
+    from specula.lib.shm_snapshot import ShmSnapshot
+
+    display = pickle.loads(payload)
+    snapshot = ShmSnapshot.attach(snapshot_name)
+    try:
+        display.render_loop(snapshot, stop_event)
+    finally:
+        snapshot.close()
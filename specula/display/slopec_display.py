@@ -9,11 +9,15 @@ from specula.data_objects.slopes import Slopes
 class SlopecDisplay(BaseDisplay):
     def __init__(self,
                  title='Slopes Display',
-                 figsize=(6, 6)):
+                 figsize=(6, 6),
+                 render_process: bool=False,
+                 max_fps: float=10.0):
 
         super().__init__(
             title=title,
-            figsize=figsize
+            figsize=figsize,
+            render_process=render_process,
+            max_fps=max_fps
         )
 
         self.img = None
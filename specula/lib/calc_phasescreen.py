@@ -1,5 +1,12 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.fft
+
 from specula import cpuArray, float_dtype_list
 from specula import complex_dtype_list
+from specula import cpu_float_dtype_list, cpu_complex_dtype_list
 from specula.lib.calc_spatialfrequency import calc_spatialfrequency
 
 
@@ -103,3 +110,103 @@ def calc_phasescreen(L0, dimension, pixel_pitch, xp, precision, seed=0, verbose=
     phasescreen = xp.real(phasescreen)
 
     return phasescreen
+
+
+def calc_phasescreen_rfft(L0, dimension, pixel_pitch, precision, seed=0, out=None,
+                          block_size=1024, workers=-1, verbose=False):
+    '''
+    Low-memory, multi-threaded version of calc_phasescreen(), on CPU.
+
+    The phase screen is the inverse real FFT of a Hermitian spectrum, so only
+    half of it (dimension x dimension/2+1 complex values) is kept in memory.
+    The spectrum is generated in blocks of *block_size* rows, by *workers*
+    threads, with a counter-based random generator (Philox) keyed by *seed*
+    and restarted at each row, so that the result does not depend on
+    *block_size* or *workers*. The inverse FFT is done in two passes
+    (complex along y, in place, and real along x), the second one writing
+    blocks of rows into *out*, which can be a memory-mapped array.
+
+    The power spectrum is the same as calc_phasescreen(),
+    but the screens are different for the same seed.
+
+    Parameters
+    ----------
+    L0 : float
+        Outer scale [m]
+    dimension : int
+        Screen size in pixels, rounded up to a power of 2
+    pixel_pitch : float
+        Pixel size [m]
+    precision : int
+        0 for double, 1 for single precision
+    seed : int, optional
+        Random seed
+    out : numpy.ndarray, optional
+        Output array of shape (dimension, dimension)
+    block_size : int, optional
+        Number of rows (or columns) processed at a time
+    workers : int, optional
+        Number of threads. Negative values count from the number of CPUs
+    verbose : bool, optional
+
+    Returns
+    -------
+    numpy.ndarray
+        The phase screen in radians at 500 nm (*out*, if given)
+    '''
+    if verbose:
+        print("Phase-screen computation (real FFT)")
+
+    dimension = 2**int(np.ceil(np.log2(float(dimension))))
+    half_dim = dimension // 2
+    dtype = cpu_float_dtype_list[precision]
+    complex_dtype = cpu_complex_dtype_list[precision]
+    if workers <= 0:
+        workers = max((os.cpu_count() or 1) + 1 + workers, 1)
+
+    # Scalars are converted to *dtype*, so that the result does
+    # not depend on the type of the arguments
+    m_dimension = dimension * pixel_pitch
+    norm = dtype(np.sqrt(0.033/2./m_dimension**2) * (2 * np.pi)**(2./3.) * np.sqrt(0.06) * (1 / pixel_pitch)**(5./6.))
+    inv_L0_2 = dtype(1. / float(L0)**2)
+
+    # Frequencies of the half spectrum, in FFT order along y
+    fy = np.fft.fftfreq(dimension, d=1.0 / dimension).astype(dtype) / m_dimension
+    fx = np.arange(half_dim + 1, dtype=dtype) / m_dimension
+
+    spectrum = np.empty((dimension, half_dim + 1), dtype=complex_dtype)
+
+    def fill(row0):
+        rows = slice(row0, min(row0 + block_size, dimension))
+        for row in range(rows.start, rows.stop):
+            rng = np.random.Generator(np.random.Philox(key=int(seed), counter=[0, 0, row, 0]))
+            gauss = rng.standard_normal((2, half_dim + 1), dtype=dtype)
+            spectrum[row].real = gauss[0]
+            spectrum[row].imag = gauss[1]
+        block = spectrum[rows]
+        block *= norm * (fy[rows, None]**2 + fx[None, :]**2 + inv_L0_2)**(-11./12.)
+        # Only the Hermitian part of the kx=0 column is used by the real FFT,
+        # which halves its variance
+        block[:, 0] *= np.sqrt(2)
+        # No power at the Nyquist frequency, as in calc_phasescreen()
+        block[:, half_dim] = 0
+        if rows.start <= half_dim < rows.stop:
+            block[half_dim - rows.start] = 0
+
+    if verbose:
+        print("Compute spectrum")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fill, range(0, dimension, block_size)))
+
+    if verbose:
+        print("Compute inverse FFT")
+    for col0 in range(0, half_dim + 1, block_size):
+        cols = slice(col0, min(col0 + block_size, half_dim + 1))
+        spectrum[:, cols] = scipy.fft.ifft(spectrum[:, cols], axis=0, norm='forward', workers=workers)
+
+    if out is None:
+        out = np.empty((dimension, dimension), dtype=dtype)
+    for row0 in range(0, dimension, block_size):
+        rows = slice(row0, min(row0 + block_size, dimension))
+        out[rows] = scipy.fft.irfft(spectrum[rows], n=dimension, axis=1, norm='forward', workers=workers)
+    return out
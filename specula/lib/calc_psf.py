@@ -2,6 +2,7 @@ import numpy as np
 from collections import namedtuple
 
 from specula import fuse
+from specula.lib.fft_backend import get_fft_backend
 
 
 @fuse(kernel_name='psf_abs2')
@@ -51,7 +52,7 @@ def calc_psf(phase, amp, xp=np, complex_dtype=np.complex64, imwidth=None, normal
     else:
         u_ef = amp * xp.exp(1j * phase, dtype=complex_dtype)
     # Compute FFT (forward)
-    u_fp = xp.fft.fft2(u_ef)
+    u_fp = get_fft_backend(xp).fft2(u_ef, overwrite_x=True)
     # Center the PSF if required
     if not nocenter:
         u_fp = xp.fft.fftshift(u_fp)
@@ -0,0 +1,234 @@
+import os
+import shutil
+import pickle
+
+import numpy as np
+import yaml
+
+from specula import cpuArray, to_xp, array_types
+
+# Increase when the checkpoint layout changes
+CHECKPOINT_VERSION = 1
+
+
+class _ArrayState():
+    '''CPU copy of a numpy or cupy array'''
+    def __init__(self, value):
+        self.value = cpuArray(value, dtype=value.dtype, force_copy=True)
+
+
+class _RngState():
+    '''
+    State of a numpy random Generator. The state of cupy generators
+    cannot be read back, so that they continue with a different
+    sequence after a restore.
+    '''
+    def __init__(self, rng):
+        if isinstance(rng, np.random.Generator):
+            self.state = rng.bit_generator.state
+        else:
+            print(f'Warning: the state of random generator {type(rng)} is not saved in checkpoints')
+            self.state = None
+
+
+class _DataObjState():
+    '''State of a data object, see BaseDataObj.get_state()'''
+    def __init__(self, obj):
+        self.state = obj.get_state()
+
+
+class _DictState():
+    '''Dictionary (including OrderedDict and defaultdict), with converted values'''
+    def __init__(self, d):
+        self.cls = type(d)
+        self.default_factory = getattr(d, 'default_factory', None)
+        self.items = [(k, to_state(v)) for k, v in d.items()]
+
+
+def to_state(value):
+    '''
+    Convert *value* into a picklable snapshot that does not share memory
+    with the original. Supported values are scalars, strings, None,
+    numpy/cupy arrays, numpy random generators, data objects,
+    and lists, tuples and dictionaries of them.
+    '''
+    from specula.base_data_obj import BaseDataObj
+
+    if value is None or isinstance(value, (bool, int, float, complex, str, np.generic)):
+        return value
+    if type(value) in array_types:
+        return _ArrayState(value)
+    if type(value).__name__ == 'Generator':
+        return _RngState(value)
+    if isinstance(value, BaseDataObj):
+        return _DataObjState(value)
+    if isinstance(value, dict):
+        return _DictState(value)
+    if isinstance(value, (list, tuple)):
+        return type(value)(to_state(x) for x in value)
+    raise TypeError(f'Cannot checkpoint values of type {type(value)}')
+
+
+def from_state(state, current, xp):
+    '''
+    Restore a snapshot made by to_state(). *current* is the value to be
+    replaced: arrays with the same shape and dtype, random generators
+    and data objects are restored in place, so that references held
+    by other objects remain valid. *xp* is the array module used
+    to allocate new arrays.
+    '''
+    if isinstance(state, _ArrayState):
+        if type(current) in array_types and current.shape == state.value.shape \
+           and current.dtype == state.value.dtype:
+            if type(current) is np.ndarray:
+                current[...] = state.value
+            else:
+                current[...] = to_xp(xp, state.value)
+            return current
+        if type(current) is np.ndarray:
+            # Arrays kept on CPU by GPU objects remain on CPU
+            return state.value.copy()
+        return to_xp(xp, state.value, dtype=state.value.dtype, force_copy=True)
+    if isinstance(state, _RngState):
+        if state.state is not None:
+            if not isinstance(current, np.random.Generator):
+                raise TypeError(f'Cannot restore a random generator state into {type(current)}')
+            current.bit_generator.state = state.state
+        return current
+    if isinstance(state, _DataObjState):
+        if current is None:
+            raise ValueError('Data objects can only be restored into an existing instance')
+        current.set_state(state.state)
+        return current
+    if isinstance(state, _DictState):
+        if state.default_factory is not None:
+            d = state.cls(state.default_factory)
+        else:
+            d = state.cls()
+        old = current if isinstance(current, dict) else {}
+        for k, v in state.items:
+            d[k] = from_state(v, old.get(k), xp)
+        return d
+    if isinstance(state, (list, tuple)):
+        if isinstance(current, (list, tuple)) and len(current) == len(state):
+            return type(state)(from_state(s, c, xp) for s, c in zip(state, current))
+        return type(state)(from_state(s, None, xp) for s in state)
+    return state
+
+
+class Checkpoint():
+    '''
+    Periodic snapshots of the dynamic state of a simulation.
+
+    A checkpoint is a directory with one pickle file per processing object,
+    holding the result of its get_state() method, and a checkpoint.yml file
+    with the loop time and iteration counter. The directory is first written
+    with a temporary name. The previous checkpoint is then renamed with
+    a ".old" suffix and only removed after the new one has been renamed
+    into place, so that an interrupted write always leaves a valid checkpoint,
+    which restore() finds under one of the two names.
+
+    Parameters
+    ----------
+    objs : dict
+        Dictionary of all simulation objects, indexed by name.
+        Only processing objects are saved.
+    dirname : str
+        Checkpoint directory
+    interval : int
+        Number of loop iterations between snapshots. If 0, no periodic
+        snapshot is taken.
+    resume : str, optional
+        Checkpoint directory to restore when the loop starts.
+    '''
+    def __init__(self, objs, dirname, interval=0, resume=None):
+        self.objs = objs
+        self.dirname = dirname
+        self.interval = interval
+        self.resume = resume
+        self.last_saved = 0
+
+    def processing_objects(self):
+        from specula.base_processing_obj import BaseProcessingObj
+        return {name: obj for name, obj in self.objs.items() if isinstance(obj, BaseProcessingObj)}
+
+    def step(self, loop):
+        '''
+        Called by LoopControl at the end of each iteration.
+        Saves a snapshot every *interval* iterations. When the loop
+        jumps over several steps, the snapshot is taken after the jump.
+        '''
+        if self.interval > 0 and \
+           loop.iter_counter // self.interval > self.last_saved // self.interval:
+            self.save(loop)
+
+    @staticmethod
+    def old_dirname(dirname):
+        '''Name of the previous checkpoint while a new one is renamed into place'''
+        return dirname.rstrip(os.sep) + '.old'
+
+    def save(self, loop):
+        tmp_dirname = self.dirname.rstrip(os.sep) + '.tmp'
+        old_dirname = self.old_dirname(self.dirname)
+        if os.path.exists(tmp_dirname):
+            shutil.rmtree(tmp_dirname)
+        os.makedirs(tmp_dirname)
+
+        for name, obj in self.processing_objects().items():
+            with open(os.path.join(tmp_dirname, name + '.pickle'), 'wb') as f:
+                pickle.dump(obj.get_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with open(os.path.join(tmp_dirname, 'global_rng.pickle'), 'wb') as f:
+            pickle.dump(np.random.get_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        info = {'version': CHECKPOINT_VERSION,
+                't': int(loop.t),
+                'iter_counter': int(loop.iter_counter),
+                'time_seconds': loop.t_to_seconds(loop.t)}
+        with open(os.path.join(tmp_dirname, 'checkpoint.yml'), 'w') as f:
+            yaml.dump(info, f)
+
+        # If the checkpoint directory is missing, a previous save
+        # was interrupted and the .old one is still the valid checkpoint
+        if os.path.exists(self.dirname):
+            if os.path.exists(old_dirname):
+                shutil.rmtree(old_dirname)
+            os.replace(self.dirname, old_dirname)
+        os.replace(tmp_dirname, self.dirname)
+        if os.path.exists(old_dirname):
+            shutil.rmtree(old_dirname)
+        self.last_saved = loop.iter_counter
+        print(f'Checkpoint saved at t={info["time_seconds"]:.6f} in {self.dirname}', flush=True)
+
+    def restore(self, loop):
+        '''
+        Restore the state of all processing objects and of *loop*
+        from the *resume* directory. Objects not found in the checkpoint
+        keep their initial state, so that a run can be branched with
+        additional objects (e.g. a new DataStore).
+        '''
+        dirname = self.resume
+        if not os.path.exists(dirname) and os.path.exists(self.old_dirname(dirname)):
+            # Interrupted while replacing the checkpoint
+            dirname = self.old_dirname(dirname)
+        with open(os.path.join(dirname, 'checkpoint.yml'), 'r') as f:
+            info = yaml.safe_load(f)
+        if info.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f'Checkpoint {dirname} has version {info.get("version")},'
+                             f' expected {CHECKPOINT_VERSION}')
+
+        for name, obj in self.processing_objects().items():
+            filename = os.path.join(dirname, name + '.pickle')
+            if not os.path.exists(filename):
+                print(f'Warning: object {name} not found in checkpoint, using its initial state')
+                continue
+            with open(filename, 'rb') as f:
+                obj.set_state(pickle.load(f))
+
+        with open(os.path.join(dirname, 'global_rng.pickle'), 'rb') as f:
+            np.random.set_state(pickle.load(f))
+
+        loop.t = info['t']
+        loop.iter_counter = info['iter_counter']
+        self.last_saved = loop.iter_counter
+        print(f'Resuming from t={info["time_seconds"]:.6f} (checkpoint {dirname})', flush=True)
@@ -0,0 +1,161 @@
+import threading
+
+from specula import np, cp
+
+# Backends that can be selected with set_fft_backend()
+fft_backends = ['numpy', 'scipy', 'pyfftw']
+
+_current = {'name': 'numpy', 'workers': None, 'planner_effort': 'FFTW_MEASURE'}
+_instances = {}
+
+
+class NumpyFFT():
+    '''
+    FFT backend using the xp.fft module (numpy on CPU, cupy on GPU).
+    This is the default backend.
+    '''
+    def __init__(self, xp=np):
+        self.xp = xp
+
+    def fft2(self, x, axes=(-2, -1), norm=None, overwrite_x=False):
+        return self.xp.fft.fft2(x, axes=axes, norm=norm)
+
+    def ifft2(self, x, axes=(-2, -1), norm=None, overwrite_x=False):
+        return self.xp.fft.ifft2(x, axes=axes, norm=norm)
+
+
+class ScipyFFT(NumpyFFT):
+    '''
+    FFT backend using scipy.fft (cupyx.scipy.fft on GPU).
+    On CPU, *workers* threads are used for multi-dimensional and
+    batched transforms, and *overwrite_x* transforms are done in place.
+    '''
+    def __init__(self, xp=np, workers=None):
+        super().__init__(xp)
+        if xp is cp:
+            import cupyx.scipy.fft as scipy_fft
+            self.kwargs = {}
+        else:
+            import scipy.fft as scipy_fft
+            self.kwargs = {'workers': workers}
+        self.scipy_fft = scipy_fft
+
+    def fft2(self, x, axes=(-2, -1), norm=None, overwrite_x=False):
+        return self.scipy_fft.fft2(x, axes=axes, norm=norm, overwrite_x=overwrite_x, **self.kwargs)
+
+    def ifft2(self, x, axes=(-2, -1), norm=None, overwrite_x=False):
+        return self.scipy_fft.ifft2(x, axes=axes, norm=norm, overwrite_x=overwrite_x, **self.kwargs)
+
+
+class PyFFTW(NumpyFFT):
+    '''
+    FFT backend using pyFFTW (CPU only).
+
+    A FFTW plan is created for each combination of shape, dtype, axes,
+    direction and normalization, together with its aligned input and output
+    buffers, and it is reused in all later calls. Plans are kept separately
+    for each thread, so that objects executed in parallel do not share buffers.
+    '''
+    def __init__(self, workers=None, planner_effort='FFTW_MEASURE'):
+        super().__init__(np)
+        try:
+            import pyfftw
+        except ImportError:
+            raise ImportError('The pyfftw FFT backend requires the pyfftw package')
+        self.pyfftw = pyfftw
+        self.threads = workers if workers is not None and workers > 0 else 1
+        self.planner_effort = planner_effort
+        self._local = threading.local()
+
+    def plan(self, shape, dtype, axes, direction, norm):
+        '''
+        Return the cached FFTW object for the given transform, creating it if needed
+        '''
+        plans = getattr(self._local, 'plans', None)
+        if plans is None:
+            plans = self._local.plans = {}
+        key = (shape, np.dtype(dtype).str, axes, direction, norm)
+        if key not in plans:
+            a = self.pyfftw.empty_aligned(shape, dtype=dtype)
+            b = self.pyfftw.empty_aligned(shape, dtype=dtype)
+            plans[key] = self.pyfftw.FFTW(a, b, axes=axes, direction=direction,
+                                          flags=(self.planner_effort,),
+                                          threads=self.threads,
+                                          normalise_idft=norm in (None, 'backward'),
+                                          ortho=norm == 'ortho')
+        return plans[key]
+
+    def _execute(self, x, axes, norm, overwrite_x, direction):
+        x = np.asarray(x)
+        if x.dtype.kind != 'c':
+            x = x.astype(np.result_type(x.dtype, np.complex64))
+            overwrite_x = False
+        axes = tuple(a % x.ndim for a in axes)
+        fftw = self.plan(x.shape, x.dtype, axes, direction, norm)
+        fftw.input_array[...] = x
+        result = fftw()
+        if direction == 'FFTW_FORWARD' and norm == 'forward':
+            # normalise_idft only applies to the inverse transform
+            result *= 1 / np.prod([x.shape[a] for a in axes])
+        if overwrite_x:
+            x[...] = result
+            return x
+        return result.copy()
+
+    def fft2(self, x, axes=(-2, -1), norm=None, overwrite_x=False):
+        return self._execute(x, axes, norm, overwrite_x, 'FFTW_FORWARD')
+
+    def ifft2(self, x, axes=(-2, -1), norm=None, overwrite_x=False):
+        return self._execute(x, axes, norm, overwrite_x, 'FFTW_BACKWARD')
+
+
+def set_fft_backend(name='numpy', workers=None, planner_effort='FFTW_MEASURE'):
+    '''
+    Select the FFT backend used by all processing objects.
+
+    Parameters
+    ----------
+    name : str
+        One of 'numpy' (default), 'scipy' or 'pyfftw'.
+        GPU objects always use cupy, with the scipy-like interface for 'scipy'
+        and the default one otherwise.
+    workers : int, optional
+        Number of CPU threads used by the 'scipy' and 'pyfftw' backends.
+        Negative values count from the number of CPUs as in scipy.fft.
+    planner_effort : str, optional
+        FFTW planner flag for the 'pyfftw' backend
+    '''
+    if name not in fft_backends:
+        raise ValueError(f'Unknown FFT backend {name}, must be one of {fft_backends}')
+    if name == 'pyfftw':
+        if workers is not None and workers < 0:
+            import os
+            workers = max(os.cpu_count() + 1 + workers, 1)
+        # Fail early if pyfftw is not installed
+        PyFFTW(workers, planner_effort)
+    _current.update(name=name, workers=workers, planner_effort=planner_effort)
+    _instances.clear()
+
+
+def get_fft_backend(xp=np):
+    '''
+    Return the FFT backend object for the array module *xp*.
+
+    Backend objects implement fft2() and ifft2() with the same arguments
+    as scipy.fft, limited to *axes*, *norm* and *overwrite_x*. With *overwrite_x*,
+    backends that support it reuse the memory of *x* for the result, so it
+    must only be set when the caller owns *x*. The returned array must
+    always be used, since it is not guaranteed to be *x*.
+    '''
+    name = _current['name']
+    if xp is cp and name == 'pyfftw':
+        name = 'numpy'
+    key = (name, xp is cp)
+    if key not in _instances:
+        if name == 'scipy':
+            _instances[key] = ScipyFFT(xp, workers=_current['workers'])
+        elif name == 'pyfftw':
+            _instances[key] = PyFFTW(_current['workers'], _current['planner_effort'])
+        else:
+            _instances[key] = NumpyFFT(xp)
+    return _instances[key]
@@ -45,7 +45,10 @@ class Interp2D():
         interp2_kernel_float = cp.RawKernel(interp2_kernel.replace('TYPE', 'float'), name='interp2_kernel_float')
         interp2_kernel_double = cp.RawKernel(interp2_kernel.replace('TYPE', 'double'), name='interp2_kernel_double')
 
-    def __init__(self, input_shape, output_shape, rotInDeg=0, rowShiftInPixels=0, colShiftInPixels=0, yy=None, xx=None, dtype=np.float32, xp=np):
+    engines = ['regular_grid', 'sparse']
+
+    def __init__(self, input_shape, output_shape, rotInDeg=0, rowShiftInPixels=0, colShiftInPixels=0, yy=None, xx=None, dtype=np.float32, xp=np,
+                 engine='regular_grid'):
         '''
         Initialize an Interp2D object for 2D interpolation between arrays.
 
@@ -69,17 +72,28 @@ class Interp2D():
             Data type for interpolation (default: np.float32).
         xp : module, optional
             Array module to use (default: numpy).
+        engine : str, optional
+            CPU interpolation engine (ignored on GPU, where a CUDA kernel is always used):
+            'regular_grid' uses scipy's RegularGridInterpolator at each call;
+            'sparse' precomputes a sparse CSR interpolation operator at construction,
+            and each call is a single sparse matrix-vector product (default: 'regular_grid').
 
         Notes
         -----
         If `xx` and `yy` are not provided, they are generated to map the output grid
         to the input grid, with optional rotation and shift applied.
         '''
+        if engine not in self.engines:
+            raise ValueError(f'Unknown engine {engine}, must be one of {self.engines}')
         self.xp = xp
         self.dtype = dtype
         self.input_shape = input_shape
         self.output_shape = output_shape
+        self.engine = engine
         self.do_interp = True
+        self._idx = None
+        self._weights = None
+        self._operator = None
 
         # Check if interpolation is actually needed
         if (input_shape == output_shape and
@@ -126,6 +140,80 @@ class Interp2D():
         self.yy = to_xp(self.xp, yy, dtype=dtype).ravel()
         self.xx = to_xp(self.xp, xx, dtype=dtype).ravel()
 
+        if self.engine == 'sparse' and self.xp is not cp:
+            self.sparse_operator()
+
+    @classmethod
+    def from_arrays(cls, input_shape, output_shape, xx, yy, idx=None, weights=None, dtype=np.float32, xp=np,
+                    engine='regular_grid'):
+        '''
+        Build an Interp2D object from precomputed (already rotated, shifted
+        and clipped) sampling coordinates, and optionally from precomputed
+        bilinear coefficients, as returned by coefficients().
+        Used to restore interpolators from a cache.
+        '''
+        interp = cls.__new__(cls)
+        interp.xp = xp
+        interp.dtype = dtype
+        interp.input_shape = tuple(input_shape)
+        interp.output_shape = tuple(output_shape)
+        interp.engine = engine
+        interp._operator = None
+        interp.do_interp = True
+        interp.xx = to_xp(xp, xx, dtype=dtype).ravel()
+        interp.yy = to_xp(xp, yy, dtype=dtype).ravel()
+        interp._idx = None if idx is None else to_xp(xp, idx)
+        interp._weights = None if weights is None else to_xp(xp, weights, dtype=dtype)
+        return interp
+
+    def coefficients(self):
+        '''
+        Return the flat indices and weights of the four neighbours used
+        for bilinear interpolation of each output pixel, as a tuple
+        of two arrays with shape (4, number of output pixels).
+        They are computed on the first call and then reused.
+        '''
+        if self._idx is None:
+            self._idx, self._weights = bilinear_coefficients(self.xx, self.yy, self.input_shape,
+                                                             xp=self.xp, dtype=self.dtype)
+        return self._idx, self._weights
+
+    def sparse_operator(self):
+        '''
+        Return the interpolation operator as a scipy.sparse CSR matrix
+        of shape (number of output pixels, number of input pixels),
+        building it on the first call. CPU only.
+        '''
+        if self._operator is None:
+            from scipy.sparse import csr_matrix
+            idx, weights = self.coefficients()
+            n_out = idx.shape[1]
+            n_in = self.input_shape[0] * self.input_shape[1]
+            rows = np.repeat(np.arange(n_out, dtype=idx.dtype), 4)
+            # Duplicate entries (neighbours clipped at the borders) are summed by scipy
+            self._operator = csr_matrix((weights.T.ravel(), (rows, idx.T.ravel())),
+                                        shape=(n_out, n_in), dtype=self.dtype)
+        return self._operator
+
+    def interpolate_stack(self, values, out=None):
+        '''
+        Interpolate a stack of arrays with shape (n, *input_shape),
+        returning an array with shape (n, *output_shape).
+
+        Each array is interpolated separately: with the sparse engine,
+        n sparse matrix-vector products are faster than a single
+        product with an (n_in, n) dense matrix, whose transposed
+        layout must be copied by scipy.
+        '''
+        if tuple(values.shape[1:]) != tuple(self.input_shape):
+            raise ValueError(f'Arrays to be interpolated must have shape {self.input_shape} instead of {values.shape[1:]}')
+
+        if out is None:
+            out = self.xp.empty(shape=(values.shape[0],) + tuple(self.output_shape), dtype=self.dtype)
+        for i in range(values.shape[0]):
+            self.interpolate(values[i], out=out[i])
+        return out
+
     def interpolate(self, value, out=None):
         """
         Interpolates the input array to the output grid defined by the interpolator.
@@ -149,7 +237,8 @@ class Interp2D():
 
         Notes
         -----
-        For CPU arrays, uses scipy's RegularGridInterpolator.
+        For CPU arrays, uses scipy's RegularGridInterpolator or
+        a precomputed sparse operator, depending on the engine.
         For GPU arrays (cupy), uses a custom CUDA kernel.
         """
         if value.shape != self.input_shape:
@@ -181,9 +270,128 @@ class Interp2D():
                 raise ValueError('Unsupported dtype {self.dtype}')
             return out
 
+        elif self.engine == 'sparse':
+            out[:] = (self.sparse_operator() @ value.reshape(-1)).reshape(self.output_shape)
+            return out
+
         else:
             from scipy.interpolate import RegularGridInterpolator
             points = (self.xp.arange( self.input_shape[0], dtype=self.dtype), self.xp.arange( self.input_shape[1], dtype=self.dtype))
             interp = RegularGridInterpolator(points,value, method='linear')
             out[:] = interp((self.yy, self.xx)).reshape(self.output_shape)
             return out
+
+
+class BatchedInterp2D():
+
+    def __init__(self, interpolators, xp=np, dtype=np.float32):
+        '''
+        Bilinear interpolation of the same input arrays onto the sampling
+        grids of several Interp2D objects at once.
+
+        Results are identical to the ones of Interp2D.interpolate().
+        On CPU, base indices and fractional distances are precomputed,
+        so that each call performs a single vectorized gather for all
+        grids and all input arrays, with the same float64 operations,
+        in the same order, as scipy's RegularGridInterpolator.
+        On GPU, the CUDA kernel of each interpolator is called in turn.
+
+        Parameters
+        ----------
+        interpolators : list of Interp2D
+            Interpolators sharing the same input and output shapes.
+            Interpolators with do_interp=False are not supported.
+        xp : module, optional
+            Array module to use (default: numpy).
+        dtype : data-type, optional
+            Data type for interpolation (default: np.float32).
+        '''
+        if len(interpolators) == 0:
+            raise ValueError('At least one interpolator is required')
+        self.xp = xp
+        self.dtype = dtype
+        self.interpolators = interpolators
+        self.input_shape = tuple(interpolators[0].input_shape)
+        self.output_shape = tuple(interpolators[0].output_shape)
+        self.n = len(interpolators)
+        for interp in interpolators:
+            if not interp.do_interp:
+                raise ValueError('Interpolators without a sampling grid cannot be batched')
+            if tuple(interp.input_shape) != self.input_shape or tuple(interp.output_shape) != self.output_shape:
+                raise ValueError('All interpolators must have the same input and output shapes')
+
+        if self.xp == cp:
+            return
+
+        # Same cell as RegularGridInterpolator: the last one for coordinates on the upper border
+        yy = xp.concatenate([interp.yy for interp in interpolators]).astype(np.float64)
+        xx = xp.concatenate([interp.xx for interp in interpolators]).astype(np.float64)
+        yin = xp.minimum(xp.floor(yy), self.input_shape[0] - 2)
+        xin = xp.minimum(xp.floor(xx), self.input_shape[1] - 2)
+        ydist = yy - yin
+        xdist = xx - xin
+        self.idx = (yin * self.input_shape[1] + xin).astype(xp.int64)
+        self.ydist = (1 - ydist, ydist)
+        self.xdist = (1 - xdist, xdist)
+
+    def interpolate(self, values, out=None):
+        '''
+        Interpolate a list of arrays (all with shape `input_shape`)
+
+        Returns an array of shape (len(values), n_interpolators, *output_shape),
+        where out[i, j] is values[i] interpolated with the j-th interpolator.
+        '''
+        for v in values:
+            if v.shape != self.input_shape:
+                raise ValueError(f'Array to be interpolated must have shape {self.input_shape} instead of {v.shape}')
+
+        if out is None:
+            out = self.xp.empty((len(values), self.n) + self.output_shape, dtype=self.dtype)
+
+        if self.xp == cp:
+            for i, v in enumerate(values):
+                for j, interp in enumerate(self.interpolators):
+                    interp.interpolate(v, out=out[i, j])
+            return out
+
+        stacked = self.xp.stack([v.reshape(-1) for v in values]).astype(np.float64)
+        nx = self.input_shape[1]
+        y0, y1 = self.ydist
+        x0, x1 = self.xdist
+        result = stacked[:, self.idx] * y0 * x0 + \
+                 stacked[:, self.idx + 1] * y0 * x1 + \
+                 stacked[:, self.idx + nx] * y1 * x0 + \
+                 stacked[:, self.idx + nx + 1] * y1 * x1
+        out[:] = result.reshape(out.shape)
+        return out
+
+
+def bilinear_coefficients(xx, yy, input_shape, xp=np, dtype=np.float32):
+    '''
+    Compute flat indices and weights of the four neighbours used
+    for bilinear interpolation at coordinates (yy, xx).
+    Coordinates must be already clipped to the input array boundaries.
+
+    Returns a tuple (idx, weights) of arrays with shape (4, len(xx)),
+    in the order (y, x), (y, x+1), (y+1, x), (y+1, x+1).
+    '''
+    # 32-bit indices are enough for any realistic array and halve memory traffic
+    idx_dtype = xp.int32 if input_shape[0] * input_shape[1] < 2**31 else xp.int64
+    xin = xp.floor(xx).astype(idx_dtype)
+    yin = xp.floor(yy).astype(idx_dtype)
+    xdist = (xx - xin).astype(dtype)
+    ydist = (yy - yin).astype(dtype)
+    # Neighbours outside the array always have a zero weight, since
+    # coordinates are clipped: clip them to avoid out-of-bounds reads
+    xin2 = xp.minimum(xin + 1, input_shape[1] - 1)
+    yin2 = xp.minimum(yin + 1, input_shape[0] - 1)
+
+    idx = xp.stack([yin * input_shape[1] + xin,
+                    yin * input_shape[1] + xin2,
+                    yin2 * input_shape[1] + xin,
+                    yin2 * input_shape[1] + xin2])
+    weights = xp.stack([(1 - xdist) * (1 - ydist),
+                        xdist * (1 - ydist),
+                        ydist * (1 - xdist),
+                        xdist * ydist])
+    return idx, weights
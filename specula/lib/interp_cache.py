@@ -0,0 +1,84 @@
+import os
+import hashlib
+
+import numpy as np
+
+# Increase when the content or layout of cached arrays changes,
+# so that stale cache files are not reused
+CACHE_VERSION = 1
+
+
+class InterpCache():
+    '''
+    Content-hashed cache of interpolation geometry.
+
+    Arrays are stored as .npz files in *cache_dir*, named after a hash
+    of all the parameters that define the geometry, so that they can
+    be reused across simulation runs. Loaded arrays are also kept
+    in a process-wide dictionary shared by all objects.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory where cache files are stored. It is created when needed.
+    '''
+
+    _memory = {}
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(**params):
+        '''
+        Compute the cache key for a set of parameters.
+        Values are converted to plain python types, so that
+        numpy scalars and arrays give the same key as lists and floats.
+        '''
+        def normalize(v):
+            if isinstance(v, np.ndarray):
+                return normalize(v.tolist())
+            if isinstance(v, (list, tuple)):
+                return tuple(normalize(x) for x in v)
+            if isinstance(v, np.generic):
+                return v.item()
+            return v
+
+        items = sorted((k, normalize(v)) for k, v in params.items())
+        s = repr((CACHE_VERSION, items))
+        return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.cache_dir, f'interp_{key}.npz')
+
+    def load(self, key):
+        '''
+        Return a dictionary of CPU arrays for *key*, or None if not cached
+        '''
+        if key in self._memory:
+            return self._memory[key]
+        filename = self.filename(key)
+        if not os.path.exists(filename):
+            return None
+        try:
+            with np.load(filename) as data:
+                arrays = {k: data[k] for k in data.files}
+        except (OSError, ValueError):
+            # Corrupted or partially written file: ignore it
+            return None
+        self._memory[key] = arrays
+        return arrays
+
+    def save(self, key, **arrays):
+        '''
+        Save a set of CPU arrays for *key*.
+        The file is written under a temporary name and then renamed,
+        so that concurrent processes never read a partial file.
+        '''
+        self._memory[key] = arrays
+        os.makedirs(self.cache_dir, exist_ok=True)
+        filename = self.filename(key)
+        tmp_filename = filename + f'.{os.getpid()}.tmp'
+        with open(tmp_filename, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_filename, filename)
@@ -6,7 +6,6 @@ Commenting out unused imports
 from specula import xp
 from scipy import optimize
 import warnings
-import matplotlib.pyplot as plt
 
 
 class BaseMask():
@@ -280,6 +279,7 @@ class CircularMask(BaseMask):
             display = keywords.pop('display', False)
 
             if display:
+                import matplotlib.pyplot as plt
                 fign=plt.figure()
                 
             def _cost_disk(params):
@@ -318,6 +318,7 @@ class CircularMask(BaseMask):
         return self.asTransmissionValue().flatten().nonzero()[0]
 
     def _dispnobl(img, fign=None, **kwargs):
+        import matplotlib.pyplot as plt
         if fign is not None:
             plt.figure(fign.number)
         plt.clf()
@@ -0,0 +1,24 @@
+import os
+import multiprocessing
+
+_lock = None
+_lock_pid = None
+
+
+def memory_barrier():
+    '''
+    Full memory barrier: loads and stores to shared memory issued before
+    the call are not reordered with the ones issued after it.
+
+    Python has no atomic or fence primitives, so a process-local
+    multiprocessing lock is acquired and released: semaphore operations
+    synchronize memory, as required by POSIX. Without a barrier, on weakly ordered
+    CPUs (e.g. arm64) another process may see a counter or sequence number
+    stored after some data before the data itself.
+    '''
+    global _lock, _lock_pid
+    if _lock_pid != os.getpid():
+        _lock = multiprocessing.Lock()
+        _lock_pid = os.getpid()
+    _lock.acquire()
+    _lock.release()
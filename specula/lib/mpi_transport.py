@@ -0,0 +1,238 @@
+import threading
+
+import numpy as np
+
+# computeTag() returns tags in [0, 10**6), and tag+1 is used for
+# generation times. Packet tags are allocated above this range.
+PACKET_TAG_BASE = 10**6 + 1
+
+# Alignment in bytes of each array inside a packet
+PACKET_ALIGN = 64
+
+
+def _aligned(n):
+    return (n + PACKET_ALIGN - 1) // PACKET_ALIGN * PACKET_ALIGN
+
+
+class PacketBuffer():
+    '''
+    Contiguous host buffer holding several arrays and their generation times.
+
+    The buffer starts with an int64 header with one generation time
+    for each array, followed by the arrays themselves, each one aligned
+    to PACKET_ALIGN bytes.
+
+    Parameters
+    ----------
+    layout : list of (shape, dtype) tuples
+        Shape and dtype of each array in the packet
+    '''
+    def __init__(self, layout):
+        self.layout = [(tuple(shape), np.dtype(dtype)) for shape, dtype in layout]
+        offset = _aligned(8 * len(self.layout))
+        offsets = []
+        for shape, dtype in self.layout:
+            offsets.append(offset)
+            offset += _aligned(int(np.prod(shape, dtype=np.int64)) * dtype.itemsize)
+        raw = np.zeros(offset + PACKET_ALIGN, dtype=np.uint8)
+        start = -raw.ctypes.data % PACKET_ALIGN
+        self.buf = raw[start: start + offset]
+        self.gen_times = self.buf[:8 * len(self.layout)].view(np.int64)
+        self.views = []
+        for (shape, dtype), offset in zip(self.layout, offsets):
+            nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            self.views.append(self.buf[offset: offset + nbytes].view(dtype).reshape(shape))
+
+    def pack(self, index, value, generation_time):
+        '''
+        Copy *value* (numpy or cupy array) into the packet slot *index*
+        '''
+        view = self.views[index]
+        if value.shape != view.shape or value.dtype != view.dtype:
+            raise ValueError(f'Packet item {index} changed from {view.shape} {view.dtype}'
+                             f' to {value.shape} {value.dtype}')
+        if hasattr(value, 'get'):
+            value.get(out=view)  # cupy device-to-host copy
+        else:
+            view[...] = value
+        self.gen_times[index] = generation_time
+
+
+class SendPacket():
+    '''
+    All outputs of one processing object that are sent to the same remote rank
+    with the same delay sign, exchanged as a single persistent MPI message.
+
+    Items are registered with add() in connection order, which is the same
+    on the sending and receiving ranks. Until start() is called, each item
+    is sent with the usual per-output messages.
+    '''
+    def __init__(self, comm, dest_rank, tag, delayed):
+        self.comm = comm
+        self.dest_rank = dest_rank
+        self.tag = tag
+        self.delayed = delayed
+        self.items = []
+        self.packet = None
+        self.request = None
+        self.pending = False
+
+    @property
+    def active(self):
+        return self.request is not None
+
+    def add(self, out_name, dest_tag):
+        self.items.append((out_name, dest_tag))
+
+    def can_start(self, outputs, sent_valid):
+        '''
+        True when all items have already been sent once with a valid value,
+        so that their shape and dtype are known on both sides.
+        '''
+        for out_name, dest_tag in self.items:
+            output = outputs[out_name]
+            if isinstance(output, list) or dest_tag not in sent_valid:
+                return False
+            if output.get_value() is None:
+                return False
+        return True
+
+    def start(self, outputs):
+        '''
+        Send the packet layout and set up the persistent send request
+        '''
+        layout = []
+        for out_name, _ in self.items:
+            value = outputs[out_name].get_value()
+            layout.append((value.shape, value.dtype.str))
+        self.comm.ibsend(layout, dest=self.dest_rank, tag=self.tag)
+        self.packet = PacketBuffer(layout)
+        self.request = self.comm.Send_init(self.packet.buf, dest=self.dest_rank, tag=self.tag)
+
+    def send(self, outputs):
+        '''
+        Pack the current value of all items and start the persistent send.
+        The previous send, if still in progress, is completed first,
+        since it uses the same buffer.
+        '''
+        if self.pending:
+            self.request.Wait()
+        for i, (out_name, _) in enumerate(self.items):
+            item = outputs[out_name]
+            self.packet.pack(i, item.get_value(), item.generation_time)
+        self.request.Start()
+        self.pending = True
+
+    def close(self):
+        if self.request is not None:
+            if self.pending:
+                self.request.Wait()
+            self.request.Free()
+            self.request = None
+        self.pending = False
+
+
+class RecvPacket():
+    '''
+    Receiving side of a SendPacket.
+
+    After setup(), the persistent receive is always posted in advance:
+    it is started again as soon as all items of the previous
+    packet have been consumed, so that the next message can arrive
+    while the receiving objects are still computing. Items can be
+    consumed from different threads when trigger levels run in parallel.
+    '''
+    def __init__(self, comm, source_rank, tag):
+        self.comm = comm
+        self.source_rank = source_rank
+        self.tag = tag
+        self.nitems = 0
+        self.packet = None
+        self.request = None
+        self.posted = False
+        self.received = False
+        self.consumed = set()
+        self.lock = threading.Lock()
+
+    def add(self):
+        '''Register a new item and return its index in the packet'''
+        self.nitems += 1
+        return self.nitems - 1
+
+    def setup(self):
+        '''
+        Receive the packet layout and post the first persistent receive.
+        Does nothing if already set up.
+        '''
+        if self.request is not None:
+            return
+        layout = self.comm.recv(source=self.source_rank, tag=self.tag)
+        if len(layout) != self.nitems:
+            raise ValueError(f'Packet with tag {self.tag} from rank {self.source_rank}'
+                             f' has {len(layout)} items, expected {self.nitems}')
+        self.packet = PacketBuffer(layout)
+        self.request = self.comm.Recv_init(self.packet.buf, source=self.source_rank, tag=self.tag)
+        self.request.Start()
+        self.posted = True
+
+    def get(self, index):
+        '''
+        Return a (view, generation_time) tuple for item *index*, waiting
+        for the packet to arrive if needed. The view is only valid
+        until release() is called.
+        '''
+        with self.lock:
+            if not self.received:
+                self.request.Wait()
+                self.posted = False
+                self.received = True
+        return self.packet.views[index], int(self.packet.gen_times[index])
+
+    def release(self, index):
+        with self.lock:
+            self.consumed.add(index)
+            if len(self.consumed) == self.nitems:
+                self.consumed.clear()
+                self.received = False
+                self.request.Start()
+                self.posted = True
+
+    def close(self):
+        if self.request is not None:
+            if self.posted:
+                # Receive posted for a packet that will never be sent
+                self.request.Cancel()
+                self.request.Wait()
+            self.request.Free()
+            self.request = None
+        self.posted = False
+
+
+class BatchedTransport():
+    '''
+    Registry of all send and receive packets of this process.
+
+    Packet tags are allocated by Simul in connection order, so that
+    all ranks assign the same tag to the same packet, without hashing.
+    '''
+    def __init__(self, comm):
+        self.comm = comm
+        self.send_packets = {}
+        self.recv_packets = {}
+
+    def send_packet(self, tag, dest_rank, delayed):
+        if tag not in self.send_packets:
+            self.send_packets[tag] = SendPacket(self.comm, dest_rank, tag, delayed)
+        return self.send_packets[tag]
+
+    def recv_packet(self, tag, source_rank):
+        if tag not in self.recv_packets:
+            self.recv_packets[tag] = RecvPacket(self.comm, source_rank, tag)
+        return self.recv_packets[tag]
+
+    def close(self):
+        '''Complete pending sends and free all persistent requests'''
+        for packet in self.send_packets.values():
+            packet.close()
+        for packet in self.recv_packets.values():
+            packet.close()
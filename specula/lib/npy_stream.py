@@ -0,0 +1,111 @@
+import queue
+import threading
+
+import numpy as np
+
+# Fixed size of the .npy header written by NpyStreamWriter. It is large
+# enough to hold the header dictionary of any realistic array, and it is
+# a multiple of 64 bytes as required by the npy format specification.
+NPY_HEADER_SIZE = 512
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def _npy_header(dtype, shape):
+    '''
+    Build a version 1.0 npy header of exactly NPY_HEADER_SIZE bytes
+    '''
+    d = {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+         'fortran_order': False,
+         'shape': tuple(shape)}
+    header_len = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2
+    header = repr(d).ljust(header_len - 1) + '\n'
+    if len(header) > header_len:
+        raise ValueError(f'Array shape {shape} does not fit in the npy header')
+    return NPY_MAGIC + header_len.to_bytes(2, 'little') + header.encode('latin1')
+
+
+class NpyStreamWriter():
+    '''
+    Append-only writer for a standard .npy file.
+
+    Frames (all with the same shape and dtype) are appended along a new
+    leading axis. The file header is written with a fixed, padded size
+    and rewritten in place by close() with the final number of frames,
+    so that the resulting file can be opened with np.load(mmap_mode='r').
+    '''
+    def __init__(self, filename, frame_shape, dtype):
+        self.filename = filename
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.nframes = 0
+        self._f = open(filename, 'wb')
+        self._f.write(_npy_header(self.dtype, (0,) + self.frame_shape))
+
+    def write(self, frames):
+        '''
+        Append a block of frames with shape (n, *frame_shape)
+        '''
+        frames = np.ascontiguousarray(frames, dtype=self.dtype)
+        if frames.shape[1:] != self.frame_shape:
+            raise ValueError(f'Frame shape {frames.shape[1:]} does not match'
+                             f' stream shape {self.frame_shape} in {self.filename}')
+        self._f.write(frames.data)
+        self.nframes += frames.shape[0]
+
+    def close(self):
+        if self._f is None:
+            return
+        self._f.seek(0)
+        self._f.write(_npy_header(self.dtype, (self.nframes,) + self.frame_shape))
+        self._f.close()
+        self._f = None
+
+
+class BackgroundWriter():
+    '''
+    Single background thread that executes write requests
+    (a writer object and a block of frames) from a bounded queue.
+
+    When the queue is full, submit() blocks, so that memory usage is limited
+    to *max_pending* blocks. Exceptions raised in the background thread
+    are re-raised in the calling thread by the next submit() or by close().
+    '''
+    def __init__(self, max_pending=4):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._exception = None
+        self._thread = threading.Thread(target=self._run, daemon=True, name='specula_writer')
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._exception is None:
+                    writer, frames = item
+                    writer.write(frames)
+            except Exception as e:
+                self._exception = e
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        if self._exception is not None:
+            e, self._exception = self._exception, None
+            raise e
+
+    def submit(self, writer, frames):
+        self._check()
+        self._queue.put((writer, frames))
+
+    def flush(self):
+        '''Wait until all pending blocks have been written'''
+        self._queue.join()
+        self._check()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._check()
@@ -0,0 +1,180 @@
+import json
+import time
+import threading
+import tracemalloc
+from collections import defaultdict
+from functools import wraps
+
+from specula import cp, process_rank
+
+# tracemalloc.reset_peak() is only available from Python 3.9: on older versions,
+# the net allocation of each call is measured instead of its peak
+_has_reset_peak = hasattr(tracemalloc, 'reset_peak')
+
+
+class ObjectProfiler():
+    '''
+    Per-object profiler for processing objects.
+
+    Instrumented objects have their check_ready(), prepare_trigger(), trigger(),
+    post_trigger() and send_outputs() methods wrapped so that the wall time of
+    each call is recorded. For objects running on the CPU, the peak number of
+    bytes allocated during each call is also measured using tracemalloc.
+
+    At the end of the simulation, report() writes a per-object summary table
+    and a Chrome trace JSON file (viewable with chrome://tracing or Perfetto).
+
+    Memory measurements are only reliable when objects are triggered
+    sequentially, because tracemalloc counters are global to the process.
+    GPU objects are synchronized after each call, so that the measured time
+    includes the kernel execution time.
+
+    Parameters
+    ----------
+    output_prefix : str
+        Prefix of the output files. The summary is saved as <output_prefix>.txt
+        and the trace as <output_prefix>.json. When running with MPI,
+        the process rank is appended to the prefix.
+    trace_memory : bool
+        Enable tracemalloc measurements for CPU objects
+    max_trace_events : int
+        Maximum number of events stored for the Chrome trace. Statistics
+        are accumulated even after this limit is reached.
+    '''
+
+    methods = ['check_ready', 'prepare_trigger', 'trigger', 'post_trigger', 'send_outputs']
+
+    def __init__(self, output_prefix='specula_profile', trace_memory=True, max_trace_events=1000000):
+        self.output_prefix = output_prefix
+        if process_rank is not None:
+            self.output_prefix += f'_rank{process_rank}'
+        self.trace_memory = trace_memory
+        self.max_trace_events = max_trace_events
+        self.events = []
+        self.total_time = defaultdict(float)
+        self.ncalls = defaultdict(int)
+        self.total_bytes = defaultdict(int)
+        self.obj_names = []
+        self._local = threading.local()
+        self._t0 = time.perf_counter()
+        self._started_tracemalloc = False
+
+    def start(self):
+        '''Start memory tracing, if requested'''
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._t0 = time.perf_counter()
+
+    def stop(self):
+        '''Stop memory tracing, if started by this profiler'''
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def instrument(self, obj):
+        '''
+        Wrap the profiled methods of a processing object.
+        The wrappers are set as instance attributes, so that
+        objects that are not instrumented do not pay any overhead.
+        '''
+        if obj.name not in self.obj_names:
+            self.obj_names.append(obj.name)
+        for method_name in self.methods:
+            method = getattr(obj, method_name)
+            setattr(obj, method_name, self._wrap(obj, method_name, method))
+
+    def _wrap(self, obj, method_name, method):
+        measure_memory = self.trace_memory and obj.target_device_idx < 0
+        sync_device = obj.target_device_idx >= 0 and cp is not None
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            # Nested calls (e.g. prepare_trigger() inside check_ready())
+            # must not reset the tracemalloc peak of the outer call
+            depth = getattr(self._local, 'depth', 0)
+            self._local.depth = depth + 1
+            measure = measure_memory and depth == 0 and tracemalloc.is_tracing()
+            if measure:
+                if _has_reset_peak:
+                    tracemalloc.reset_peak()
+                mem_start = tracemalloc.get_traced_memory()[0]
+            t_start = time.perf_counter()
+            try:
+                retval = method(*args, **kwargs)
+                if sync_device:
+                    cp.cuda.Device(obj.target_device_idx).synchronize()
+            finally:
+                t_end = time.perf_counter()
+                self._local.depth = depth
+            nbytes = 0
+            if measure:
+                current, peak = tracemalloc.get_traced_memory()
+                nbytes = (peak if _has_reset_peak else current) - mem_start
+            self.record(obj.name, method_name, t_start, t_end, nbytes)
+            return retval
+
+        return wrapper
+
+    def record(self, obj_name, method_name, t_start, t_end, nbytes=0):
+        key = (obj_name, method_name)
+        self.total_time[key] += t_end - t_start
+        self.ncalls[key] += 1
+        self.total_bytes[key] += nbytes
+        if len(self.events) < self.max_trace_events:
+            self.events.append({'name': method_name,
+                                'cat': obj_name,
+                                'ph': 'X',
+                                'ts': (t_start - self._t0) * 1e6,
+                                'dur': (t_end - t_start) * 1e6,
+                                'pid': process_rank or 0,
+                                'tid': threading.get_ident(),
+                                'args': {'object': obj_name, 'bytes': nbytes}})
+
+    def summary(self, niters=None):
+        '''
+        Return a text table with the total and per-iteration time
+        spent by each object in each method, and the bytes allocated.
+        Objects are sorted by total time, most expensive first.
+        '''
+        if niters is None:
+            niters = max([n for (name, method), n in self.ncalls.items() if method == 'check_ready'], default=1)
+        niters = max(niters, 1)
+
+        obj_time = defaultdict(float)
+        obj_bytes = defaultdict(int)
+        for (name, method), t in self.total_time.items():
+            # prepare_trigger() is nested inside check_ready()
+            if method != 'prepare_trigger':
+                obj_time[name] += t
+                obj_bytes[name] += self.total_bytes[(name, method)]
+        grand_total = sum(obj_time.values())
+
+        header = f'{"Object":30s}' + ''.join([f'{m:>16s}' for m in self.methods]) + \
+                 f'{"ms/iter":>12s}{"%":>8s}{"kB/iter":>12s}'
+        lines = [f'Per-object profile ({niters} iterations, times in ms/iter)', header, '-' * len(header)]
+        for name in sorted(self.obj_names, key=lambda x: obj_time[x], reverse=True):
+            row = f'{name[:30]:30s}'
+            for method in self.methods:
+                row += f'{1000 * self.total_time[(name, method)] / niters:16.4f}'
+            perc = 100 * obj_time[name] / grand_total if grand_total > 0 else 0
+            row += f'{1000 * obj_time[name] / niters:12.4f}{perc:8.2f}{obj_bytes[name] / 1024 / niters:12.2f}'
+            lines.append(row)
+        lines.append('-' * len(header))
+        lines.append(f'{"Total":30s}' + ' ' * 16 * len(self.methods) + f'{1000 * grand_total / niters:12.4f}')
+        return '\n'.join(lines)
+
+    def save_chrome_trace(self, filename):
+        '''Save all recorded events in the Chrome trace event format'''
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+    def report(self, niters=None):
+        '''Print the summary table and write the output files'''
+        self.stop()
+        table = self.summary(niters)
+        print(table, flush=True)
+        with open(self.output_prefix + '.txt', 'w') as f:
+            f.write(table + '\n')
+        self.save_chrome_trace(self.output_prefix + '.json')
+        print(f'Object profile saved to {self.output_prefix}.txt and {self.output_prefix}.json', flush=True)
@@ -0,0 +1,252 @@
+import numpy as np
+
+
+class OnlineReduction():
+    '''
+    Base class for reductions of a time series computed on the fly,
+    one sample at a time, on the device of the array module *xp*.
+
+    Accumulators are allocated when the first sample arrives.
+    Attributes listed in *state_attrs* are saved in simulation checkpoints.
+    '''
+
+    state_attrs = ()
+
+    def __init__(self, xp, dtype):
+        self.xp = xp
+        self.dtype = dtype
+        self.count = 0
+        self.first_t = None
+        self.last_t = None
+
+    def add(self, value, t):
+        '''Add the sample *value*, generated at time *t*'''
+        if self.first_t is None:
+            self.first_t = t
+        self.last_t = t
+        self.count += 1
+        self.accumulate(value)
+
+    def accumulate(self, value):
+        raise NotImplementedError
+
+    def products(self):
+        '''
+        Return a dictionary of reduced products, indexed by file name suffix.
+        Each entry is a (frame, header, same_type) tuple, where *header* is a
+        dictionary of additional FITS keywords and *same_type* tells whether
+        the frame has the shape of the input values.
+        '''
+        raise NotImplementedError
+
+    def header(self):
+        return {'NSAMPLES': int(self.count), 'FIRST_T': int(self.first_t), 'LAST_T': int(self.last_t)}
+
+
+class MeanVar(OnlineReduction):
+    '''
+    Element-wise running mean and unbiased variance (Welford's algorithm)
+    '''
+
+    state_attrs = ('count', 'first_t', 'last_t', 'mean', 'm2')
+
+    def __init__(self, xp, dtype):
+        super().__init__(xp, dtype)
+        self.mean = None
+        self.m2 = None
+
+    def accumulate(self, value):
+        if self.mean is None:
+            self.mean = self.xp.zeros(value.shape, dtype=self.dtype)
+            self.m2 = self.xp.zeros(value.shape, dtype=self.dtype)
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def products(self):
+        if self.count > 1:
+            var = self.m2 / (self.count - 1)
+        else:
+            var = self.xp.zeros_like(self.m2)
+        return {'mean': (self.mean, self.header(), True),
+                'var': (var, self.header(), True)}
+
+
+class MinMax(OnlineReduction):
+    '''
+    Element-wise minimum and maximum
+    '''
+
+    state_attrs = ('count', 'first_t', 'last_t', 'min', 'max')
+
+    def __init__(self, xp, dtype):
+        super().__init__(xp, dtype)
+        self.min = None
+        self.max = None
+
+    def accumulate(self, value):
+        if self.min is None:
+            self.min = self.xp.array(value, dtype=self.dtype)
+            self.max = self.xp.array(value, dtype=self.dtype)
+        else:
+            self.xp.minimum(self.min, value, out=self.min)
+            self.xp.maximum(self.max, value, out=self.max)
+
+    def products(self):
+        return {'min': (self.min, self.header(), True),
+                'max': (self.max, self.header(), True)}
+
+
+class Histogram(OnlineReduction):
+    '''
+    Histogram of all the elements of the input values, accumulated over time
+
+    Parameters
+    ----------
+    bins : int
+        Number of bins
+    range : list
+        [min, max] range of the histogram. Values outside it are not counted.
+    '''
+
+    state_attrs = ('count', 'first_t', 'last_t', 'counts')
+
+    def __init__(self, xp, dtype, bins: int, range: list):
+        super().__init__(xp, dtype)
+        if len(range) != 2 or range[1] <= range[0]:
+            raise ValueError(f'Invalid histogram range {range}')
+        self.bins = int(bins)
+        self.range = (float(range[0]), float(range[1]))
+        self.counts = self.xp.zeros(self.bins, dtype=self.xp.int64)
+
+    def accumulate(self, value):
+        counts, _ = self.xp.histogram(value, bins=self.bins, range=self.range)
+        self.counts += counts
+
+    def products(self):
+        hdr = self.header()
+        hdr['HIST_MIN'] = self.range[0]
+        hdr['HIST_MAX'] = self.range[1]
+        return {'hist': (self.counts, hdr, False)}
+
+
+class WelchPsd(OnlineReduction):
+    '''
+    Element-wise one-sided power spectral density, estimated with Welch's
+    method: the time series is split into segments of *nfft* samples,
+    overlapping by *nfft* - *hop* samples, each segment is detrended
+    (mean removed), multiplied by a Hann window and Fourier transformed,
+    and the squared moduli are averaged. The result has the same
+    normalization as scipy.signal.welch(scaling='density').
+
+    The last *nfft* samples are kept in a circular buffer.
+    The sampling frequency is derived from the time of the first two samples.
+
+    Parameters
+    ----------
+    t_to_seconds : callable
+        Function converting internal times to seconds
+    nfft : int
+        Segment length, in samples
+    hop : int, optional
+        Number of samples between consecutive segments. Defaults to nfft // 2.
+    '''
+
+    state_attrs = ('count', 'first_t', 'last_t', 'second_t', 'buffer', 'acc', 'nseg')
+
+    def __init__(self, xp, dtype, t_to_seconds, nfft: int, hop: int=None):
+        super().__init__(xp, dtype)
+        if nfft < 2:
+            raise ValueError('nfft must be at least 2')
+        self.t_to_seconds = t_to_seconds
+        self.nfft = int(nfft)
+        self.hop = int(hop) if hop is not None else max(self.nfft // 2, 1)
+        if self.hop < 1:
+            raise ValueError('hop must be a positive integer')
+        self.window = self.xp.asarray(np.hanning(self.nfft + 1)[:-1], dtype=self.dtype)
+        self.second_t = None
+        self.buffer = None
+        self.acc = None
+        self.nseg = 0
+
+    def add(self, value, t):
+        if self.count == 1:
+            self.second_t = t
+        super().add(value, t)
+
+    def accumulate(self, value):
+        xp = self.xp
+        if self.buffer is None:
+            self.buffer = xp.zeros((self.nfft,) + value.shape, dtype=self.dtype)
+            self.acc = xp.zeros((self.nfft // 2 + 1,) + value.shape, dtype=self.dtype)
+        self.buffer[(self.count - 1) % self.nfft] = value
+
+        if self.count >= self.nfft and (self.count - self.nfft) % self.hop == 0:
+            # Oldest sample first
+            segment = xp.roll(self.buffer, -(self.count % self.nfft), axis=0)
+            segment -= segment.mean(axis=0)
+            segment *= self.window.reshape((-1,) + (1,) * value.ndim)
+            self.acc += xp.abs(xp.fft.rfft(segment, axis=0)) ** 2
+            self.nseg += 1
+
+    def products(self):
+        if self.nseg == 0:
+            print(f'Warning: PSD not computed, {self.count} samples are less than nfft={self.nfft}')
+            return {}
+        dt = self.t_to_seconds(self.second_t - self.first_t)
+        fs = 1.0 / dt
+        psd = self.acc / (self.nseg * fs * float((self.window ** 2).sum()))
+        if self.nfft % 2 == 0:
+            psd[1:-1] *= 2
+        else:
+            psd[1:] *= 2
+        hdr = self.header()
+        hdr['PSD_DF'] = fs / self.nfft
+        hdr['PSD_NFFT'] = self.nfft
+        hdr['PSD_NSEG'] = self.nseg
+        return {'psd': (psd, hdr, False)}
+
+
+# Reductions available in DataStore, by name
+REDUCTIONS = {'mean_var': MeanVar,
+              'min_max': MinMax,
+              'histogram': Histogram,
+              'psd': WelchPsd}
+
+
+def parse_reductions(spec):
+    '''
+    Normalize the reduction specification of a single key into a list
+    of (name, kwargs) tuples. *spec* can be a reduction name, a dictionary
+    {name: parameters} or a list of them. Parameters are either a dictionary
+    of keyword arguments, or None. For 'decimate', the parameter is the
+    decimation factor.
+    '''
+    if isinstance(spec, str):
+        spec = {spec: None}
+    if isinstance(spec, (list, tuple)):
+        result = []
+        for s in spec:
+            result += parse_reductions(s)
+        return result
+    if not isinstance(spec, dict):
+        raise ValueError(f'Invalid reduction specification: {spec}')
+
+    result = []
+    for name, params in spec.items():
+        if name == 'decimate':
+            if isinstance(params, dict):
+                params = params.get('n')
+            if not isinstance(params, int) or params < 1:
+                raise ValueError(f'The decimation factor must be a positive integer, got {params}')
+            result.append((name, {'n': params}))
+        elif name in REDUCTIONS:
+            if params is None:
+                params = {}
+            if not isinstance(params, dict):
+                raise ValueError(f'Parameters of reduction {name} must be a dictionary, got {params}')
+            result.append((name, dict(params)))
+        else:
+            raise ValueError(f'Unknown reduction {name}, must be one of'
+                             f' {["decimate"] + list(REDUCTIONS.keys())}')
+    return result
@@ -1,19 +1,114 @@
 import os
+import json
 
+import numpy as np
 from specula import cpuArray
 from astropy.io import fits
 
-from specula.lib.calc_phasescreen import calc_phasescreen
+from specula.lib.calc_phasescreen import calc_phasescreen, calc_phasescreen_rfft
 
-def phasescreens_manager(L0, dimension, pixel_pitch, directory, xp, precision, seed=None, verbose=False):
+# Phase screen generation methods, see phasescreens_manager()
+phasescreen_methods = ['fft', 'rfft']
+
+
+def phasescreen_basename(seed, dimension, pixel_pitch, L0, precision, method='fft'):
+    '''
+    File name, without extension, of the phase screen with the given parameters
+    '''
+    precision_str = 'single' if precision == 1 else 'double'
+    name = f'ps_seed{int(seed)}_dim{int(dimension)}_pixpit{pixel_pitch:.3f}_L0{float(L0):.4f}_{precision_str}'
+    if method == 'rfft':
+        name += '_rfft'
+    return name
+
+
+def open_phasescreen(directory, basename):
+    '''
+    Return a read-only memory map of the phase screen *basename* in *directory*,
+    or None if it has not been saved (yet).
+
+    Each screen is made of two files: a raw binary file with the phase
+    in radians at 500 nm, in native byte order and starting at offset 0,
+    and a small JSON index with its dtype, shape and generation parameters,
+    which is written last and marks the screen as complete.
+    Being read-only and page-aligned, the memory map is shared
+    through the OS page cache by all local processes using the screen.
+    '''
+    index_filename = os.path.join(directory, basename + '.json')
+    if not os.path.exists(index_filename):
+        return None
+    with open(index_filename) as f:
+        index = json.load(f)
+    return np.memmap(os.path.join(directory, basename + '.raw'), dtype=np.dtype(index['dtype']),
+                     mode='r', shape=tuple(index['shape']))
+
+
+def save_phasescreen(directory, basename, phasescreen=None, shape=None, dtype=None, compute=None, **params):
+    '''
+    Save a phase screen in *directory*, in the format read by open_phasescreen().
+
+    Either *phasescreen* is the array to save, or *compute* is a function
+    filling the writable memory map of the given *shape* and *dtype* passed as argument.
+    Additional keyword arguments are stored in the JSON index. Files are written
+    with temporary names, so that processes generating the same screen
+    at the same time never read an incomplete one.
+    '''
+    raw_filename = os.path.join(directory, basename + '.raw')
+    index_filename = os.path.join(directory, basename + '.json')
+    tmp_suffix = f'.{os.getpid()}.tmp'
+
+    if phasescreen is not None:
+        phasescreen = np.ascontiguousarray(cpuArray(phasescreen))
+        phasescreen = phasescreen.astype(phasescreen.dtype.newbyteorder('='), copy=False)
+        shape, dtype = phasescreen.shape, phasescreen.dtype
+        phasescreen.tofile(raw_filename + tmp_suffix)
+    else:
+        out = np.memmap(raw_filename + tmp_suffix, dtype=dtype, mode='w+', shape=shape)
+        compute(out)
+        out.flush()
+        del out
+    os.replace(raw_filename + tmp_suffix, raw_filename)
+
+    index = dict(dtype=np.dtype(dtype).str, shape=[int(n) for n in shape], **params)
+    with open(index_filename + tmp_suffix, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(index_filename + tmp_suffix, index_filename)
+
+
+def _legacy_fits_filenames(seed, dimension, pixel_pitch, L0, precision, method):
+    '''FITS file names used by previous versions of phasescreens_manager()'''
+    precision_str = 'single' if precision == 1 else 'double'
+    if method == 'rfft':
+        return [phasescreen_basename(seed, dimension, pixel_pitch, L0, precision, method) + '.fits']
+    names = []
+    for seed_str in [f'{np.around(seed)}', f'{float(seed)}']:
+        for L0_str in [f'{float(L0):.4f}', f'{np.around(L0):.4f}']:
+            names.append(f'ps_seed{seed_str}_dim{np.around(dimension)}_pixpit{pixel_pitch:.3f}'
+                         f'_L0{L0_str}_{precision_str}.fits')
+    return names
+
+
+def phasescreens_manager(L0, dimension, pixel_pitch, directory, xp, precision, seed=None, verbose=False,
+                         method='fft'):
+    '''
+    Return read-only memory maps of the phase screens for each seed,
+    stored in *directory* (see open_phasescreen()), computing and
+    saving the ones that are not found. Phase screens saved as FITS
+    files by previous versions are converted once.
+
+    With method='rfft', screens are computed on CPU with calc_phasescreen_rfft(),
+    writing directly into the memory-mapped file, and saved with a
+    different file name, since they differ from the 'fft' ones.
+    '''
     if seed is None:
         seed = [0]
-    
-    precision_str = 'single' if precision==1 else 'double'
+    if method not in phasescreen_methods:
+        raise ValueError(f'Unknown phase screen method {method}, must be one of {phasescreen_methods}')
+
+    dtype = np.float32 if precision == 1 else np.float64
 
     # Ensure the directory exists
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+    os.makedirs(directory, exist_ok=True)
 
     # List to store phase screens
     phasescreens = []
@@ -26,29 +121,39 @@ def phasescreens_manager(L0, dimension, pixel_pitch, directory, xp, precision, s
         else:
             raise ValueError("The number of elements in L0 must be 1 or the same as the number of seeds!")
 
-        # Construct the file names
-        phasescreen_name = f'ps_seed{xp.around(element)}_dim{xp.around(dimension)}_pixpit{pixel_pitch:.3f}_L0{float(L0i):.4f}_{precision_str}.fits'
-        phasescreen_name1 = f'ps_seed{xp.around(element)}_dim{xp.around(dimension)}_pixpit{pixel_pitch:.3f}_L0{xp.around(L0i):.4f}_{precision_str}.fits'
-        phasescreen_name2 = f'ps_seed{float(element)}_dim{xp.around(dimension)}_pixpit{pixel_pitch:.3f}_L0{float(L0i):.4f}_{precision_str}.fits'
-        phasescreen_name3 = f'ps_seed{float(element)}_dim{xp.around(dimension)}_pixpit{pixel_pitch:.3f}_L0{xp.around(L0i):.4f}_{precision_str}.fits'
-
-        # Check if the phase screen file exists in the directory
-        if os.path.exists(os.path.join(directory, phasescreen_name)):
-            phasescreen = fits.getdata(os.path.join(directory, phasescreen_name), memmap=True)
-        elif os.path.exists(os.path.join(directory, phasescreen_name1)):
-            phasescreen = fits.getdata(os.path.join(directory, phasescreen_name1), memmap=True)
-        elif os.path.exists(os.path.join(directory, phasescreen_name2)):
-            phasescreen = fits.getdata(os.path.join(directory, phasescreen_name2), memmap=True)
-        elif os.path.exists(os.path.join(directory, phasescreen_name3)):
-            phasescreen = fits.getdata(os.path.join(directory, phasescreen_name3), memmap=True)
+        element = cpuArray(element)
+        basename = phasescreen_basename(element, dimension, pixel_pitch, L0i, precision, method)
+        phasescreen = open_phasescreen(directory, basename)
+        if phasescreen is not None:
+            phasescreens.append(phasescreen)
+            continue
+
+        params = dict(seed=int(element), L0=float(L0i), pixel_pitch=float(pixel_pitch),
+                      precision=int(precision), method=method)
+
+        legacy = [os.path.join(directory, name)
+                  for name in _legacy_fits_filenames(element, dimension, pixel_pitch, L0i, precision, method)]
+        legacy = [filename for filename in legacy if os.path.exists(filename)]
+        if len(legacy) > 0:
+            print(f'Converting phasescreen {legacy[0]}...')
+            save_phasescreen(directory, basename, fits.getdata(legacy[0]), **params)
+        elif method == 'rfft':
+            print('Calculating phasescreen...')
+            dim = 2**int(np.ceil(np.log2(float(dimension))))
+            save_phasescreen(directory, basename, shape=(dim, dim), dtype=dtype,
+                             compute=lambda out: calc_phasescreen_rfft(L0i, dim, pixel_pitch, precision,
+                                                                       seed=element, out=out, verbose=verbose),
+                             **params)
         else:
             # Calculate the phase screen if it does not exist
             print('Calculating phasescreen...')
-            phasescreen = calc_phasescreen(L0i, dimension, pixel_pitch, seed=element, precision=precision, verbose=verbose, xp=xp)
-            fits.writeto(os.path.join(directory, phasescreen_name), cpuArray(phasescreen), overwrite=True)
-            print('Done')
-        
+            phasescreen = calc_phasescreen(L0i, dimension, pixel_pitch, seed=element, precision=precision,
+                                           verbose=verbose, xp=xp)
+            save_phasescreen(directory, basename, phasescreen, **params)
+            del phasescreen
+        print('Done')
+
         # Add the phase screen to the list
-        phasescreens.append(phasescreen)
+        phasescreens.append(open_phasescreen(directory, basename))
 
     return phasescreens
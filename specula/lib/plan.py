@@ -0,0 +1,247 @@
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from specula import cp, array_types
+
+
+ObjectPlan = namedtuple('ObjectPlan', 'name classname device host_bytes device_bytes flops triggers_per_step')
+
+
+def fft_flops(shape, batch=1):
+    '''
+    Conventional floating point operation count of a complex FFT
+    of the given shape (5 N log2 N), repeated *batch* times
+    '''
+    n = int(np.prod(shape))
+    if n <= 1:
+        return 0
+    return int(5 * n * np.log2(n) * batch)
+
+
+def matmul_flops(rows, cols, batch=1):
+    '''
+    Floating point operation count of a (rows, cols) matrix
+    multiplied by *batch* vectors
+    '''
+    return 2 * int(rows) * int(cols) * batch
+
+
+def _root_array(a):
+    '''Array owning the memory of *a*, which might be a view'''
+    while type(a.base) in array_types:
+        a = a.base
+    return a
+
+
+def object_bytes(obj, seen_arrays, seen_objs=None):
+    '''
+    Return a (host_bytes, device_bytes) tuple with the memory used by all
+    CPU and GPU arrays referenced by *obj*, either directly or through data
+    objects, lists, tuples and dictionaries. Arrays whose memory is
+    in *seen_arrays* (a set of ids) are not counted again, so that memory
+    shared by several objects is attributed to the first one.
+    Inputs and references to other processing objects are not followed.
+    '''
+    from specula.base_data_obj import BaseDataObj
+    from specula.base_processing_obj import BaseProcessingObj
+
+    if seen_objs is None:
+        seen_objs = set()
+    host = device = 0
+
+    def visit(value, top=False):
+        nonlocal host, device
+        if type(value) in array_types:
+            root = _root_array(value)
+            if id(root) in seen_arrays:
+                return
+            seen_arrays.add(id(root))
+            if type(root) is np.ndarray:
+                host += root.nbytes
+            else:
+                device += root.nbytes
+        elif isinstance(value, (list, tuple)):
+            for x in value:
+                visit(x)
+        elif isinstance(value, dict):
+            for x in value.values():
+                visit(x)
+        elif isinstance(value, BaseDataObj) or (top and isinstance(value, BaseProcessingObj)):
+            if id(value) in seen_objs:
+                return
+            seen_objs.add(id(value))
+            for attr, x in vars(value).items():
+                if attr not in ('inputs', 'local_inputs'):
+                    visit(x)
+
+    visit(obj, top=True)
+    return host, device
+
+
+def benchmark_rates(xp, dtype, complex_dtype, repeat=5):
+    '''
+    Measure the throughput of *xp* in floating point operations
+    per second, for FFTs and for matrix-vector products.
+    Returns a dictionary with the 'fft' and 'matmul' keys.
+    '''
+    def sync():
+        if cp is not None and xp is cp:
+            cp.cuda.Device().synchronize()
+
+    def measure(f, flops):
+        f()  # Warm-up (plans, kernel compilation)
+        sync()
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            f()
+        sync()
+        return flops * repeat / max(time.perf_counter() - t0, 1e-9)
+
+    a = xp.ones((16, 256, 256), dtype=complex_dtype)
+    m = xp.ones((2048, 2048), dtype=dtype)
+    v = xp.ones(2048, dtype=dtype)
+    return {'fft': measure(lambda: xp.fft.fft2(a), fft_flops((256, 256), batch=16)),
+            'matmul': measure(lambda: m @ v, matmul_flops(2048, 2048))}
+
+
+def _format_bytes(n):
+    for unit in ['B', 'kB', 'MB', 'GB']:
+        if n < 1024 or unit == 'GB':
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+
+
+def _format_time(seconds):
+    if seconds < 120:
+        return f'{seconds:.1f} s'
+    elif seconds < 7200:
+        return f'{seconds / 60:.1f} min'
+    return f'{seconds / 3600:.1f} h'
+
+
+class SimulationPlan():
+    '''
+    Pre-flight estimate of the memory footprint and computational cost
+    of a simulation, used by the --plan option.
+
+    Objects are built and set up (so that workspaces allocated in setup()
+    are included) but never triggered. For each object, memory is
+    measured from the arrays it references, and the number of floating
+    point operations per trigger comes from its estimate_flops() method.
+    The projected runtime uses the FFT and matrix-vector throughput
+    measured on each device, and is therefore a lower bound, since
+    element-wise operations and data transfers are not accounted for.
+
+    Parameters
+    ----------
+    objs : dict
+        Dictionary of all simulation objects, indexed by name
+    trigger_order : list
+        Names of processing objects in trigger order
+    niters : int
+        Number of simulation steps
+    dt : int
+        Simulation time step, in internal time units
+    '''
+    def __init__(self, objs, trigger_order, niters, dt):
+        self.objs = objs
+        self.trigger_order = trigger_order
+        self.niters = niters
+        self.dt = dt
+        self.entries = []
+        self.rates = {}
+
+    def setup(self):
+        '''Call setup() on all processing objects, reporting memory failures'''
+        for name in self.trigger_order:
+            obj = self.objs[name]
+            try:
+                obj.setup()
+            except MemoryError as e:
+                raise MemoryError(f'Object {name} ({type(obj).__name__}) ran out of memory'
+                                  f' during setup: {e}') from e
+
+    def compute(self):
+        from specula.base_processing_obj import BaseProcessingObj
+
+        seen_arrays = set()
+        data_names = [name for name, obj in self.objs.items() if not isinstance(obj, BaseProcessingObj)]
+        proc_names = [name for name in self.trigger_order if name in self.objs]
+
+        # Data objects first, so that shared calibration data
+        # is attributed to them and not to the objects using it
+        self.entries = []
+        for name in data_names + proc_names:
+            obj = self.objs[name]
+            host, device = object_bytes(obj, seen_arrays)
+            flops = None
+            triggers_per_step = 1.0
+            if isinstance(obj, BaseProcessingObj):
+                flops = obj.estimate_flops()
+                if obj.trigger_period is not None:
+                    triggers_per_step = min(self.dt / obj.trigger_period, 1.0)
+                if flops is not None and obj.xp not in self.rates:
+                    self.rates[obj.xp] = benchmark_rates(obj.xp, obj.dtype, obj.complex_dtype)
+            device_name = 'CPU' if obj.xp is np else f'GPU {obj.target_device_idx}'
+            self.entries.append(ObjectPlan(name, type(obj).__name__, device_name,
+                                           host, device, flops, triggers_per_step))
+
+    def step_seconds(self, entry):
+        '''Projected seconds per simulation step for a single object'''
+        if not entry.flops:
+            return 0.0
+        obj = self.objs[entry.name]
+        rates = self.rates[obj.xp]
+        seconds = sum(n / rates[kind] for kind, n in entry.flops.items())
+        return seconds * entry.triggers_per_step
+
+    def report(self):
+        lines = []
+        header = f'{"Object":<24} {"Class":<24} {"Device":<7} {"Host mem":>10} {"Device mem":>11} {"GFLOP/step":>11} {"ms/step":>9}'
+        lines.append(header)
+        lines.append('-' * len(header))
+        no_estimate = []
+        for entry in self.entries:
+            if entry.flops is None:
+                gflops = ms = '-'
+                if entry.classname != 'SimulParams' and entry.name in self.trigger_order:
+                    no_estimate.append(entry.name)
+            else:
+                gflops = f'{sum(entry.flops.values()) * entry.triggers_per_step / 1e9:.3f}'
+                ms = f'{self.step_seconds(entry) * 1e3:.3f}'
+            lines.append(f'{entry.name[:24]:<24} {entry.classname[:24]:<24} {entry.device:<7}'
+                         f' {_format_bytes(entry.host_bytes):>10} {_format_bytes(entry.device_bytes):>11}'
+                         f' {gflops:>11} {ms:>9}')
+        lines.append('-' * len(header))
+
+        total_host = sum(e.host_bytes for e in self.entries)
+        total_device = sum(e.device_bytes for e in self.entries)
+        step = sum(self.step_seconds(e) for e in self.entries)
+        lines.append(f'Total memory: {_format_bytes(total_host)} host, {_format_bytes(total_device)} device')
+
+        available = self.available_memory()
+        for where, total in [('host', total_host), ('device', total_device)]:
+            if where in available and total > available[where]:
+                lines.append(f'WARNING: {where} memory ({_format_bytes(total)}) exceeds'
+                             f' the available {_format_bytes(available[where])}')
+
+        lines.append(f'Projected time per step: {step * 1e3:.3f} ms, total for {self.niters} steps:'
+                     f' {_format_time(step * self.niters)} (FFTs and matrix products only)')
+        if len(no_estimate) > 0:
+            lines.append(f'No FLOP estimate for: {", ".join(no_estimate)}')
+        return '\n'.join(lines)
+
+    @staticmethod
+    def available_memory():
+        available = {}
+        try:
+            available['host'] = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        except (ValueError, OSError, AttributeError):
+            pass
+        if cp is not None:
+            free, total = cp.cuda.runtime.memGetInfo()
+            available['device'] = total
+        return available
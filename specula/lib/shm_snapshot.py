@@ -0,0 +1,135 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from specula.lib.memory_barrier import memory_barrier
+
+# Layout of a snapshot segment:
+# - header: HEADER int64 words [seq, generation_time, narrays, capacity]
+# - MAX_ARRAYS array descriptors of ARRAY_WORDS int64 words each:
+#   [dtype (8 chars), offset, nbytes, ndim, shape...]
+# - array data, each array aligned to ALIGNMENT bytes
+HEADER = 4
+MAX_ARRAYS = 16
+ARRAY_WORDS = 8
+MAX_NDIM = ARRAY_WORDS - 4
+ALIGNMENT = 64
+DATA_OFFSET = (HEADER + MAX_ARRAYS * ARRAY_WORDS) * 8
+
+
+def _aligned(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class ShmSnapshot():
+    '''
+    Latest value of a list of arrays, published by a single writer
+    into a shared memory segment and read by other processes.
+
+    No locks are used: the writer sets the sequence number to an odd value
+    before writing and to the next even value afterwards. Readers copy the
+    data out and discard the copy if the sequence number was odd or changed
+    in the meantime, so that a slow reader never blocks the writer.
+    Memory barriers order the data with respect to the sequence number.
+
+    Use create() in the writer process and attach() in the readers.
+    '''
+    def __init__(self, shm):
+        self.shm = shm
+        self.name = shm.name
+        self.header = np.ndarray((HEADER,), dtype=np.int64, buffer=shm.buf)
+        self.descr = np.ndarray((MAX_ARRAYS, ARRAY_WORDS), dtype=np.int64,
+                                buffer=shm.buf, offset=HEADER * 8)
+
+    @staticmethod
+    def required_bytes(arrays):
+        return sum(_aligned(a.nbytes) for a in arrays)
+
+    @classmethod
+    def create(cls, name, arrays):
+        '''Create a segment large enough for *arrays*'''
+        capacity = cls.required_bytes(arrays)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=DATA_OFFSET + max(capacity, 1))
+        snapshot = cls(shm)
+        snapshot.header[:] = 0
+        snapshot.header[3] = capacity
+        return snapshot
+
+    @classmethod
+    def attach(cls, name):
+        '''
+        Attach to an existing segment. Readers must share the resource tracker
+        of the writer, as the processes started with multiprocessing do once
+        resource_tracker.ensure_running() has been called in the writer:
+        the tracker removes the segment only when all of them have exited.
+        '''
+        return cls(shared_memory.SharedMemory(name=name))
+
+    @property
+    def seq(self):
+        return int(self.header[0])
+
+    def fits(self, arrays):
+        '''Whether *arrays* can be published in this segment'''
+        return len(arrays) <= MAX_ARRAYS and all(a.ndim <= MAX_NDIM for a in arrays) \
+            and self.required_bytes(arrays) <= self.header[3]
+
+    def publish(self, arrays, generation_time=0):
+        '''
+        Copy *arrays* (numpy or cupy) into the segment, with a single
+        copy for each array. The caller must check fits() first.
+        '''
+        seq = int(self.header[0])
+        self.header[0] = seq + 1
+        memory_barrier()
+        offset = DATA_OFFSET
+        for i, a in enumerate(arrays):
+            d = self.descr[i]
+            d[0] = np.frombuffer(a.dtype.str.encode('ascii').ljust(8), dtype=np.int64)[0]
+            d[1] = offset
+            d[2] = a.nbytes
+            d[3] = a.ndim
+            d[4:4 + a.ndim] = a.shape
+            dest = np.ndarray(a.shape, dtype=a.dtype, buffer=self.shm.buf, offset=offset)
+            if hasattr(a, 'get'):
+                a.get(out=dest)  # cupy device-to-host copy
+            else:
+                dest[...] = a
+            del dest
+            offset += _aligned(a.nbytes)
+        self.header[1] = generation_time
+        self.header[2] = len(arrays)
+        memory_barrier()
+        self.header[0] = seq + 2
+
+    def read(self):
+        '''
+        Return a (seq, generation_time, arrays) tuple with a copy of the
+        latest snapshot, or None if nothing has been published yet
+        or if the writer was updating the segment.
+        '''
+        seq = int(self.header[0])
+        if seq == 0 or seq % 2 == 1:
+            return None
+        memory_barrier()
+        generation_time = int(self.header[1])
+        arrays = []
+        try:
+            for d in self.descr[:int(self.header[2])]:
+                dtype = np.dtype(d[0:1].tobytes().decode('ascii').strip())
+                shape = tuple(int(x) for x in d[4:4 + int(d[3])])
+                arrays.append(np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=int(d[1])).copy())
+        except (ValueError, TypeError, UnicodeDecodeError):
+            # Descriptors overwritten while reading
+            return None
+        memory_barrier()
+        if int(self.header[0]) != seq:
+            return None
+        return seq, generation_time, arrays
+
+    def close(self, unlink=False):
+        self.header = None
+        self.descr = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
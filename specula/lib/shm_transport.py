@@ -0,0 +1,402 @@
+import os
+import time
+import pickle
+import multiprocessing
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from specula.lib.memory_barrier import memory_barrier
+
+# Message kinds stored in the slot header
+MSG_PICKLE = 1
+MSG_ARRAY = 2
+
+# Layout of a channel segment:
+# - channel header: CHANNEL_HEADER int64 words
+#   [write_count, read_count, nslots, slot_size]
+# - nslots times: slot header (SLOT_HEADER int64 words) + slot data (slot_size bytes)
+# Slot header words:
+#   [kind, nbytes, generation_time, external, dtype (8 chars), ndim, shape...]
+CHANNEL_HEADER = 8
+SLOT_HEADER = 16
+MAX_NDIM = SLOT_HEADER - 6
+MIN_SLOT_SIZE = 65536
+ALIGNMENT = 64
+
+
+def _aligned(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _attach(name):
+    '''Attach to an existing shared memory segment'''
+    return shared_memory.SharedMemory(name=name)
+
+
+class ShmChannel():
+    '''
+    One-way message queue between two processes, stored in a
+    shared memory segment with *nslots* fixed-size slots.
+
+    The sender writes a message in slot (write_count % nslots) and then increments
+    write_count, the receiver reads slot (read_count % nslots) and then increments
+    read_count. Since each counter is written by a single process, no locks are needed,
+    but memory barriers order the slot contents with respect to the counters.
+    Messages larger than a slot are written in a separate, one-off segment.
+    '''
+    def __init__(self, name, shm, create=False, nslots=2, slot_size=None):
+        self.name = name
+        self.shm = shm
+        header = np.ndarray((CHANNEL_HEADER,), dtype=np.int64, buffer=shm.buf)
+        if create:
+            header[:] = 0
+            header[2] = nslots
+            header[3] = slot_size
+        self.header = header
+        self.nslots = int(header[2])
+        self.slot_size = int(header[3])
+        self.slot_stride = SLOT_HEADER * 8 + self.slot_size
+        self.external = {}
+
+    @classmethod
+    def create(cls, name, nslots, slot_size):
+        slot_size = _aligned(max(slot_size, MIN_SLOT_SIZE))
+        size = CHANNEL_HEADER * 8 + nslots * (SLOT_HEADER * 8 + slot_size)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        return cls(name, shm, create=True, nslots=nslots, slot_size=slot_size)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(name, _attach(name))
+
+    def _slot(self, count):
+        offset = CHANNEL_HEADER * 8 + (count % self.nslots) * self.slot_stride
+        slot_header = np.ndarray((SLOT_HEADER,), dtype=np.int64, buffer=self.shm.buf, offset=offset)
+        return slot_header, offset + SLOT_HEADER * 8
+
+    def can_write(self):
+        return self.header[0] - self.header[1] < self.nslots
+
+    def can_read(self):
+        return self.header[0] > self.header[1]
+
+    def write(self, kind, data, generation_time=0):
+        '''
+        Write a message. *data* is either a bytes object or a numpy array.
+        The caller must check can_write() first.
+        '''
+        count = int(self.header[0])
+        # The slot is not written before the receiver has finished reading it
+        memory_barrier()
+        slot_header, offset = self._slot(count)
+        is_array = not isinstance(data, bytes)
+        if is_array:
+            nbytes = data.nbytes
+            dtype = data.dtype.str.encode('ascii').ljust(8)
+            shape = data.shape
+        else:
+            nbytes = len(data)
+            dtype = b''.ljust(8)
+            shape = (nbytes,)
+        if len(shape) > MAX_NDIM:
+            raise ValueError(f'Arrays with more than {MAX_NDIM} dimensions are not supported')
+
+        if nbytes > self.slot_size:
+            ext = shared_memory.SharedMemory(name=f'{self.name}x{count}', create=True, size=max(nbytes, 1))
+            buf = ext.buf
+            self.external[count] = ext.name
+        else:
+            ext = None
+            buf = self.shm.buf[offset: offset + nbytes]
+
+        if is_array:
+            dest = np.ndarray(data.shape, dtype=data.dtype, buffer=buf)
+            if hasattr(data, 'get'):
+                data.get(out=dest)  # cupy device-to-host copy
+            else:
+                dest[...] = data
+            del dest
+        else:
+            buf[:nbytes] = data
+        del buf
+
+        slot_header[0] = kind
+        slot_header[1] = nbytes
+        slot_header[2] = generation_time
+        slot_header[3] = ext is not None
+        slot_header[4] = np.frombuffer(dtype, dtype=np.int64)[0]
+        slot_header[5] = len(shape)
+        slot_header[6:6 + len(shape)] = shape
+        if ext is not None:
+            # The receiver unlinks the segment after reading it
+            ext.close()
+        # The message is complete before it is published
+        memory_barrier()
+        self.header[0] = count + 1
+
+    def read(self):
+        '''
+        Return (kind, data, generation_time) for the oldest message.
+        For array messages, *data* is a view of the shared memory,
+        valid until release() is called.
+        The caller must check can_read() first.
+        '''
+        count = int(self.header[1])
+        # The slot is not read before the write_count seen by can_read()
+        memory_barrier()
+        slot_header, offset = self._slot(count)
+        kind, nbytes, generation_time, external = [int(x) for x in slot_header[:4]]
+        ndim = int(slot_header[5])
+        shape = tuple(int(x) for x in slot_header[6:6 + ndim])
+        if external:
+            ext = _attach(f'{self.name}x{count}')
+            buf = ext.buf
+        else:
+            buf = self.shm.buf[offset: offset + nbytes]
+
+        if kind == MSG_PICKLE:
+            data = pickle.loads(buf[:nbytes])
+        else:
+            dtype = np.dtype(slot_header[4:5].tobytes().decode('ascii').strip())
+            data = np.ndarray(shape, dtype=dtype, buffer=buf)
+            if external:
+                # Large messages are copied out, so that their segment can be removed now
+                data = data.copy()
+        del buf
+        if external:
+            ext.close()
+            ext.unlink()
+        return kind, data, generation_time
+
+    def release(self):
+        '''Release the slot of the message returned by the last read()'''
+        memory_barrier()
+        self.header[1] += 1
+
+    def close(self, unlink=False):
+        if unlink:
+            # Remove large messages that were never received
+            for count, name in self.external.items():
+                if count >= self.header[1]:
+                    try:
+                        ext = _attach(name)
+                        ext.close()
+                        ext.unlink()
+                    except FileNotFoundError:
+                        pass
+        self.header = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class ShmComm():
+    '''
+    Communicator for processes running on the same node,
+    exchanging data through shared memory.
+
+    It implements the subset of the mpi4py communicator interface used by SPECULA
+    (Get_rank(), Get_size(), ibsend(), recv(), Ibsend(), Recv() and barrier()),
+    plus send_value() and recv_value(), which transfer an output buffer together
+    with its generation time without any serialization.
+
+    Each (source, destination, tag) triple uses its own ShmChannel, created by
+    the sender on the first message. Sends never block: when a channel is full,
+    messages are copied into a local queue and written as soon as the receiver
+    frees a slot, while this process waits in recv() or barrier().
+
+    Parameters
+    ----------
+    rank : int
+        Rank of this process
+    size : int
+        Total number of processes
+    prefix : str
+        Prefix for the shared memory segment names, unique for each run
+    sync : tuple
+        (lock, counter, generation) shared objects used by barrier()
+    nslots : int
+        Number of slots in each channel
+    '''
+
+    shared_memory = True
+
+    def __init__(self, rank, size, prefix, sync, nslots=2, poll_interval=1e-4):
+        self.rank = rank
+        self.size = size
+        self.prefix = prefix
+        self.lock, self.counter, self.generation = sync
+        self.nslots = nslots
+        self.poll_interval = poll_interval
+        self.send_channels = {}
+        self.recv_channels = {}
+        self.pending = {}
+
+    def Get_rank(self):
+        return self.rank
+
+    def Get_size(self):
+        return self.size
+
+    def _channel_name(self, source, dest, tag):
+        return f'{self.prefix}_{source}_{dest}_{tag}'
+
+    def _wait(self, condition):
+        '''
+        Wait until *condition()* is True, writing pending messages in the meantime.
+        The first checks are done without sleeping, to keep latency low.
+        '''
+        n = 0
+        while not condition():
+            self.progress()
+            n += 1
+            if n > 1000:
+                time.sleep(self.poll_interval)
+
+    def progress(self):
+        '''Write queued messages into channels with free slots'''
+        for key, queue in self.pending.items():
+            channel = self.send_channels[key]
+            while queue and channel.can_write():
+                channel.write(*queue.popleft())
+
+    def _send(self, kind, data, dest, tag, generation_time=0):
+        key = (dest, tag)
+        if key not in self.send_channels:
+            nbytes = len(data) if isinstance(data, bytes) else data.nbytes
+            name = self._channel_name(self.rank, dest, tag)
+            self.send_channels[key] = ShmChannel.create(name, self.nslots, nbytes)
+            self.pending[key] = deque()
+        channel = self.send_channels[key]
+        queue = self.pending[key]
+        while queue and channel.can_write():
+            channel.write(*queue.popleft())
+        if not queue and channel.can_write():
+            channel.write(kind, data, generation_time)
+        else:
+            if hasattr(data, 'get'):
+                data = data.get()
+            elif isinstance(data, np.ndarray):
+                data = data.copy()
+            queue.append((kind, data, generation_time))
+
+    def _recv_channel(self, source, tag):
+        key = (source, tag)
+        if key not in self.recv_channels:
+            name = self._channel_name(source, self.rank, tag)
+
+            def exists():
+                try:
+                    self.recv_channels[key] = ShmChannel.attach(name)
+                    return True
+                except FileNotFoundError:
+                    return False
+
+            self._wait(exists)
+        channel = self.recv_channels[key]
+        self._wait(channel.can_read)
+        return channel
+
+    def ibsend(self, obj, dest, tag):
+        self._send(MSG_PICKLE, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), dest, tag)
+
+    def recv(self, source, tag):
+        channel = self._recv_channel(source, tag)
+        kind, data, _ = channel.read()
+        if kind != MSG_PICKLE:
+            raise ValueError(f'Unexpected array message from rank {source} with tag {tag}')
+        channel.release()
+        return data
+
+    def Ibsend(self, buffer, dest, tag):
+        self._send(MSG_ARRAY, buffer, dest, tag)
+
+    def Recv(self, buffer, source, tag):
+        data, _ = self.recv_value(source, tag)
+        buffer[...] = data
+        self.release(source, tag)
+
+    def send_value(self, buffer, generation_time, dest, tag):
+        '''
+        Send an array (numpy or cupy) together with its generation time.
+        The array is copied directly into shared memory.
+        '''
+        self._send(MSG_ARRAY, buffer, dest, tag, generation_time)
+
+    def recv_value(self, source, tag):
+        '''
+        Receive an array sent with send_value(). Return a (array, generation_time)
+        tuple, where the array is a view of the shared memory that remains valid
+        until release() is called with the same source and tag.
+        '''
+        channel = self._recv_channel(source, tag)
+        kind, data, generation_time = channel.read()
+        if kind != MSG_ARRAY:
+            raise ValueError(f'Unexpected pickled message from rank {source} with tag {tag}')
+        return data, generation_time
+
+    def release(self, source, tag):
+        self.recv_channels[(source, tag)].release()
+
+    def barrier(self):
+        with self.lock:
+            generation = self.generation.value
+            self.counter.value += 1
+            if self.counter.value == self.size:
+                self.counter.value = 0
+                self.generation.value += 1
+        self._wait(lambda: self.generation.value != generation)
+
+    def close(self):
+        for channel in self.recv_channels.values():
+            channel.close()
+        for channel in self.send_channels.values():
+            channel.close(unlink=True)
+        self.recv_channels = {}
+        self.send_channels = {}
+
+
+def _worker(rank, size, prefix, sync, nslots, main_simul_kwargs):
+    import specula
+    comm = ShmComm(rank, size, prefix, sync, nslots=nslots)
+    try:
+        specula.main_simul(**main_simul_kwargs, comm=comm)
+        # Make sure that no process removes its channels while others are still reading
+        comm.barrier()
+    finally:
+        comm.close()
+
+
+def run_processes(nprocs, main_simul_kwargs, nslots=2):
+    '''
+    Run a simulation split over *nprocs* local processes, connected with ShmComm.
+    Each process executes main_simul() with the given arguments and builds the
+    objects whose target_rank is equal to its rank, exactly as with MPI.
+    '''
+    ctx = multiprocessing.get_context('spawn')
+    sync = (ctx.Lock(), ctx.Value('q', 0, lock=False), ctx.Value('q', 0, lock=False))
+    prefix = f'sp{os.getpid():x}{int(time.time() * 1000) % 0xffffff:x}'
+
+    procs = [ctx.Process(target=_worker, name=f'specula_rank{rank}',
+                         args=(rank, nprocs, prefix, sync, nslots, main_simul_kwargs))
+             for rank in range(nprocs)]
+    for p in procs:
+        p.start()
+
+    # If a process fails, the others would wait forever for its data
+    try:
+        while any(p.is_alive() for p in procs):
+            failed = [p for p in procs if p.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f'Process {failed[0].name} failed with exit code {failed[0].exitcode}')
+            time.sleep(0.1)
+        failed = [p for p in procs if p.exitcode != 0]
+        if failed:
+            raise RuntimeError(f'Process {failed[0].name} failed with exit code {failed[0].exitcode}')
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+            p.join()
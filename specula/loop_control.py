@@ -1,13 +1,27 @@
 
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from specula.base_time_obj import BaseTimeObj
 from specula import process_comm, process_rank, MPI_DBG
 
 
 class LoopControl(BaseTimeObj):
-    def __init__(self, stepping=False, verbose=False):
+    def __init__(self, stepping=False, verbose=False, parallel_levels=0, profiler=None,
+                 checkpoint=None):
+        """
+        Parameters:
+            stepping (bool): allow interactive stepping of the simulation (default: False).
+            verbose (bool): verbose output (default: False).
+            parallel_levels (int): if greater than 1, objects sharing the same trigger
+                index are triggered in parallel using a pool of *parallel_levels* threads.
+                Levels are still executed one after the other (default: 0, sequential).
+            profiler (ObjectProfiler): if not None, all objects are instrumented
+                after setup and a per-object report is written at the end of the run.
+            checkpoint (Checkpoint): if not None, the simulation state is restored from
+                checkpoint.resume after setup (if set), and saved periodically.
+        """
         super().__init__(target_device_idx=-1, precision=1)
         self.trigger_lists = defaultdict(list)
         self.verbose = verbose
@@ -21,6 +35,12 @@ class LoopControl(BaseTimeObj):
         self.max_global_order = -1
         self.iter_counter = 0
         self.stepping = stepping
+        self.parallel_levels = parallel_levels
+        self._executor = None
+        self.profiler = profiler
+        self.checkpoint = checkpoint
+        self.skipped_counter = 0
+        self.jumped_counter = 0
 
     def add(self, obj, idx):
         """
@@ -51,21 +71,25 @@ class LoopControl(BaseTimeObj):
             t0 (float): The initial time in seconds (default: 0).
             speed_report (bool): Whether to report the speed of the loop (default: False).
         """
-        self.start(run_time, dt, t0=t0, speed_report=speed_report)
-        self.next_time_to_stop = 0
-        while self.t < self.t0 + self.run_time:
-            if not process_rank and self.stepping and self.t > self.next_time_to_stop:
-                nnStr = input("Press Enter to advance one timestep, or enter the number of timesteps to advance:")
-                try:
-                    nn = int(nnStr)
-                except:
-                    nn = 1
-                self.next_time_to_stop = self.t + nn * dt * 1e9
-            if MPI_DBG: print(process_rank, 'before barrier iter', flush=True)
-            if MPI_DBG: print(process_rank, 'after barrier iter', flush=True)
-            if MPI_DBG: print(process_rank, 'NEW ITERATION', self.t,flush=True)
-            self.iter()
-        self.finish()
+        try:
+            self.start(run_time, dt, t0=t0, speed_report=speed_report)
+            self.next_time_to_stop = 0
+            while self.t < self.t0 + self.run_time:
+                if not process_rank and self.stepping and self.t > self.next_time_to_stop:
+                    nnStr = input("Press Enter to advance one timestep, or enter the number of timesteps to advance:")
+                    try:
+                        nn = int(nnStr)
+                    except:
+                        nn = 1
+                    self.next_time_to_stop = self.t + nn * dt * 1e9
+                if MPI_DBG: print(process_rank, 'before barrier iter', flush=True)
+                if MPI_DBG: print(process_rank, 'after barrier iter', flush=True)
+                if MPI_DBG: print(process_rank, 'NEW ITERATION', self.t,flush=True)
+                self.iter()
+            self.finish()
+        finally:
+            # The thread pool must be released even if an object raised an exception
+            self._shutdown_executor()
 
     def start(self, run_time, dt, t0=0, speed_report=False):
         
@@ -112,11 +136,102 @@ class LoopControl(BaseTimeObj):
         if process_comm is not None:
             process_comm.barrier()
         
+        if self.profiler is not None:
+            for i in sorted(self.trigger_lists.keys()):
+                for element in self.trigger_lists[i]:
+                    element.enable_profiling(self.profiler)
+            self.profiler.start()
+
+        if self.parallel_levels > 1 and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.parallel_levels,
+                                                thread_name_prefix='specula_level')
+
         self.t = self.t0
         self.last_reported_time = time.time()
         self.last_reported_counter = 0
+        self.last_reported_skipped = self.skipped_counter
+        self.last_reported_jumped = self.jumped_counter
         self.report_interval = 10
 
+        if self.checkpoint is not None and self.checkpoint.resume is not None:
+            self.checkpoint.restore(self)
+            self.last_reported_counter = self.iter_counter
+
+    def _skip_idle(self, element):
+        """
+        Return True if *element* does not need to be checked in this step:
+        either it is event-driven and none of its inputs has been
+        updated since its last check_ready(), or it has a trigger period
+        and this step is not one of its trigger times.
+        """
+        if (element.event_driven and not element.inputs_dirty) or \
+           (element.trigger_period is not None and element.next_trigger_time(self.t) != self.t):
+            element.current_time = self.t
+            element.inputs_changed = False
+            self.skipped_counter += 1
+            return True
+        return False
+
+    def _steps_to_next_event(self):
+        """
+        Return the number of steps to the next time at which at least one
+        object must be checked. This is 1 unless all objects are
+        either idle event-driven objects or have a trigger period, in which
+        case the loop can jump directly to the next trigger time.
+        Steps are never skipped with MPI, since all remote
+        outputs must be sent at every step.
+        """
+        if process_comm is not None:
+            return 1
+        t = self.t + self.dt
+        next_t = None
+        for elements in self.trigger_lists.values():
+            for element in elements:
+                if element.event_driven and not element.inputs_dirty:
+                    continue
+                if element.trigger_period is None:
+                    return 1
+                element_t = element.next_trigger_time(t)
+                if next_t is None or element_t < next_t:
+                    next_t = element_t
+        remaining = max(self.niters() - self.iter_counter, 1)
+        if next_t is None:
+            # Nothing will run anymore
+            return remaining
+        return min(max(-((self.t - next_t) // self.dt), 1), remaining)
+
+    def _trigger_element(self, element):
+        """
+        Run check_ready(), trigger() and post_trigger() on a single element.
+        Used as the unit of work when a trigger level is executed in parallel.
+        """
+        element.check_ready(self.t)
+        if element.inputs_changed:
+            element.trigger()
+            element.post_trigger()
+
+    def _iter_level_parallel(self, elements, last_iter):
+        """
+        Execute all elements of a trigger level in the thread pool.
+        Waits for all of them to complete (barrier) before sending MPI outputs
+        in the original order. Exceptions are reported for the first failing
+        element in trigger list order, independently of thread scheduling.
+        """
+        active = [element for element in elements if not self._skip_idle(element)]
+        futures = [self._executor.submit(self._trigger_element, element) for element in active]
+        for element, future in zip(active, futures):
+            exc = future.exception()
+            if exc is not None:
+                print('Exception in', element.name, flush=True)
+                raise exc
+
+        for element in elements:
+            try:
+                element.send_outputs(skip_delayed=last_iter, first_mpi_send=False)
+            except:
+                print('Exception in', element.name, flush=True)
+                raise
+
     def iter(self):
 
         # set the last_iter flag based on several conditions
@@ -124,8 +239,14 @@ class LoopControl(BaseTimeObj):
 
         for i in sorted(self.trigger_lists.keys()):
             # all the objects having this trigger order could be remote
+            if self._executor is not None and len(self.trigger_lists[i]) > 1:
+                self._iter_level_parallel(self.trigger_lists[i], last_iter)
+                continue
+
             if MPI_DBG: print(process_rank, 'before check_ready', flush=True)
             for element in self.trigger_lists[i]:
+                if self._skip_idle(element):
+                    continue
                 try:
                     element.check_ready(self.t)
                 except:
@@ -154,16 +275,30 @@ class LoopControl(BaseTimeObj):
                     raise
 
         if self.speed_report:
-            if self.iter_counter == self.last_reported_counter + self.report_interval:
+            nsteps = self.iter_counter - self.last_reported_counter
+            if nsteps >= self.report_interval:
                 cur_time = time.time()
                 elapsed_time = cur_time - self.last_reported_time
-                msg = f"{self.report_interval / elapsed_time:.2f} Hz,  {1000 * elapsed_time / self.report_interval :.3f} ms"
+                msg = f"{nsteps / elapsed_time:.2f} Hz,  {1000 * elapsed_time / nsteps :.3f} ms"
+                if self.skipped_counter > 0:
+                    skipped = (self.skipped_counter - self.last_reported_skipped) / nsteps
+                    nobjs = sum(len(x) for x in self.trigger_lists.values())
+                    msg += f",  {skipped:.1f}/{nobjs} objects skipped"
+                if self.jumped_counter > 0:
+                    msg += f",  {self.jumped_counter - self.last_reported_jumped} steps jumped"
                 print(f't={self.t_to_seconds(self.t):.6f} {msg}')
                 self.last_reported_time = cur_time
                 self.last_reported_counter = self.iter_counter
+                self.last_reported_skipped = self.skipped_counter
+                self.last_reported_jumped = self.jumped_counter
+
+        nsteps = self._steps_to_next_event()
+        self.jumped_counter += nsteps - 1
+        self.t += nsteps * self.dt
+        self.iter_counter += nsteps
 
-        self.t += self.dt
-        self.iter_counter += 1
+        if self.checkpoint is not None:
+            self.checkpoint.step(self)
 
     def finish(self):
 
@@ -175,4 +310,13 @@ class LoopControl(BaseTimeObj):
                     print('Exception in', element.name)
                     raise
 
+        self._shutdown_executor()
+
+        if self.profiler is not None:
+            self.profiler.report(niters=self.iter_counter)
 
+    def _shutdown_executor(self):
+        """Wait for the running elements and release the thread pool used by parallel_levels"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
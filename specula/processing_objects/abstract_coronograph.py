@@ -80,7 +80,7 @@ class Coronograph(BaseProcessingObj):
         pad_start = self.fft_padding // 2
         ef_pad[pad_start:pad_start+self.fft_sampling, 
                     pad_start:pad_start+self.fft_sampling] = pup_ef
-        return self.xp.fft.fft2(ef_pad)
+        return self.fft2(ef_pad, overwrite_x=True)
 
     def prepare_trigger(self, t):
         super().prepare_trigger(t)
@@ -101,7 +101,7 @@ class Coronograph(BaseProcessingObj):
         ef_fp_masked = ef_fp * fp_mask_centered
 
         # Step 4: Return to the pupil plane with IFFT
-        self.ef_pad = self.xp.fft.ifft2(ef_fp_masked)
+        self.ef_pad = self.ifft2(ef_fp_masked, overwrite_x=True)
         pad_start = self.fft_padding // 2
         ef_pp = self.ef_pad[pad_start:pad_start+self.fft_sampling, 
                     pad_start:pad_start+self.fft_sampling]
@@ -3,6 +3,7 @@ from specula.base_processing_obj import BaseProcessingObj
 from specula.base_value import BaseValue
 from specula.data_objects.layer import Layer
 from specula.lib.phasescreen_manager import phasescreens_manager
+from specula.lib.interp2d import bilinear_coefficients
 from specula.connections import InputValue
 from specula.data_objects.simul_params import SimulParams
 
@@ -46,12 +47,18 @@ class AtmoEvolution(BaseProcessingObj):
         Field of view in meters. If provided, overrides fov parameter. Default is None.
     pupil_position : list, optional
         [x, y] position of the pupil in meters. Default is [0, 0].
+    phasescreen_method : str, optional
+        Phase screen generation method: 'fft' (default) or 'rfft', which
+        needs half the memory and uses all CPUs. See phasescreens_manager().
     target_device_idx : int, optional
         Target device index for computation (CPU/GPU). Default is None (uses global setting).
     precision : int, optional
         Precision for computation (0 for double, 1 for single).
         Default is None (uses global setting).
     """
+
+    checkpoint_attrs = ('last_position', 'last_effective_position', 'last_t')
+
     def __init__(self,
                  simul_params: SimulParams,
                  L0: list,           # TODO =[1.0],
@@ -65,6 +72,7 @@ class AtmoEvolution(BaseProcessingObj):
                  verbose: bool=False,
                  fov_in_m: float=None,
                  pupil_position:list =[0,0],
+                 phasescreen_method: str='fft',
                  target_device_idx: int=None,
                  precision: int=None):
 
@@ -120,6 +128,7 @@ class AtmoEvolution(BaseProcessingObj):
         self.Cn2 = np.array(Cn2, dtype=self.dtype)
         self.pixel_pupil = self.pixel_pupil
         self.data_dir = data_dir
+        self.phasescreen_method = phasescreen_method
 
         self.pixel_square_phasescreens = pixel_phasescreens
 
@@ -141,6 +150,14 @@ class AtmoEvolution(BaseProcessingObj):
             self.layer_list.append(layer)
         self.outputs['layer_list'] = self.layer_list
 
+        # Layer extraction plan, built at the first step
+        # and whenever the wind direction changes
+        self._extraction_key = None
+        self._rotation_slices = None
+        self._rotation_operator = None
+        self._rotation_input = None
+        self._layer_buffer = None
+
         self.seed = seed
         self.scale_coeff = 1.0
 
@@ -187,7 +204,8 @@ class AtmoEvolution(BaseProcessingObj):
             square_phasescreens = phasescreens_manager(L0, self.pixel_square_phasescreens,
                                                         self.pixel_pitch, self.data_dir,
                                                         seed=seed, precision=self.precision,
-                                                        verbose=self.verbose, xp=self.xp)
+                                                        verbose=self.verbose, xp=self.xp,
+                                                        method=self.phasescreen_method)
 
             square_ps_index = -1
             ps_index = 0
@@ -219,29 +237,40 @@ class AtmoEvolution(BaseProcessingObj):
                                                        seed=seed,
                                                        precision=self.precision,
                                                        verbose=self.verbose,
-                                                       xp=self.xp)
+                                                       xp=self.xp,
+                                                       method=self.phasescreen_method)
 
             for i in range(self.n_phasescreens):
                 temp_screen = square_phasescreens[i][ :int(self.pixel_phasescreens), :]
                 temp_screens.append(temp_screen)
 
 
-        # Normalize all phasescreens
+        # Phase screens are read-only memory maps, shared with other processes.
+        # On CPU, only views are kept, and the normalization is applied
+        # to the extracted layers (see _update_layer_list())
+        self.phasescreens_mean = []
+        self.phasescreens_coeff = []
 
         for i, temp_screen in enumerate(temp_screens):
 
-            temp_screen = self.to_xp(temp_screen, dtype=self.dtype)
-            temp_screen *= self.xp.sqrt(self.Cn2[i])
-            temp_screen -= self.xp.mean(temp_screen)
-
             # Convert to nm
-            temp_screen *= ATMO_WAVELENGTH / (2 * np.pi)
+            coeff = float(np.sqrt(self.Cn2[i])) * ATMO_WAVELENGTH / (2 * np.pi)
+            mean = float(np.mean(temp_screen, dtype=np.float64))
+
+            if self.xp is np:
+                temp_screen = temp_screen.astype(self.dtype, copy=False)
+            else:
+                temp_screen = self.to_xp(temp_screen, dtype=self.dtype)
+                temp_screen = (temp_screen - self.dtype(mean)) * self.dtype(coeff)
+                mean, coeff = 0.0, 1.0
 
             # Flip x-axis for each odd phase-screen
             if i % 2 != 0:
                 temp_screen = self.xp.flip(temp_screen, axis=1)
 
             self.phasescreens.append(temp_screen)
+            self.phasescreens_mean.append(self.dtype(mean))
+            self.phasescreens_coeff.append(coeff)
             self.phasescreens_sizes.append(temp_screen.shape[1])
 
         self.phasescreens_sizes_array = np.asarray(self.phasescreens_sizes)
@@ -342,27 +371,116 @@ class AtmoEvolution(BaseProcessingObj):
         effective_position_quo = np.floor(effective_position).astype(np.int64)
         effective_position_rem = (effective_position - effective_position_quo).astype(self.dtype)
 
+        if self._extraction_key != (tuple(wdi), tuple(wdf_full)):
+            self._build_extraction_plan(wdi, wdf_full)
+
         # Update each layer
         for ii, p in enumerate(self.phasescreens):
             pos = int(effective_position_quo[ii])
             ipli = int(self.pixel_layer[ii])
             ipli_p = int(pos + self.pixel_layer[ii])
 
-            # Linear interpolation between positions
-            layer_phase = (1.0 - effective_position_rem[ii]) * p[0:ipli, pos:ipli_p] \
-                        + effective_position_rem[ii] * p[0:ipli, pos + 1:ipli_p + 1]
-
-            # Apply wind direction rotation
-            layer_phase = self.xp.rot90(layer_phase, wdi[ii])
-            if not wdf_full[ii] == 0:
-                layer_phase = self.ndimage_rotate(
-                    layer_phase, wdf_full[ii], reshape=False, order=1
-                )
-
-            layer_list[ii].phaseInNm[:] = layer_phase * self.scale_coeff
-            layer_list[ii].generation_time = self.current_time
+            # Layers not rotated are written directly, layers rotated by multiples
+            # of 90 degrees in a contiguous buffer copied with rot90() at the end,
+            # and the other ones in the input buffer of the rotation operator
+            k = int(wdi[ii]) % 4
+            if self._rotation_slices[ii] is not None:
+                target = self._rotation_input[self._rotation_slices[ii]].reshape(ipli, ipli)
+            elif k == 0:
+                target = layer_list[ii].phaseInNm
+            else:
+                target = self._layer_buffer[:ipli * ipli].reshape(ipli, ipli)
+
+            # Linear interpolation between positions, normalization and scaling,
+            # all in place: (p1 - p0) * rem + p0 - mean
+            p0 = p[0:ipli, pos:ipli_p]
+            self.xp.subtract(p[0:ipli, pos + 1:ipli_p + 1], p0, out=target)
+            target *= effective_position_rem[ii]
+            target += p0
+            target -= self.phasescreens_mean[ii]
+            target *= self.phasescreens_coeff[ii] * self.scale_coeff
+            if self._rotation_slices[ii] is None and k != 0:
+                layer_list[ii].phaseInNm[:] = self.xp.rot90(target, k)
+
+        # Single sparse product for all the layers with an arbitrary wind direction
+        if self._rotation_operator is not None:
+            rotated = self._rotation_operator @ self._rotation_input
+            for ii in range(self.n_phasescreens):
+                if self._rotation_slices[ii] is not None:
+                    layer_list[ii].phaseInNm[:] = rotated[self._rotation_slices[ii]].reshape(
+                        layer_list[ii].phaseInNm.shape)
+
+        for layer in layer_list:
+            layer.generation_time = self.current_time
 
         # Update position in place
         last_position[:] = new_position
 
         return new_position, effective_position
+
+    def _build_extraction_plan(self, wdi, wdf_full):
+        """Build the sparse operator rotating the layers whose wind direction
+        is not a multiple of 90 degrees.
+
+        The operator applies both the rotation by a multiple of 90 degrees
+        (as numpy.rot90) and the remaining rotation (as scipy.ndimage.rotate,
+        around the layer center, with bilinear interpolation), and
+        is block-diagonal, with one block for each of these layers.
+        Samples outside of the layer are zero, as with scipy.ndimage.rotate().
+        """
+        self._extraction_key = (tuple(wdi), tuple(wdf_full))
+        self._rotation_slices = [None] * self.n_phasescreens
+        rows, cols, weights = [], [], []
+        offset = 0
+        buffer_size = 0
+
+        for ii in range(self.n_phasescreens):
+            if wdf_full[ii] == 0:
+                if int(wdi[ii]) % 4 != 0:
+                    buffer_size = max(buffer_size, int(self.pixel_layer[ii]) ** 2)
+                continue
+            n = int(self.pixel_layer[ii])
+            center = (n - 1) / 2.0
+
+            # Coordinates in the rot90() output sampled by ndimage.rotate()
+            c, s = np.cos(np.radians(wdf_full[ii])), np.sin(np.radians(wdf_full[ii]))
+            yy, xx = np.mgrid[0:n, 0:n].astype(np.float64) - center
+            qy = c * yy + s * xx + center
+            qx = -s * yy + c * xx + center
+
+            # Corresponding coordinates in the layer before rot90()
+            k = int(wdi[ii]) % 4
+            if k == 0:
+                ly, lx = qy, qx
+            elif k == 1:
+                ly, lx = qx, (n - 1) - qy
+            elif k == 2:
+                ly, lx = (n - 1) - qy, (n - 1) - qx
+            else:
+                ly, lx = (n - 1) - qx, qy
+
+            # Samples outside of the layer have no entries in the operator
+            inside = np.repeat(((ly >= 0) & (ly <= n - 1) & (lx >= 0) & (lx <= n - 1)).ravel(), 4)
+            ly = np.clip(ly, 0, n - 1).ravel()
+            lx = np.clip(lx, 0, n - 1).ravel()
+            idx, w = bilinear_coefficients(lx, ly, (n, n), xp=np, dtype=self.dtype)
+            rows.append(np.repeat(np.arange(n * n) + offset, 4)[inside])
+            cols.append(idx.T.ravel()[inside] + offset)
+            weights.append(w.T.ravel()[inside])
+            self._rotation_slices[ii] = slice(offset, offset + n * n)
+            offset += n * n
+
+        self._layer_buffer = self.xp.empty(buffer_size, dtype=self.dtype) if buffer_size > 0 else None
+
+        if offset == 0:
+            self._rotation_operator = None
+            self._rotation_input = None
+            return
+
+        # Duplicate entries (neighbours clipped at the borders) are summed when converting to CSR
+        self._rotation_operator = self._coo_matrix(
+            (self.to_xp(np.concatenate(weights), dtype=self.dtype),
+             (self.to_xp(np.concatenate(rows)), self.to_xp(np.concatenate(cols)))),
+            shape=(offset, offset)).tocsr()
+        self._rotation_input = self.xp.empty(offset, dtype=self.dtype)
+
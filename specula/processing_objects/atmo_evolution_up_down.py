@@ -47,6 +47,8 @@ class AtmoEvolutionUpDown(AtmoEvolution):
         Precision for computation (0 for double, 1 for single). Default is None.
     """
 
+    checkpoint_attrs = AtmoEvolution.checkpoint_attrs + ('last_position_up',)
+
     def __init__(self,
                  simul_params: SimulParams,
                  L0: list,
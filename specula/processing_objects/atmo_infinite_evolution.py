@@ -45,11 +45,18 @@ class AtmoInfiniteEvolution(BaseProcessingObj):
         Field of view in meters. If provided, overrides fov parameter. Default is None.
     pupil_position : list, optional
         [x, y] position of the pupil in meters. Default is [0, 0].
+    data_dir : str, optional
+        Directory where the extrusion matrices of the phase screens are cached
+        (automatically set by simul.py). If None, they are computed at each start-up.
     target_device_idx : int, optional
         Target device index for computation (CPU/GPU). Default is None (uses global setting).
     precision : int, optional
         Precision for computation (0 for double, 1 for single). Default is None (uses global setting).
     """
+
+    checkpoint_attrs = ('last_position', 'last_effective_position', 'last_t',
+                        'acc_rows', 'acc_cols', 'infinite_phasescreens')
+
     def __init__(self,
                  simul_params: SimulParams,
                  L0: list=[1.0],
@@ -61,6 +68,7 @@ class AtmoInfiniteEvolution(BaseProcessingObj):
                  verbose: bool=False,
                  fov_in_m: float=None,
                  pupil_position:list =[0,0],
+                 data_dir: str=None,
                  target_device_idx: int=None,
                  precision: int=None):
 
@@ -134,6 +142,7 @@ class AtmoInfiniteEvolution(BaseProcessingObj):
 
         self.Cn2 = np.array(Cn2, dtype=self.dtype)
         self.verbose = verbose if verbose is not None else False
+        self.data_dir = data_dir
 
         # Initialize layer list with correct heights
         self.layer_list = []
@@ -182,6 +191,7 @@ class AtmoInfiniteEvolution(BaseProcessingObj):
                                                        self.L0[i],
                                                        random_seed=int(seed[i]),
                                                        xp=self.xp,
+                                                       cache_dir=self.data_dir,
                                                        target_device_idx=self.target_device_idx,
                                                        precision=self.precision )
             self.infinite_phasescreens.append(temp_infinite_screen)
@@ -251,27 +261,28 @@ class AtmoInfiniteEvolution(BaseProcessingObj):
             #sc = int( (-np.sign(cols_to_add) + 1) / 2 )
             sc = int(np.sign(cols_to_add) )
             # print('rows_to_add, cols_to_add', rows_to_add, cols_to_add)
-            if np.abs(w_y_comp)>eps:
-                for r in range(int(np.abs(rows_to_add))):
-                    phase_screen.add_line(1, sr)
-            if np.abs(w_x_comp)>eps:
-                for r in range(int(np.abs(cols_to_add))):
-                    phase_screen.add_line(0, sc)
-            phase_screen0_all = phase_screen.scrnRawAll.copy()
-            phase_screen0 = phase_screen.scrnRaw.copy()
-            # print('w_y_comp, w_x_comp', w_y_comp, w_x_comp)
-            # print('frac_rows, frac_cols', frac_rows, frac_cols)
-            srf = int(np.sign(frac_rows) )
-            scf = int(np.sign(frac_cols) )
-
-            if np.abs(frac_rows)>eps:
-                phase_screen.add_line(1, srf, False)
-            if np.abs(frac_cols)>eps:
-                phase_screen.add_line(0, scf, False)
-            phase_screen1 = phase_screen.scrnRaw
-            interpfactor = np.sqrt(frac_rows**2 + frac_cols**2 )
-            layer_phase = interpfactor * phase_screen1 + (1.0-interpfactor) * phase_screen0
-            phase_screen.full_scrn = phase_screen0_all
+            if np.abs(w_y_comp) > eps:
+                phase_screen.add_lines(1, sr, int(np.abs(rows_to_add)))
+            if np.abs(w_x_comp) > eps:
+                phase_screen.add_lines(0, sc, int(np.abs(cols_to_add)))
+
+            # Fractional interpolation with the screen shifted by one more line,
+            # which is then added at the next step
+            srf = int(np.sign(frac_rows))
+            scf = int(np.sign(frac_cols))
+            next_lines = []
+            if np.abs(frac_rows) > eps:
+                next_lines.append((1, srf))
+            if np.abs(frac_cols) > eps:
+                next_lines.append((0, scf))
+
+            phase_screen0 = phase_screen.scrnRaw
+            if len(next_lines) > 0:
+                phase_screen1 = phase_screen.preview(next_lines)
+            else:
+                phase_screen1 = phase_screen0
+            interpfactor = np.sqrt(frac_rows**2 + frac_cols**2)
+            layer_phase = interpfactor * phase_screen1 + (1.0 - interpfactor) * phase_screen0
             self.acc_rows[ii] = frac_rows
             self.acc_cols[ii] = frac_cols
             # print('acc_rows', self.acc_rows)
@@ -36,12 +36,18 @@ class AtmoInfiniteEvolutionUpDown(AtmoInfiniteEvolution):
         Field of view in meters. If provided, overrides fov parameter. Default is None.
     pupil_position : list, optional
         [x, y] position of the pupil in meters. Default is [0, 0].
+    data_dir : str, optional
+        Directory where the extrusion matrices of the phase screens are cached
+        (automatically set by simul.py). If None, they are computed at each start-up.
     target_device_idx : int, optional
         Target device index for computation (CPU/GPU). Default is None.
     precision : int, optional
         Precision for computation (0 for double, 1 for single). Default is None.
     """
 
+    checkpoint_attrs = AtmoInfiniteEvolution.checkpoint_attrs + \
+        ('last_position_up', 'last_effective_position_up', 'acc_rows_up', 'acc_cols_up')
+
     def __init__(self,
                  simul_params: SimulParams,
                  L0: list = [1.0],
@@ -54,6 +60,7 @@ class AtmoInfiniteEvolutionUpDown(AtmoInfiniteEvolution):
                  verbose: bool = False,
                  fov_in_m: float = None,
                  pupil_position: list = [0, 0],
+                 data_dir: str = None,
                  target_device_idx: int = None,
                  precision: int = None):
 
@@ -69,6 +76,7 @@ class AtmoInfiniteEvolutionUpDown(AtmoInfiniteEvolution):
             verbose=verbose,
             fov_in_m=fov_in_m,
             pupil_position=pupil_position,
+            data_dir=data_dir,
             target_device_idx=target_device_idx,
             precision=precision
         )
@@ -229,29 +237,27 @@ class AtmoInfiniteEvolutionUpDown(AtmoInfiniteEvolution):
 
             # Add integer lines
             if np.abs(w_y_comp) > eps:
-                for r in range(int(np.abs(rows_to_add))):
-                    phase_screen.add_line(1, sr)
+                phase_screen.add_lines(1, sr, int(np.abs(rows_to_add)))
             if np.abs(w_x_comp) > eps:
-                for r in range(int(np.abs(cols_to_add))):
-                    phase_screen.add_line(0, sc)
-
-            phase_screen0_all = phase_screen.scrnRawAll.copy()
-            phase_screen0 = phase_screen.scrnRaw.copy()
+                phase_screen.add_lines(0, sc, int(np.abs(cols_to_add)))
 
-            # Fractional interpolation
+            # Fractional interpolation with the screen shifted by one more line,
+            # which is then added at the next step
             srf = int(np.sign(frac_rows))
             scf = int(np.sign(frac_cols))
-
+            next_lines = []
             if np.abs(frac_rows) > eps:
-                phase_screen.add_line(1, srf, False)
+                next_lines.append((1, srf))
             if np.abs(frac_cols) > eps:
-                phase_screen.add_line(0, scf, False)
+                next_lines.append((0, scf))
 
-            phase_screen1 = phase_screen.scrnRaw
+            phase_screen0 = phase_screen.scrnRaw
+            if len(next_lines) > 0:
+                phase_screen1 = phase_screen.preview(next_lines)
+            else:
+                phase_screen1 = phase_screen0
             interpfactor = np.sqrt(frac_rows**2 + frac_cols**2)
             layer_phase = interpfactor * phase_screen1 + (1.0 - interpfactor) * phase_screen0
-
-            phase_screen.full_scrn = phase_screen0_all
             acc_rows[ii] = frac_rows
             acc_cols[ii] = frac_cols
 
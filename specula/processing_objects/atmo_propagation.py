@@ -1,16 +1,15 @@
 from specula.lib.make_xy import make_xy
 from specula.lib.utils import local_mean_rebin
 from specula.base_processing_obj import BaseProcessingObj
-from specula.lib.interp2d import Interp2D
+from specula.lib.interp2d import Interp2D, BatchedInterp2D
+from specula.lib.interp_cache import InterpCache
 from specula.data_objects.electric_field import ElectricField
 from specula.connections import InputList
 from specula.data_objects.layer import Layer
 from specula import cpuArray, show_in_profiler
 from specula.data_objects.simul_params import SimulParams
-from skimage.filters import window
-from symao.turbolence import ft_ft2
-from symao.turbolence import ft_ift2
 
+import os
 import numpy as np
 
 degree2rad = np.pi / 180.
@@ -42,6 +41,17 @@ class AtmoPropagation(BaseProcessingObj):
         If True, contributions from all layers are merged into a single output per source. Default is True.
     upwards : bool, optional
         If True, propagation is performed upwards (from ground to source). Default is False (downwards).
+    batch_sources : bool, optional
+        If True, geometric propagation of all sources is performed with a single
+        batched interpolation per layer, writing into a stacked output buffer.
+        Results are identical to the ones of the per-source propagation.
+        Only used when mergeLayersContrib is True and doFresnel is False. Default is True.
+    cache_interpolators : bool, optional
+        If True, interpolation sampling grids and bilinear coefficients are stored on disk,
+        keyed by the layer/source geometry, and reused by later runs. Default is False.
+    data_dir : str, optional
+        Directory for the interpolator cache. Set automatically by the simulation
+        to the interp_cache/ subdirectory of the calibration root directory.
     target_device_idx : int, optional
         Target device index for computation (CPU/GPU). Default is None (uses global setting).
     precision : int, optional
@@ -55,6 +65,9 @@ class AtmoPropagation(BaseProcessingObj):
                  pupil_position=None,
                  mergeLayersContrib: bool=True,
                  upwards: bool=False,
+                 batch_sources: bool=True,
+                 cache_interpolators: bool=False,
+                 data_dir: str=None,
                  target_device_idx=None,
                  precision=None):
 
@@ -76,6 +89,13 @@ class AtmoPropagation(BaseProcessingObj):
 
         self.mergeLayersContrib = mergeLayersContrib
         self.upwards = upwards
+        self.batch_sources = batch_sources and mergeLayersContrib and not doFresnel
+        if cache_interpolators:
+            if data_dir is None:
+                data_dir = os.path.join(self.simul_params.root_dir, 'interp_cache')
+            self.interp_cache = InterpCache(data_dir)
+        else:
+            self.interp_cache = None
         self.pixel_pupil_size = self.pixel_pupil
         self.source_dict = source_dict
         if pupil_position is not None:
@@ -104,6 +124,9 @@ class AtmoPropagation(BaseProcessingObj):
         self.airmass = 1. / np.cos(np.radians(self.simul_params.zenithAngleInDeg), dtype=self.dtype)
 
     def field_propagator(self, distanceInM):
+        # Imported here because skimage is slow to import and only needed for Fresnel propagation
+        from skimage.filters import window
+
         k = 2 * np.pi / (self.wavelengthInNm * 1e-9)
 
         df = 1 / (self.pixel_pupil_size * self.pixel_pitch)
@@ -157,13 +180,19 @@ class AtmoPropagation(BaseProcessingObj):
                 layer.phaseInNm[~mask_valid] = local_mean[~mask_valid]
 
     def physical_propagation(self, ef, prop_idx):
-        ft_ef1 = ft_ft2(ef, 1)
-        ft_ef2 = self.propagators[prop_idx]*ft_ef1
-        ef2 = ft_ift2(ft_ef2, 1)
-        return ef2
+        # Same as symao's ft_ft2() and ft_ift2() with unit sampling,
+        # whose normalization factors cancel out
+        fftshift = self.xp.fft.fftshift
+        ft_ef1 = fftshift(self.fft2(fftshift(ef), overwrite_x=True))
+        ft_ef2 = self.propagators[prop_idx] * ft_ef1
+        return fftshift(self.ifft2(fftshift(ft_ef2), overwrite_x=True))
 
     @show_in_profiler('atmo_propagation.trigger_code')
     def trigger_code(self):
+        if self.batch_sources:
+            self.batched_propagation()
+            return
+
         if not self.propagators and self.doFresnel:
             self.doFresnel_setup()
 
@@ -201,6 +230,65 @@ class AtmoPropagation(BaseProcessingObj):
                     output_ef.A[:] = abs(tmp_ef)
 
 
+    def batched_propagation(self):
+        '''
+        Geometric propagation of all sources at once: for each layer,
+        a single interpolation computes amplitude and phase for all sources,
+        and the stacked output buffer is updated in place.
+        '''
+        self._ef_stack[:, 0] = 1
+        self._ef_stack[:, 1] = 0
+
+        for layer, direct_efs, batch, sel in self._batch_plan:
+            for output_ef in direct_efs:
+                topleft = [(layer.size[0] - self.pixel_pupil_size) // 2, (layer.size[1] - self.pixel_pupil_size) // 2]
+                output_ef.product(layer, subrect=topleft)
+
+            if batch is not None:
+                interp_A, interp_phase = batch.interpolate([layer.A, layer.phaseInNm])
+                self._ef_stack[sel, 0] *= interp_A
+                self._ef_stack[sel, 1] += interp_phase
+
+    def setup_batched_propagation(self):
+        '''
+        Make all output electric fields views of a single stacked buffer
+        and group, for each layer, the interpolators of all sources.
+        '''
+        names = list(self.source_dict.keys())
+        nsources = len(names)
+        self._ef_stack = self.xp.empty((nsources, 2, self.pixel_pupil_size, self.pixel_pupil_size), dtype=self.dtype)
+        for i, name in enumerate(names):
+            output_ef = self.outputs['out_'+name+'_ef']
+            output_ef.field = self._ef_stack[i]
+            output_ef.reset()
+
+        layer_list = self.common_layer_list + self.atmo_layer_list
+        if not self.upwards:
+            layer_list = layer_list[::-1]
+
+        self._batch_plan = []
+        for layer in layer_list:
+            direct_efs = []
+            interpolators = []
+            sel = []
+            for i, name in enumerate(names):
+                interpolator = self.interpolators[self.source_dict[name]][layer]
+                if interpolator is None:
+                    direct_efs.append(self.outputs['out_'+name+'_ef'])
+                else:
+                    interpolators.append(interpolator)
+                    sel.append(i)
+
+            if len(interpolators) > 0:
+                batch = BatchedInterp2D(interpolators, xp=self.xp, dtype=self.dtype)
+            else:
+                batch = None
+            if sel == list(range(nsources)):
+                sel = slice(None)
+            else:
+                sel = self.xp.array(sel)
+            self._batch_plan.append((layer, direct_efs, batch, sel))
+
     def post_trigger(self):
         super().post_trigger()
 
@@ -262,9 +350,6 @@ class AtmoPropagation(BaseProcessingObj):
             pixel_pupmeta /= self.magnification_list[layer]
 
         angle = -layer.rotInDeg % 360
-        xx, yy = make_xy(self.pixel_pupil_size, pixel_pupmeta/2., xp=self.xp)
-        xx1 = xx + half_pixel_layer[0] + pixel_position[0]
-        yy1 = yy + half_pixel_layer[1] + pixel_position[1]
 
         # TODO old code?
         limit0 = (layer.size[0] - self.pixel_pupil_size) /2
@@ -273,8 +358,30 @@ class AtmoPropagation(BaseProcessingObj):
         if not isInside:
             return None
 
-        return Interp2D(layer.size, (self.pixel_pupil_size, self.pixel_pupil_size), xx=xx1, yy=yy1,
-                        rotInDeg=angle, xp=self.xp, dtype=self.dtype)
+        output_shape = (self.pixel_pupil_size, self.pixel_pupil_size)
+        if self.interp_cache is not None:
+            key = InterpCache.key(input_shape=layer.size, output_shape=output_shape,
+                                  pixel_pupmeta=pixel_pupmeta, half_pixel_layer=half_pixel_layer,
+                                  pixel_position=pixel_position, angle=angle,
+                                  dtype=np.dtype(self.dtype).name)
+            arrays = self.interp_cache.load(key)
+            if arrays is not None:
+                return Interp2D.from_arrays(layer.size, output_shape, xx=arrays['xx'], yy=arrays['yy'],
+                                            idx=arrays['idx'], weights=arrays['weights'],
+                                            xp=self.xp, dtype=self.dtype)
+
+        xx, yy = make_xy(self.pixel_pupil_size, pixel_pupmeta/2., xp=self.xp)
+        xx1 = xx + half_pixel_layer[0] + pixel_position[0]
+        yy1 = yy + half_pixel_layer[1] + pixel_position[1]
+
+        interp = Interp2D(layer.size, output_shape, xx=xx1, yy=yy1,
+                          rotInDeg=angle, xp=self.xp, dtype=self.dtype)
+
+        if self.interp_cache is not None:
+            idx, weights = interp.coefficients()
+            self.interp_cache.save(key, xx=cpuArray(interp.xx), yy=cpuArray(interp.yy),
+                                   idx=cpuArray(idx), weights=cpuArray(weights))
+        return interp
 
     def setup(self):
         super().setup()
@@ -312,4 +419,6 @@ class AtmoPropagation(BaseProcessingObj):
                     break
 
         self.setup_interpolators()
+        if self.batch_sources:
+            self.setup_batched_propagation()
         self.build_stream()
@@ -30,6 +30,9 @@ class AtmoRandomPhase(BaseProcessingObj):
         Seed for random number generation, by default 1.
     update_interval : int, optional
         Number of triggers between phase screen updates, by default 1.
+    phasescreen_method : str, optional
+        Phase screen generation method: 'fft' (default) or 'rfft', which
+        needs half the memory and uses all CPUs. See phasescreens_manager().
     target_device_idx : int, optional
         Target device index for computation (CPU/GPU). Default is None (uses global setting).
     precision : int, optional
@@ -44,6 +47,7 @@ class AtmoRandomPhase(BaseProcessingObj):
                  pixel_phasescreens=None,
                  seed: int=1,
                  update_interval: int=1,
+                 phasescreen_method: str='fft',
                  target_device_idx=None,
                  precision=None,
                  verbose=None):
@@ -84,6 +88,7 @@ class AtmoRandomPhase(BaseProcessingObj):
 
         self.L0 = L0
         self.data_dir = data_dir
+        self.phasescreen_method = phasescreen_method
         self.seeing = None
 
         if pixel_phasescreens is None:
@@ -125,7 +130,8 @@ class AtmoRandomPhase(BaseProcessingObj):
                                                    self.pixel_square_phasescreens,
                                                    self.pixel_pitch, self.data_dir,
                                                    seed=self.seed, precision=self.precision,
-                                                   verbose=self.verbose, xp=self.xp)
+                                                   verbose=self.verbose, xp=self.xp,
+                                                   method=self.phasescreen_method)
         # number of slices to be cut from the 2D array
         num_slices = self.pixel_square_phasescreens // self.pixel_pupil
 
@@ -138,8 +144,8 @@ class AtmoRandomPhase(BaseProcessingObj):
             num_slices, self.pixel_pupil, num_slices, self.pixel_pupil
         ).swapaxes(1, 2).reshape(-1, self.pixel_pupil, self.pixel_pupil)
 
-        # phase in rad
-        temp_screen *= self.wavelengthInNm / (2 * np.pi)
+        # phase in rad (not in place, the phase screen is read-only)
+        temp_screen = temp_screen * (self.wavelengthInNm / (2 * np.pi))
 
         temp_screen = self.to_xp(temp_screen, dtype=self.dtype)
 
@@ -8,6 +8,9 @@ class BaseGenerator(BaseProcessingObj):
     
     All specific generators inherit from this class and implement trigger_code().
     """
+
+    checkpoint_attrs = ('iter_counter',)
+
     def __init__(self,
                  output_size: int = 1,
                  target_device_idx: int = None,
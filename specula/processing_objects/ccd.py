@@ -83,6 +83,9 @@ class CCD(BaseProcessingObj):
     precision : int, optional
         Precision for computation (0 for double, 1 for single). Default is None (uses global setting).
     """
+
+    checkpoint_attrs = ('_integrated_i', '_photon_rng', '_readout_rng', '_excess_rng')
+
     def __init__(self,
                  simul_params: SimulParams,
                  size: int,           # TODO list=[80,80],
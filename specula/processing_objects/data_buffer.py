@@ -8,6 +8,8 @@ from specula.base_value import BaseValue
 class DataBuffer(BaseProcessingObj):
     '''Data buffering object - accumulates data and outputs it every N steps'''
 
+    checkpoint_attrs = ('storage', 'step_counter')
+
     def __init__(self, buffer_size: int = 10):
         super().__init__()
         self.buffer_size = buffer_size
@@ -7,6 +7,8 @@ from specula import cpuArray, np
 class DataPrint(BaseProcessingObj):
     '''Print data values to screen at regular intervals'''
 
+    sink = True
+
     def __init__(self,
                  print_dt: float = 1.0,      # Print interval in seconds
                  range_slice: tuple = None,      # Range of values to print (e.g., (0, 5))
@@ -1,6 +1,7 @@
 
 import os
 import pickle
+import numpy as np
 from astropy.io import fits
 
 from specula.base_processing_obj import BaseProcessingObj
@@ -9,7 +10,15 @@ from specula.lib.utils import import_class
 
 
 class DataSource(BaseProcessingObj):
-    '''Data source object'''
+    '''
+    Data source object
+
+    Stored data cubes are memory-mapped whenever the file format allows it
+    (uncompressed FITS and npy files),
+    so that start-up time and memory usage do not depend on the TN length.
+    Each time step is located in a sorted time index and copied
+    into the preallocated output buffer.
+    '''
 
     def __init__(self,
                 outputs: list,         # TODO =[],
@@ -18,6 +27,9 @@ class DataSource(BaseProcessingObj):
         super().__init__()
         self.items = {}
         self.storage = {}
+        self.times = {}
+        self.rows = {}
+        self.last_row = {}
         self.data_filename = ''
         self.tn_dir = store_dir
         self.data_format = data_format
@@ -39,6 +51,10 @@ class DataSource(BaseProcessingObj):
             self.load_fits(name)
         elif self.data_format=='pickle':
             self.load_pickle(name)
+        elif self.data_format=='npy':
+            self.load_npy(name)
+        else:
+            raise TypeError(f"Error: unsupported file format {self.data_format}")
 
     def load_pickle(self, name):
         filename = os.path.join(self.tn_dir,name + '.pickle')
@@ -51,16 +67,65 @@ class DataSource(BaseProcessingObj):
             self.headers[name] = unserialized_data['hdr']
             self.obj_type[name] = self.headers[name]['OBJ_TYPE']
         
-        self.storage[name] = { t:data[i] for i, t in enumerate(times.tolist())}
+        self.set_storage(name, data, times)
 
     def load_fits(self, name):
         filename = os.path.join(self.tn_dir, name+'.fits')
+        # By default, astropy memory-maps the data unless it is scaled (BZERO/BSCALE).
+        # Memory-mapped data stays valid after the file is closed, as long as it is referenced.
+        # Tile-compressed data (see DataStore) is stored in the first extension
+        # and is decompressed in memory.
+        with fits.open(filename) as hdul:
+            self.headers[name] = dict(hdul[0].header)  # pylint: disable=no-member # (created dynamically by pyfits)
+            self.obj_type[name] = self.headers[name]['OBJ_TYPE']
+            if isinstance(hdul[1], fits.CompImageHDU):
+                data = hdul[1].data                    # pylint: disable=no-member # (created dynamically by pyfits)
+                times = hdul[2].data.copy()            # pylint: disable=no-member # (created dynamically by pyfits)
+            else:
+                times = hdul[1].data.copy()            # pylint: disable=no-member # (created dynamically by pyfits)
+                data = hdul[0].data                    # pylint: disable=no-member # (created dynamically by pyfits)
+        self.set_storage(name, data, times)
+
+    def load_npy(self, name):
+        filename = os.path.join(self.tn_dir, name + '_times.fits')
         with fits.open(filename) as hdul:
             self.headers[name] = dict(hdul[0].header)  # pylint: disable=no-member # (created dynamically by pyfits)
             self.obj_type[name] = self.headers[name]['OBJ_TYPE']
-            times = hdul[1].data.copy()                # pylint: disable=no-member # (created dynamically by pyfits)
-            data = hdul[0].data.copy()                 # pylint: disable=no-member # (created dynamically by pyfits)
-        self.storage[name] = { t:data[i] for i, t in enumerate(times.tolist())}
+            times = hdul[0].data.copy()                # pylint: disable=no-member # (created dynamically by pyfits)
+        data = np.load(os.path.join(self.tn_dir, name + '.npy'), mmap_mode='r')
+        self.set_storage(name, data, times)
+
+    def set_storage(self, name, data, times):
+        '''
+        Set the data cube for output *name*, whose first axis
+        corresponds to the *times* array, and build the time index.
+        '''
+        times = np.asarray(times)
+        if len(times) != len(data):
+            raise ValueError(f'Data for {name} has {len(data)} frames but {len(times)} time values')
+        order = np.argsort(times, kind='stable')
+        self.storage[name] = data
+        self.times[name] = times[order]
+        self.rows[name] = order
+        self.last_row[name] = -1
+
+    def time_to_row(self, name, t):
+        '''
+        Return the data row index for time *t*.
+        Sequential replay is O(1), otherwise a binary search is used.
+        '''
+        times = self.times[name]
+        i = self.last_row[name] + 1
+        if i >= len(times) or times[i] != t:
+            i = int(np.searchsorted(times, t))
+            if i >= len(times) or times[i] != t:
+                raise KeyError(f'Time {t} not found in stored data for {name}')
+        self.last_row[name] = i
+        return self.rows[name][i]
+
+    def get_frame(self, name, t):
+        '''Return the stored frame for output *name* at time *t*'''
+        return self.storage[name][self.time_to_row(name, t)]
 
     def size(self, name, dimensions=False):
         if name not in self.storage:
@@ -70,8 +135,9 @@ class DataSource(BaseProcessingObj):
         return h.shape if not dimensions else h.shape[dimensions]
 
     def trigger_code(self):
-        for k in self.storage.keys():            
-            self.outputs[k].set_value(self.outputs[k].xp.array(self.storage[k][self.current_time]))
+        for k in self.storage.keys():
+            # set_value() copies into the existing output buffer
+            self.outputs[k].set_value(self.get_frame(k, self.current_time))
             self.outputs[k].generation_time = self.current_time
 
         
\ No newline at end of file
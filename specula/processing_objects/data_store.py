@@ -7,13 +7,66 @@ from collections import OrderedDict, defaultdict
 import pickle
 import yaml
 import time
+import itertools
 
 from specula import cpuArray
+from specula.lib.checkpoint import to_state, from_state
 from specula.base_processing_obj import BaseProcessingObj
+from specula.lib.npy_stream import NpyStreamWriter, BackgroundWriter
+from specula.lib.online_reduction import REDUCTIONS, WelchPsd, parse_reductions
 
 
 class DataStore(BaseProcessingObj):
-    '''Data storage object'''
+    '''
+    Data storage object
+
+    With data_format='fits' or 'pickle', all values are kept in memory
+    and saved at the end of the simulation.
+
+    With data_format='npy', values are streamed to disk during the simulation:
+    each key is written to a single <key>.npy file in blocks of *chunk_size* steps
+    by a background thread, while times and header are saved at the end in
+    <key>_times.fits. Memory usage is bounded to a few chunks per key.
+
+    The *reductions* dictionary selects, for some keys, reductions computed
+    on the fly (on the device of this object) instead of storing all values:
+
+    - 'decimate': N stores one value every N samples, as a normal key
+    - 'mean_var': running mean and unbiased variance, saved as <key>_mean and <key>_var
+    - 'min_max': element-wise minimum and maximum, saved as <key>_min and <key>_max
+    - 'histogram': {bins: B, range: [min, max]} histogram of all elements, saved as <key>_hist
+    - 'psd': {nfft: N, hop: H} element-wise Welch PSD, saved as <key>_psd (frequency step in PSD_DF)
+
+    For example::
+
+        reductions:
+          res: ['mean_var', {psd: {nfft: 1024}}]
+          pixels: {decimate: 100}
+
+    Keys with reductions other than 'decimate' are not stored in full.
+    Reduced products are saved by finalize() as a single frame, in the
+    same file layout as the other keys, so that they can be read by DataSource.
+
+    With *native_dtype*, integer values keep their dtype, and Pixels whose values
+    are all integers are saved with the pixel type (e.g. uint16) instead of
+    floating point. With data_format='fits', *compression* selects a FITS tile
+    compression algorithm ('GZIP_1', 'GZIP_2', 'RICE_1', 'HCOMPRESS_1' or 'PLIO_1')
+    used for integer data. Floating point data are compressed losslessly with
+    'GZIP_2', unless *max_error* is set: in this case they are quantized, with
+    an absolute error of at most *max_error*, and then compressed with *compression*.
+    Compressed files are read transparently by DataSource, but are not memory-mapped.
+
+    Simulation checkpoints append the values stored since the previous checkpoint
+    to a checkpoint_storage.pickle file in the TN folder, instead of saving
+    all of them each time. With *split_size*, stored values are bounded by
+    the split size and are saved in the checkpoint itself.
+    '''
+
+    compression_types = ('GZIP_1', 'GZIP_2', 'RICE_1', 'HCOMPRESS_1', 'PLIO_1')
+
+    checkpoint_attrs = ('iter_counter', 'sample_counts', 'last_sample_time')
+    checkpoint_storage_filename = 'checkpoint_storage.pickle'
+    sink = True
 
     def __init__(self,
                 store_dir: str,         # TODO ="",
@@ -21,8 +74,29 @@ class DataStore(BaseProcessingObj):
                 first_suffix: int=0,
                 data_format: str='fits',
                 start_time: float=0,
-                create_tn: bool=True):
-        super().__init__()
+                create_tn: bool=True,
+                chunk_size: int=100,
+                max_pending_chunks: int=4,
+                reductions: dict=None,
+                native_dtype: bool=True,
+                compression: str=None,
+                max_error: float=0,
+                target_device_idx: int=None,
+                precision: int=None):
+        super().__init__(target_device_idx=target_device_idx, precision=precision)
+        if data_format == 'npy' and split_size > 0:
+            raise ValueError('split_size is not supported with the npy streaming data format')
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be a positive integer')
+        if compression is not None:
+            if data_format != 'fits':
+                raise ValueError('compression is only supported with the fits data format')
+            if compression not in self.compression_types:
+                raise ValueError(f'Unknown compression {compression}, must be one of {self.compression_types}')
+        if max_error < 0:
+            raise ValueError('max_error must be non-negative')
+        if max_error > 0 and compression is None:
+            raise ValueError('max_error requires a compression algorithm')
         self.data_filename = ''
         self.today = time.strftime("%Y%m%d_%H%M%S")
         self.tn_dir = store_dir
@@ -34,10 +108,249 @@ class DataStore(BaseProcessingObj):
         self.split_size = split_size
         self.first_suffix = first_suffix
         self.start_time = self.seconds_to_t(start_time)
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max_pending_chunks
+        self.native_dtype = native_dtype
+        self.compression = compression
+        self.max_error = max_error
+        self.tn_created = False
+        self.writer = None
+        self.reductions = {k: parse_reductions(v) for k, v in (reductions or {}).items()}
+        self.checkpoint_file = None
+        self.checkpoint_counts = {}
         self.init_storage()
 
     def init_storage(self):
         self.storage = defaultdict(OrderedDict)
+        self.streams = {}
+        self.chunks = {}
+        self.chunk_counts = {}
+        self.stream_times = defaultdict(list)
+        self.sample_counts = {}
+        self.last_sample_time = {}
+        self.reducers = {}
+        for k, spec in self.reductions.items():
+            self.reducers[k] = []
+            for name, kwargs in spec:
+                if name == 'decimate':
+                    continue
+                if REDUCTIONS[name] is WelchPsd:
+                    kwargs = dict(kwargs, t_to_seconds=self.t_to_seconds)
+                self.reducers[k].append(REDUCTIONS[name](self.xp, self.dtype, **kwargs))
+
+    def decimation(self, k):
+        '''Decimation factor of key *k*, or None if the key is not stored in full'''
+        decimate = 1
+        for name, kwargs in self.reductions.get(k, []):
+            if name == 'decimate':
+                decimate = kwargs['n']
+        if decimate == 1 and len(self.reducers.get(k, [])) > 0:
+            return None
+        return decimate
+
+    def store_value(self, k, value):
+        if self.data_format == 'npy':
+            # A single copy into the current chunk buffer
+            self.stream_value(k, cpuArray(value))
+        else:
+            v = cpuArray(value, force_copy=True)
+            self.storage[k][self.current_time] = v
+
+    def reduce_value(self, k, value):
+        '''
+        Add a new sample of key *k* to its reductions, and store it
+        if it falls on the decimation grid. Values stored again at the
+        same time step (e.g. by finalize()) overwrite stored values,
+        but are not added again to the reductions.
+        '''
+        if self.last_sample_time.get(k) == self.current_time:
+            n = self.sample_counts[k] - 1
+        else:
+            n = self.sample_counts.get(k, 0)
+            self.sample_counts[k] = n + 1
+            self.last_sample_time[k] = self.current_time
+            for reducer in self.reducers[k]:
+                reducer.add(value, self.current_time)
+
+        decimate = self.decimation(k)
+        if decimate is not None and n % decimate == 0:
+            self.store_value(k, value)
+
+    def save_reductions(self):
+        '''Save all reduced products, as single-frame cubes'''
+        for k, reducers in self.reducers.items():
+            if k not in self.local_inputs or self.local_inputs[k] is None:
+                continue
+            for reducer in reducers:
+                if reducer.count == 0:
+                    continue
+                for suffix, (frame, extra_hdr, same_type) in reducer.products().items():
+                    if same_type:
+                        hdr = self.local_inputs[k].get_fits_header()
+                    else:
+                        hdr = fits.Header()
+                        hdr['VERSION'] = 1
+                        hdr['OBJ_TYPE'] = 'BaseValue'
+                    for key, value in extra_hdr.items():
+                        hdr[key] = value
+                    data = cpuArray(frame)[np.newaxis]
+                    times = np.array([reducer.last_t], dtype=np.uint64)
+                    self.save_product(f'{k}_{suffix}', data, times, hdr)
+
+    def save_product(self, name, data, times, hdr):
+        '''Save a data cube and its times in the current data format'''
+        if self.data_format == 'fits':
+            self.write_fits(os.path.join(self.tn_dir, name + '.fits'), data, times, hdr)
+        elif self.data_format == 'pickle':
+            with open(os.path.join(self.tn_dir, name + '.pickle'), 'wb') as handle:
+                pickle.dump({'data': data, 'times': times, 'hdr': hdr}, handle,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        elif self.data_format == 'npy':
+            np.save(os.path.join(self.tn_dir, name + '.npy'), data)
+            fits.writeto(os.path.join(self.tn_dir, name + '_times.fits'), times,
+                         header=hdr, overwrite=True)
+
+    def stream_value(self, k, value):
+        '''
+        Copy a value into the current chunk of key *k*, and hand
+        the chunk over to the background writer when it is full.
+        '''
+        if k not in self.streams:
+            if self.writer is None:
+                if self.create_tn and not self.tn_created:
+                    self.create_TN_folder()
+                self.writer = BackgroundWriter(max_pending=self.max_pending_chunks)
+            filename = os.path.join(self.tn_dir, k + '.npy')
+            dtype = self.storage_dtype(value)
+            self.streams[k] = NpyStreamWriter(filename, value.shape, dtype)
+            self.chunks[k] = np.empty((self.chunk_size,) + value.shape, dtype=dtype)
+            self.chunk_counts[k] = 0
+
+        times = self.stream_times[k]
+        if len(times) > 0 and times[-1] == self.current_time:
+            # Same time step stored again (e.g. by finalize()): overwrite the last frame,
+            # which is always still in the current chunk
+            self.chunks[k][self.chunk_counts[k] - 1] = value
+            return
+
+        # Full chunks are only submitted when a new frame arrives
+        if self.chunk_counts[k] == self.chunk_size:
+            self.writer.submit(self.streams[k], self.chunks[k])
+            self.chunks[k] = np.empty_like(self.chunks[k])
+            self.chunk_counts[k] = 0
+
+        self.chunks[k][self.chunk_counts[k]] = value
+        self.chunk_counts[k] += 1
+        times.append(self.current_time)
+
+    def get_state(self):
+        state = super().get_state()
+        if self.split_size > 0:
+            state['attrs']['storage'] = to_state(self.storage)
+        else:
+            state['storage_file'] = self.append_checkpoint_storage()
+        state['reducers'] = {k: [to_state({attr: getattr(r, attr) for attr in r.state_attrs})
+                                 for r in reducers]
+                             for k, reducers in self.reducers.items()}
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        if 'storage_file' in state:
+            self.storage = self.read_checkpoint_storage(**state['storage_file'])
+        for k, reducer_states in state.get('reducers', {}).items():
+            for reducer, reducer_state in zip(self.reducers[k], reducer_states):
+                for attr, value in from_state(reducer_state, None, self.xp).items():
+                    setattr(reducer, attr, value)
+
+    def append_checkpoint_storage(self):
+        '''
+        Append the values stored since the previous checkpoint to the
+        checkpoint storage file, and return its name and current size.
+        The file is written from scratch by the first checkpoint of each run
+        and then only appended to, so that older checkpoints, which
+        read it up to their own size, remain valid.
+        '''
+        if self.checkpoint_file is None:
+            if self.create_tn and not self.tn_created:
+                self.create_TN_folder()
+            os.makedirs(self.tn_dir, exist_ok=True)
+            self.checkpoint_file = os.path.join(self.tn_dir, self.checkpoint_storage_filename)
+            mode = 'wb'
+        else:
+            mode = 'ab'
+        with open(self.checkpoint_file, mode) as f:
+            for k, values in self.storage.items():
+                n = self.checkpoint_counts.get(k, 0)
+                if len(values) > n:
+                    pickle.dump((k, list(itertools.islice(values.items(), n, None))), f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                    self.checkpoint_counts[k] = len(values)
+            return {'filename': self.checkpoint_file, 'size': f.tell()}
+
+    @staticmethod
+    def read_checkpoint_storage(filename, size):
+        '''Read the stored values written by append_checkpoint_storage(), up to *size* bytes'''
+        storage = defaultdict(OrderedDict)
+        with open(filename, 'rb') as f:
+            while f.tell() < size:
+                k, items = pickle.load(f)
+                storage[k].update(items)
+        return storage
+
+    def storage_dtype(self, value):
+        '''
+        dtype used to save *value*: with native_dtype, only floating point
+        values are converted to the simulation precision
+        '''
+        if not self.native_dtype or value.dtype.kind == 'f':
+            return self.dtype
+        if value.dtype.kind == 'c':
+            return self.complex_dtype
+        return value.dtype
+
+    def to_cube(self, values, hdr):
+        '''
+        Stack a sequence of stored values into a single data cube.
+        With native_dtype, Pixels values are converted to the pixel type
+        if this can be done without loss.
+        '''
+        values = list(values)
+        cube = np.array(values, dtype=self.storage_dtype(values[0]))
+        if self.native_dtype and hdr.get('OBJ_TYPE') == 'Pixels' and cube.dtype.kind == 'f':
+            pixel_type = np.dtype(hdr['TYPE'])
+            info = np.iinfo(pixel_type)
+            if cube.size > 0 and np.all(np.mod(cube, 1) == 0) \
+               and cube.min() >= info.min and cube.max() <= info.max:
+                cube = cube.astype(pixel_type)
+        return cube
+
+    def write_fits(self, filename, data, times, hdr):
+        '''
+        Write a data cube and its times in a FITS file: data in the primary HDU
+        and times in the first extension or, with compression, an empty primary
+        HDU, the compressed data and the times in the second extension.
+        '''
+        hdu_time = fits.ImageHDU(times, header=hdr)
+        if self.compression is None:
+            hdul = fits.HDUList([fits.PrimaryHDU(data, header=hdr), hdu_time])
+        else:
+            if data.dtype.kind == 'f':
+                compression = self.compression if self.max_error > 0 else 'GZIP_2'
+                # A negative quantize_level is the absolute quantization step.
+                # Zero disables quantization (lossless, GZIP only)
+                quantize_level = -2 * self.max_error
+            else:
+                compression = self.compression
+                quantize_level = 0
+            # One tile per frame: the default of one tile per row is much slower
+            tile_shape = (1,) + data.shape[1:] if data.ndim > 1 else None
+            hdu_data = fits.CompImageHDU(data, header=hdr, compression_type=compression,
+                                         tile_shape=tile_shape, quantize_level=quantize_level,
+                                         dither_seed=-1)
+            hdul = fits.HDUList([fits.PrimaryHDU(header=hdr), hdu_data, hdu_time])
+        hdul.writeto(filename, overwrite=True)
+        hdul.close()  # Force close for Windows
 
     def setParams(self, params):
         self.params = params
@@ -48,8 +361,6 @@ class DataStore(BaseProcessingObj):
     def save_pickle(self):
         times = {k: np.array(list(v.keys()), dtype=self.dtype)
             for k, v in self.storage.items() if isinstance(v, OrderedDict) and k is not None}
-        data = {k: np.array(list(v.values()), dtype=self.dtype)
-            for k, v in self.storage.items() if isinstance(v, OrderedDict) and k is not None}
 
         for k, v in times.items():
             try:
@@ -60,8 +371,9 @@ class DataStore(BaseProcessingObj):
 
                 filename = os.path.join(self.tn_dir, k + '.pickle')
                 hdr = self.inputs[k].get(target_device_idx=-1).get_fits_header()
+                data = self.to_cube(self.storage[k].values(), hdr)
                 with open(filename, 'wb') as handle:
-                    data_to_save = {'data': data[k], 'times': times[k], 'hdr': hdr}
+                    data_to_save = {'data': data, 'times': times[k], 'hdr': hdr}
                     pickle.dump(data_to_save, handle, protocol=pickle.HIGHEST_PROTOCOL)
 
             except Exception as e:
@@ -88,8 +400,6 @@ class DataStore(BaseProcessingObj):
     def save_fits(self):
         times = {k: np.array(list(v.keys()), dtype=np.uint64)
             for k, v in self.storage.items() if isinstance(v, OrderedDict)}
-        data = {k: np.array(list(v.values()), dtype=self.dtype)
-            for k, v in self.storage.items() if isinstance(v, OrderedDict)}
 
         for k,v in times.items():
             try:
@@ -101,17 +411,30 @@ class DataStore(BaseProcessingObj):
 
                 filename = os.path.join(self.tn_dir, k + '.fits')
                 hdr = self.local_inputs[k].get_fits_header()
-                hdu_time = fits.ImageHDU(times[k], header=hdr)
-                hdu_data = fits.PrimaryHDU(data[k], header=hdr)
-                hdul = fits.HDUList([hdu_data, hdu_time])
-                hdul.writeto(filename, overwrite=True)
-                hdul.close()  # Force close for Windows
+                self.write_fits(filename, self.to_cube(self.storage[k].values(), hdr), times[k], hdr)
 
             except Exception as e:
                 if self.verbose:
                     print(f"Error saving FITS file for key '{k}': {str(e)}")
                 continue
 
+    def save_npy(self):
+        if self.writer is None:
+            return
+        for k, stream in self.streams.items():
+            n = self.chunk_counts[k]
+            if n > 0:
+                self.writer.submit(stream, self.chunks[k][:n])
+        self.writer.close()
+        self.writer = None
+
+        for k, stream in self.streams.items():
+            stream.close()
+            filename = os.path.join(self.tn_dir, k + '_times.fits')
+            hdr = self.local_inputs[k].get_fits_header()
+            times = np.array(self.stream_times[k], dtype=np.uint64)
+            fits.writeto(filename, times, header=hdr, overwrite=True)
+
     def create_TN_folder(self, suffix=''):
         iter = None
         while True:
@@ -121,6 +444,7 @@ class DataStore(BaseProcessingObj):
                 fullpath += f'.{iter}'
             if not os.path.exists(fullpath):
                 os.makedirs(fullpath)
+                self.tn_created = True
                 break
             if iter is None:
                 iter = 0
@@ -135,8 +459,10 @@ class DataStore(BaseProcessingObj):
         for k, item in self.local_inputs.items():
             if item is not None and item.generation_time == self.current_time:
                 value = item.get_value()
-                v = cpuArray(value, force_copy=True)
-                self.storage[k][self.current_time] = v
+                if k in self.reductions:
+                    self.reduce_value(k, value)
+                else:
+                    self.store_value(k, value)
 
         # If we are saving a split TN, check whether it is time to save a new chunk
         # In case, clear the storage dictionary to restart with an empty one.
@@ -155,6 +481,9 @@ class DataStore(BaseProcessingObj):
             item = _input.get(target_device_idx=self.target_device_idx)
             if item is not None and not hasattr(item, 'get_value'):
                 raise TypeError(f"Error: don't know how to buffer an object of type {type(item)}")
+        for k in self.reductions:
+            if k not in self.inputs:
+                raise ValueError(f'Reductions specified for key {k}, which is not in input_list')
 
     def save(self):
         self.save_params()
@@ -162,8 +491,11 @@ class DataStore(BaseProcessingObj):
             self.save_pickle()
         elif self.data_format == 'fits':
             self.save_fits()
+        elif self.data_format == 'npy':
+            self.save_npy()
         else:
             raise TypeError(f"Error: unsupported file format {self.data_format}")
+        self.save_reductions()
 
     def finalize(self):
 
@@ -172,6 +504,6 @@ class DataStore(BaseProcessingObj):
         self.trigger_code()
 
         if self.split_size == 0:
-            if self.create_tn:
+            if self.create_tn and not self.tn_created:
                 self.create_TN_folder()
             self.save()
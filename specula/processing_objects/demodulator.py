@@ -11,6 +11,8 @@ class Demodulator(BaseProcessingObj):
     representing modal amplitudes.
     """
 
+    checkpoint_attrs = ('data_history', 'time_history')
+
     def __init__(self,
                  simul_params: SimulParams,
                  mode_numbers: list,
@@ -1,39 +1,37 @@
 
-import io
 import os
 import socket
 import threading
 import time
-import base64
 import queue
-import pickle
 import typing
 import multiprocessing as mp
-from contextlib import contextmanager
+from multiprocessing import resource_tracker
+
+import numpy as np
 
 from flask import Flask, render_template, request
 from flask_socketio import SocketIO, join_room
 import socketio
 import socketio.exceptions
 
-from specula.base_value import BaseValue
 from specula.base_processing_obj import BaseProcessingObj
-from specula.display.data_plotter import DataPlotter
-
-# Use a manager to create queues so that they can be
-# pickled between processes (ordinary mp.Queue cannot)
-manager = mp.Manager()
+from specula.lib.shm_snapshot import ShmSnapshot
 
 
 class DisplayServer(BaseProcessingObj):
     '''
-    Copies data objects to a separate process using multiprocessing queues.
-    In this instance, the separate process is a Flask web server, but this class
-    could be easily made generic to support different kinds of export processes.
-    
-    This object must *not* be run concurrently with any other in the simulation,
-    because it can in some cases temporarily modify the data objects (removing references
-    to the xp module to allow pickling)
+    Publishes data objects to a separate process, a Flask web server
+    that sends them to the browsers.
+
+    The work done in the simulation loop is limited to one copy per
+    requested object: the arrays returned by array_for_display() are copied
+    into a shared memory snapshot (see specula.lib.shm_snapshot), at most
+    *max_rate* times per second and only when the object has been updated.
+    Downsampling to at most *max_size* elements per axis, serialization and
+    transmission are done in the server process, and plots are drawn by
+    the browser from the raw arrays, so that the simulation never waits
+    for the server or for the browsers.
     '''
     def __init__(self,
                  params_dict: dict,
@@ -42,20 +40,34 @@ class DisplayServer(BaseProcessingObj):
                  info_getter: typing.Callable,
                  host: str='0.0.0.0',
                  port: int=0,    # Autoselect
+                 max_rate: float=10.0,
+                 max_size: int=512,
     ):
         super().__init__()
-        self.qin = manager.Queue()    # Queue to receive dataobj requests from the Flask webserver
-        self.qout = manager.Queue()   # Queue to send regular status updates
-
-        # Flask-SocketIO web server
-        self.p = mp.Process(target=start_server, args=(params_dict, self.qout, self.qin, host, port))  # qin becomes qout for the server
+        self.qin = mp.Queue()    # Queue to receive the requested object names from the Flask webserver
+        self.qout = mp.Queue()   # Queue to send status updates and snapshot announcements
+
+        # Flask-SocketIO web server. The resource tracker is started
+        # first, so that the server shares it (see ShmSnapshot.attach)
+        resource_tracker.ensure_running()
+        self.p = mp.Process(target=start_server, args=(params_dict, self.qout, self.qin, host, port, max_size),
+                            daemon=True)  # qin becomes qout for the server
         self.p.start()
 
         # Simulation speed calculation
         self.counter = 0
         self.t0 = time.time()
         self.c0 = self.counter
-        self.speed_report = ''
+
+        # Shared memory snapshots, indexed by object name
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.requested = []
+        self.snapshots = {}
+        self.last_publish = {}
+        self.last_generation_time = {}
+        self.texts = {}
+        self.prefix = f'spd{os.getpid():x}{int(time.time() * 1000) % 0xffffff:x}'
+        self.nsegments = 0
 
         # Heuristic to detect inputs: they usually start with "in_"
         def data_obj_getter(name):
@@ -81,49 +93,78 @@ class DisplayServer(BaseProcessingObj):
             self.t0 = t1
             name, status = self.info_getter()
             status_report = f"{status} - {speed:.2f} Hz"
-            self.qout.put((name, status_report))
-
-        # Loop over data object requests
-        # This loop is guaranteed to find an empty queue sooner or later,
-        # thanks to the handshaking with the browser code, that will
-        # avoid sending new requests until the None terminator is received
-        # by the browser itself.
+            self.qout.put(('status', name, status_report))
 
+        # Only the most recent list of requested objects is relevant
         while True:
             try:
-                object_names, response_queue = self.qin.get(block=False)
+                self.requested = self.qin.get_nowait()
             except queue.Empty:
-                return
-
-            for name in object_names:
-
-                # Find the requested object, make sure it's on CPU,
-                # and remove xp/np modules to prepare for pickling
-                dataobj = self.data_obj_getter(name)
-                if dataobj is None:
-                    dataobj = BaseValue(value=None)
+                break
 
-                if isinstance(dataobj, list):
-                    dataobj_cpu = [x.copyTo(-1) for x in dataobj]
-                else:
-                    dataobj_cpu = dataobj.copyTo(-1)
+        for name in self.requested:
+            if t1 - self.last_publish.get(name, 0) >= self.min_interval:
+                self.publish(name)
+                self.last_publish[name] = t1
 
-                # Use an object copy without references to xp and np
-                with remove_xp_np(dataobj_cpu) as cleaned_dataobj:
+    def publish(self, name):
+        '''
+        Copy the display arrays of object *name* into its shared memory
+        snapshot, if the object has been updated since the last time.
+        Objects that cannot be displayed are reported with a text message.
+        '''
+        try:
+            dataobj = self.data_obj_getter(name)
+        except Exception as e:
+            self.publish_text(name, f'Cannot find {name}: {e}')
+            return
+        if dataobj is None:
+            self.publish_text(name, 'This is None')
+            return
+        objs = dataobj if isinstance(dataobj, list) else [dataobj]
+        if len(objs) < 1:
+            self.publish_text(name, 'No values to plot')
+            return
 
-                    # Double pickle trick (we pickle, and then qout will pickle again)
-                    # to avoid some problems
-                    # with serialization of modules, which apparently
-                    # are still present even after the xp and np removal
+        generation_time = max(getattr(x, 'generation_time', 0) for x in objs)
+        if name in self.snapshots and self.last_generation_time.get(name) == generation_time:
+            return
 
-                    obj_bytes = pickle.dumps(cleaned_dataobj)
-                    response_queue.put((name, obj_bytes))
+        if not all(hasattr(x, 'array_for_display') for x in objs):
+            self.publish_text(name, f'Plot not implemented for class {objs[0].__class__.__name__}')
+            return
+        arrays = [x.array_for_display() for x in objs]
+        if any(a is None for a in arrays):
+            self.publish_text(name, 'Cannot plot None values')
+            return
+        arrays = [a if hasattr(a, 'ndim') else np.asarray(a) for a in arrays]
+
+        snapshot = self.snapshots.get(name)
+        if snapshot is None or not snapshot.fits(arrays):
+            new_snapshot = ShmSnapshot.create(f'{self.prefix}_{self.nsegments}', arrays)
+            self.nsegments += 1
+            new_snapshot.publish(arrays, generation_time)
+            self.qout.put(('snapshot', name, new_snapshot.name))
+            if snapshot is not None:
+                # The server keeps its own mapping until it receives the new name
+                snapshot.close(unlink=True)
+            self.snapshots[name] = new_snapshot
+        else:
+            snapshot.publish(arrays, generation_time)
+        self.last_generation_time[name] = generation_time
+        if self.texts.pop(name, None) is not None:
+            self.qout.put(('text', name, None))
 
-            # Terminator
-            response_queue.put((None, self.speed_report))
+    def publish_text(self, name, text):
+        if self.texts.get(name) != text:
+            self.texts[name] = text
+            self.qout.put(('text', name, text))
 
     def finalize(self):
         self.p.terminate()
+        for snapshot in self.snapshots.values():
+            snapshot.close(unlink=True)
+        self.snapshots = {}
 
 
 base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -145,23 +186,31 @@ class FlaskServer():
                  qout: mp.Queue,
                  host: str='0.0.0.0',
                  port: int=5000,
+                 max_size: int=512,
+                 max_wait: float=1.0,
                  ):
         self.params_dict = params_dict
         self.t0 = {}
         self.qin = qin
         self.qout = qout
-        self.plotters = {}
-        self.display_lock = threading.Lock()
         self.host = host
         self.port = port
+        self.max_size = max_size
+        self.max_wait = max_wait
         self.actual_port = None  # Filled in later
         self.frontend_connected = False
+        self.speed_report = ''
+        self.snapshots = {}      # Shared memory snapshots, indexed by object name
+        self.texts = {}          # Text messages for objects that cannot be plotted
+        self.requests = {}       # Object names requested by each client
+        self.last_seq = {}       # Last snapshot sent to each client
+        self.lock = threading.Lock()
 
     def run(self):
         '''
         Run the main server and a regular status update in a separate thread
         '''
-        t = threading.Thread(target=self.status_update, args=(sio,))
+        t = threading.Thread(target=self.status_update, args=(sio,), daemon=True)
         t.start()
 
         # If port == 0 (auto), we need to know which one is selected, but Flask won't tell us.
@@ -184,6 +233,11 @@ class FlaskServer():
         os._exit(0)
 
     def status_update(self, sio):
+        '''
+        Receive messages from the simulation: status updates, that are
+        forwarded to the frontend server, new shared memory snapshots
+        and text messages for objects that cannot be plotted.
+        '''
         sio_client = socketio.Client()
         def connect():
             if not self.frontend_connected:
@@ -192,7 +246,7 @@ class FlaskServer():
 
         while True:
             try:
-                name, data = self.qin.get(timeout=60)
+                kind, name, data = self.qin.get(timeout=60)
             except queue.Empty:
                 # Timeout. Problem in the processing object. We bail out
                 print('No updates from simulation after 60 seconds, stopping status updates')
@@ -201,9 +255,18 @@ class FlaskServer():
                 print('Display server terminated, exiting web server')
                 self.shutdown()
 
-            # Terminator
-            if data is None:
-                break
+            if kind == 'snapshot':
+                self.attach_snapshot(name, data)
+                continue
+            if kind == 'text':
+                with self.lock:
+                    if data is None:
+                        self.texts.pop(name, None)
+                    else:
+                        self.texts[name] = data
+                continue
+
+            self.speed_report = data
             # Fault-tolerant publishing
             try:
                 connect()
@@ -213,44 +276,86 @@ class FlaskServer():
                 self.frontend_connected = False
                 time.sleep(1)
 
+    def attach_snapshot(self, name, shm_name):
+        try:
+            snapshot = ShmSnapshot.attach(shm_name)
+        except FileNotFoundError:
+            # Already replaced by a newer one, which will be announced shortly
+            return
+        with self.lock:
+            old = self.snapshots.pop(name, None)
+            self.snapshots[name] = snapshot
+        if old is not None:
+            old.close()
+
+    def set_request(self, client_id, names):
+        '''
+        Record the object names requested by a client, and send the list
+        of all requested objects to the simulation if it changed
+        '''
+        with self.lock:
+            before = set().union(*self.requests.values())
+            self.requests[client_id] = set(names)
+            after = set().union(*self.requests.values())
+        if after != before:
+            self.qout.put(sorted(after))
+
+    def remove_client(self, client_id):
+        self.set_request(client_id, [])
+        with self.lock:
+            del self.requests[client_id]
+            for key in [key for key in self.last_seq if key[0] == client_id]:
+                del self.last_seq[key]
+
+    def send_snapshot(self, client_id, name):
+        '''
+        Send the latest snapshot of *name* to a client, if it
+        has not been sent already. Return True if something was sent.
+        '''
+        with self.lock:
+            text = self.texts.get(name)
+            snapshot = self.snapshots.get(name)
+            if text is None and snapshot is not None:
+                snap = snapshot.read()
+                if snap is not None and snap[0] == self.last_seq.get((client_id, name)):
+                    snap = None
+        if text is not None:
+            sio.emit('text', {'name': name, 'text': text}, room=client_id)
+            return True
+        if snapshot is None or snap is None:
+            return False
+
+        seq, generation_time, arrays = snap
+        self.last_seq[(client_id, name)] = seq
+        sio.emit('data', {'name': name,
+                          'generation_time': generation_time,
+                          'arrays': encode_arrays(arrays, self.max_size)}, room=client_id)
+        return True
+
     @sio.on('newdata')
     def handle_newdata(args):
         '''Request for new data from the browser.
-        1) Queue all requested object names
-        2) Get back all data objects, plot them, and send them back to the browser
+        1) Update the list of objects to be published by the simulation
+        2) Send new snapshots of all requested objects back to the browser,
+           waiting at most max_wait seconds for objects that were not updated
         '''
-        print(args)
         client_id = request.sid
-        response_queue = manager.Queue() # Separate response queue for each client
 
         if client_id not in server.t0:
             server.t0[client_id] = time.time()
 
-        # Queue data object requests to the simulation Processing object
-        server.qout.put((args, response_queue))
+        server.set_request(client_id, args)
 
         # Function to emit results back to the client
         def emit_results():
+            pending = list(args)
+            deadline = time.time() + server.max_wait
             while True:
-                try:
-                    name, obj_bytes = response_queue.get(timeout=30)
-                except queue.Empty:
-                    # Timeout. Problem in the processing object. We bail out
-                    break
-
-                if name is None: # Terminator
-                    speed_report = obj_bytes
-                    sio.emit('speed_report', speed_report)
+                pending = [name for name in pending if not server.send_snapshot(client_id, name)]
+                if len(pending) == 0 or time.time() > deadline:
                     break
-
-                dataobj = pickle.loads(obj_bytes)
-
-                # We lock because multiple clients might be requesting
-                # the same plot and our plotting functions have a global state.
-                with server.display_lock:
-                    fig = DataPlotter.plot_best_effort(name, dataobj)
-
-                sio.emit('plot', {'name': name, 'imgdata': encode(fig) }, room=client_id)
+                time.sleep(0.01)
+            sio.emit('speed_report', server.speed_report, room=client_id)
             done()
 
         def done():
@@ -267,6 +372,10 @@ class FlaskServer():
         else:
             done()
 
+    @sio.on('disconnect')
+    def handle_disconnect(*args):
+        server.remove_client(request.sid)
+
     @sio.on('connect')
     def handle_connect(*args):
         '''On connection, send the entire parameter dictionary
@@ -294,54 +403,37 @@ class FlaskServer():
         return render_template('specula_display.html')
 
 
-def start_server(params_dict, qin, qout, host, port):
+def start_server(params_dict, qin, qout, host, port, max_size):
     global server
-    server = FlaskServer(params_dict, qin, qout, host=host, port=port)
+    server = FlaskServer(params_dict, qin, qout, host=host, port=port, max_size=max_size)
     server.run()
 
 
-@contextmanager
-def remove_xp_np(obj):
-    '''Temporarily remove any instance of xp and np modules
-    The removed modules are put back when exiting the context manager.
- 
-    Works recursively on object lists
+def downsample(array, max_size):
     '''
-    def _remove(obj):
-        attrnames = ['xp', 'np']
-        # Recurse into lists
-        if isinstance(obj, list):
-            return list(map(_remove, obj))
-
-        # Remove xp and np and return the deleted ones
-        deleted = {}
-        for attrname in attrnames:
-            if hasattr(obj, attrname):
-                deleted[attrname] = getattr(obj, attrname)
-                delattr(obj, attrname)
-        return deleted
-
-    def _putback(args):
-        obj, deleted = args
-
-        # Recurse into lists
-        if isinstance(obj, list):
-            _ = list(map(_putback, zip(obj, deleted)))
-            return
-        for k, v in deleted.items():
-            setattr(obj, k, v)
-
-    deleted =_remove(obj)    
-    yield obj
-    _putback((obj, deleted))
-
-
-def encode(fig):
+    Reduce each axis of *array* to at most *max_size* elements,
+    averaging blocks of adjacent elements. Complex values are
+    replaced by their modulus. Returns a float32 array.
+    '''
+    if np.iscomplexobj(array):
+        array = np.abs(array)
+    array = np.asarray(array, dtype=np.float32)
+    for axis, n in enumerate(array.shape):
+        factor = -(-n // max_size)
+        if factor > 1:
+            m = n // factor
+            array = np.take(array, np.arange(m * factor), axis=axis)
+            array = array.reshape(array.shape[:axis] + (m, factor) + array.shape[axis + 1:]).mean(axis=axis + 1)
+    return array
+
+
+def encode_arrays(arrays, max_size):
     '''
-    Encode a PNG image for web display
+    Encode a list of arrays for the browser: each one becomes a dictionary
+    with its shape and its raw float32 data, sent as a binary attachment.
     '''
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png')
-    buf.seek(0)
-    imgB64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-    return imgB64
+    result = []
+    for a in arrays:
+        a = np.ascontiguousarray(downsample(a, max_size))
+        result.append({'shape': list(a.shape), 'data': a.tobytes()})
+    return result
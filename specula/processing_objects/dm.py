@@ -8,6 +8,7 @@ from specula.data_objects.layer import Layer
 from specula.data_objects.pupilstop import Pupilstop
 from specula.base_processing_obj import BaseProcessingObj
 from specula.data_objects.simul_params import SimulParams
+from specula.lib.plan import matmul_flops
 
 class DM(BaseProcessingObj):
     """Deformable Mirror processing object
@@ -170,6 +171,12 @@ class DM(BaseProcessingObj):
                 self.if_commands[self.if_commands_selector] @ self._ifunc.influence_function[self._valid_modes, :]
         self.layer.generation_time = self.current_time
 
+    def estimate_flops(self):
+        flops = matmul_flops(*self._ifunc.influence_function.shape)
+        if self.m2c is not None:
+            flops += matmul_flops(self.m2c.shape[0], self.n_valid_modes)
+        return {'matmul': flops}
+
     # Getters and Setters for the attributes
     @property
     def ifunc(self):
@@ -12,6 +12,9 @@ class IirFilter(BaseProcessingObj):
     Set *integration* to False to disable integration, regardless
     of wha the input IirFilter object contains
     '''
+
+    checkpoint_attrs = ('_ist', '_ost', 'state')
+
     def __init__(self,
                  simul_params: SimulParams,
                  iir_filter_data: IirFilterData,
@@ -16,6 +16,8 @@ from specula.connections import InputValue
 
 
 class ImCalibrator(BaseProcessingObj):
+    sink = True
+
     def __init__(self,
                  nmodes: int,         # TODO =0,
                  data_dir: str,       # TODO = "",         # Set by main simul object
@@ -4,6 +4,7 @@ from specula.connections import InputList, InputValue
 from specula.data_objects.intmat import Intmat
 from specula.data_objects.recmat import Recmat
 from specula.data_objects.slopes import Slopes
+from specula.lib.plan import matmul_flops
 
 
 class Modalrec(BaseProcessingObj):
@@ -230,6 +231,16 @@ class Modalrec(BaseProcessingObj):
         self.modes.value = output_modes[self.output_slice]
         self.modes.generation_time = self.current_time
 
+    def estimate_flops(self):
+        if self.recmat.recmat is None:
+            return None
+        flops = matmul_flops(*self.recmat.recmat.shape)
+        if self.polc:
+            flops += matmul_flops(*self.intmat.intmat.shape)
+            if self.projmat is not None:
+                flops += matmul_flops(*self.projmat.recmat.shape)
+        return {'matmul': flops}
+
     def setup(self):
         super().setup()
 
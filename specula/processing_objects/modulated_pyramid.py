@@ -9,6 +9,7 @@ from specula.data_objects.electric_field import ElectricField
 from specula.lib.make_xy import make_xy
 from specula.data_objects.intensity import Intensity
 from specula.lib.make_mask import make_mask
+from specula.lib.plan import fft_flops
 from specula.lib.toccd import toccd
 from specula.data_objects.simul_params import SimulParams
 from specula.lib.calc_geometry import calc_geometry
@@ -441,11 +442,11 @@ class ModulatedPyramid(BaseProcessingObj):
         self.fpsf *=0
 
         for i in range(0, self.mod_steps):
-            u_fp = self.xp.fft.fft2(self.u_tlt[i], axes=(-2, -1))
+            u_fp = self.fft2(self.u_tlt[i], axes=(-2, -1))
             u_fp_pyr = pyr1_fused(u_fp, self.ffv[i], self.fpsf, self.shifted_masked_exp, xp=self.xp)
 
             # 'forward' normalization is faster and we normalize correctly later in pyr1_abs2()
-            pyr_ef = self.xp.fft.ifft2(u_fp_pyr, axes=(-2, -1), norm='forward')
+            pyr_ef = self.ifft2(u_fp_pyr, axes=(-2, -1), norm='forward', overwrite_x=True)
             self.pyr_image += pyr1_abs2(pyr_ef, self.ifft_norm , self.ffv[i], xp=self.xp)
 
         self.psf_bfm.value[:] = self.xp.fft.fftshift(self.fpsf)
@@ -455,6 +456,10 @@ class ModulatedPyramid(BaseProcessingObj):
         self.psf_bfm.value *= self.factor
         self.transmission.value[:] = self.xp.sum(self.psf_tot.value) / self.xp.sum(self.psf_bfm.value)
 
+    def estimate_flops(self):
+        # Direct and inverse FFT for each modulation step
+        return {'fft': fft_flops((self.fft_totsize, self.fft_totsize), batch=2 * self.mod_steps)}
+
     def post_trigger(self):
         super().post_trigger()
 
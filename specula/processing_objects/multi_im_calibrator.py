@@ -12,6 +12,8 @@ from specula.connections import InputList
 
 
 class MultiImCalibrator(BaseProcessingObj):
+    sink = True
+
     def __init__(self,
                  nmodes: int,
                  n_inputs: int,
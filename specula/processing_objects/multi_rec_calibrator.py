@@ -7,6 +7,8 @@ from specula.connections import InputList
 
 
 class MultiRecCalibrator(BaseProcessingObj):
+    sink = True
+
     def __init__(self,
                  nmodes: int,
                  data_dir: str,         # Set by main simul object
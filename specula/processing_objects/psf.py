@@ -1,5 +1,6 @@
 
 from specula.lib.calc_psf import calc_psf, calc_psf_geometry
+from specula.lib.plan import fft_flops
 
 from specula.base_processing_obj import BaseProcessingObj
 from specula.base_value import BaseValue
@@ -34,6 +35,9 @@ class PSF(BaseProcessingObj):
     precision : int, optional
         Precision for computation (0 for double, 1 for single). Default is None (uses global setting).
     """
+
+    checkpoint_attrs = ('ref', 'count', 'first', '_sum_psf_squared')
+
     def __init__(self,
                  simul_params: SimulParams,
                  wavelengthInNm: float,    # TODO =500.0,
@@ -120,6 +124,9 @@ class PSF(BaseProcessingObj):
                                        self.out_size[1] // 2]
         print('SR at ' + self.wave_str + ':', self.sr.value, flush=True)
 
+    def estimate_flops(self):
+        return {'fft': fft_flops(self.out_size)}
+
     def post_trigger(self):
         super().post_trigger()
         if self.current_time_seconds >= self.start_time:
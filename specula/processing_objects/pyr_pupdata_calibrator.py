@@ -7,6 +7,8 @@ from specula import cpuArray
 
 
 class PyrPupdataCalibrator(BaseProcessingObj):
+    sink = True
+
     def __init__(self,
                  data_dir: str,
                  thr1: float = 0.1,
@@ -6,6 +6,9 @@ class RandomGenerator(BaseGenerator):
     """
     Generates random signals (normal or uniform distribution).
     """
+
+    checkpoint_attrs = BaseGenerator.checkpoint_attrs + ('rng',)
+
     def __init__(self,
                  distribution='NORMAL',  # 'NORMAL' or 'UNIFORM'
                  amp: float = 1.0,
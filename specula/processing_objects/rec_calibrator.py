@@ -11,6 +11,8 @@ from specula import np
 
 
 class RecCalibrator(BaseProcessingObj):
+    sink = True
+
     def __init__(self,
                  nmodes: int,         # TODO =0,
                  data_dir: str,       # TODO = "",         # Set by main simul object
@@ -4,6 +4,7 @@ from specula import fuse, show_in_profiler, RAD2ASEC
 from specula.lib.extrapolation_2d import EFInterpolator
 from specula.lib.toccd import toccd
 from specula.lib.make_mask import make_mask
+from specula.lib.plan import fft_flops
 from specula.connections import InputValue
 from specula.data_objects.electric_field import ElectricField
 from specula.data_objects.intensity import Intensity
@@ -357,7 +358,7 @@ class SH(BaseProcessingObj):
             # Insert into padded array
             self._wf3[:, :self._ovs_np_sub, :self._ovs_np_sub] = subap_cube_view * self._tltf[self.xp.newaxis, :, :]
 
-            fp4 = self.xp.fft.fft2(self._wf3, axes=(1, 2))
+            fp4 = self.fft2(self._wf3, axes=(1, 2))
             abs2(fp4, self.psf_shifted, xp=self.xp)
 
             # Full resolution kernel
@@ -366,10 +367,10 @@ class SH(BaseProcessingObj):
                 last = (i + 1) * self._lenslet.dimy
                 subap_kern_fft = self._kernelobj.kernels[first:last, :, :]
 
-                psf_fft = self.xp.fft.fft2(self.psf_shifted)
+                psf_fft = self.fft2(self.psf_shifted)
                 psf_fft *= subap_kern_fft
 
-                self._scipy_ifft2(psf_fft, overwrite_x=True, norm='forward')
+                psf_fft = self.ifft2(psf_fft, overwrite_x=True, norm='forward')
                 self.psf[:] = psf_fft.real
 
                 # Assert that our views are actually views and not temporary allocations
@@ -402,6 +403,12 @@ class SH(BaseProcessingObj):
             self._out_i.i[:] = toccd(self._psfimage, (self._ccd_side, self._ccd_side), xp=self.xp)
 
 
+    def estimate_flops(self):
+        # One batch of FFTs per subaperture row, plus the kernel convolution
+        nrows = self.subap_rows_slice.stop - self.subap_rows_slice.start
+        nfft = 3 if self._kernelobj is not None else 1
+        return {'fft': fft_flops((self._fft_size, self._fft_size), batch=self._lenslet.dimy * nrows * nfft)}
+
     def post_trigger(self):
         super().post_trigger()
 
@@ -9,6 +9,8 @@ from specula.data_objects.subap_data import SubapData
 
 
 class ShSubapCalibrator(BaseProcessingObj):
+    sink = True
+
     def __init__(self,
                  subap_on_diameter: int,
                  data_dir: str,         # Set by main simul object
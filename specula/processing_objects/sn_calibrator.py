@@ -6,6 +6,8 @@ from specula.connections import InputValue
 
 
 class SnCalibrator(BaseProcessingObj):
+    sink = True
+
     def __init__(self,
                  data_dir: str,         # Set by main simul object
                  output_tag: str = None,
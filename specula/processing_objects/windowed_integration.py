@@ -7,6 +7,9 @@ from specula.base_value import BaseValue
 
 class WindowedIntegration(BaseProcessingObj):
     '''Simple windowed integration of a signal'''
+
+    checkpoint_attrs = ('integrated_value',)
+
     def __init__(self,
                  simul_params: SimulParams,
                  n_elem: int,
@@ -14,7 +14,11 @@ def main():
     parser.add_argument('--overrides', type=str, help='YAML string with parameter overrides')
     parser.add_argument('--target', type=int, default=0, help='Target device ID for GPU execution')
     parser.add_argument('--profile', action='store_true', help='Enable python profiler and print stats at the end')
+    parser.add_argument('--profile-objects', action='store_true', help='Profile time and memory used by each object and save a summary and a Chrome trace at the end')
     parser.add_argument('--mpi', action='store_true', help='Use MPI for parallel execution')
+    parser.add_argument('--procs', type=int, default=1, help='Run objects with different target_rank in this number of local processes, connected through shared memory')
+    parser.add_argument('--resume', type=str, default=None, help='Resume the simulation from this checkpoint directory')
+    parser.add_argument('--plan', action='store_true', help='Build the simulation objects and report estimated memory usage and runtime, without running the simulation')
     parser.add_argument('--mpidbg', action='store_true', help='Activate MPI debug output')
     parser.add_argument('--stepping', action='store_true', help='Allow simulation stepping')
     parser.add_argument('--diagram', action='store_true', help='Save image block diagram')
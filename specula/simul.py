@@ -2,15 +2,19 @@ import re
 import typing
 import inspect
 import itertools
-from copy import deepcopy
+import functools
+from copy import copy, deepcopy
 from pathlib import Path
 from collections import Counter, namedtuple
-from specula import process_rank, MPI_DBG
+from specula import process_rank, process_comm, MPI_DBG
 from specula.base_processing_obj import BaseProcessingObj
 from specula.base_data_obj import BaseDataObj
 
 from specula.loop_control import LoopControl
 from specula.lib.utils import import_class, get_type_hints
+from specula.lib.fft_backend import set_fft_backend
+from specula.lib.mpi_transport import BatchedTransport, PACKET_TAG_BASE
+from specula.lib.checkpoint import Checkpoint
 from specula.calib_manager import CalibManager
 from specula.processing_objects.data_store import DataStore
 from specula.connections import InputList, InputValue
@@ -28,14 +32,17 @@ def computeTag(output_obj_name, dest_object, output_attr_name, input_attr_name):
     return rr
 
 
-import matplotlib.pyplot as plt
-
-mplcolors = plt.get_cmap("tab10").colors
+@functools.lru_cache(maxsize=None)
+def mplcolors():
+    # matplotlib is imported only when a diagram is drawn,
+    # to keep it out of the start-up time of headless simulations
+    import matplotlib.pyplot as plt
+    return plt.get_cmap("tab10").colors
 
 def int_to_rgb(val: int, maxval=16):
     val += 1
-    if val>=0 and val<len(mplcolors):
-        return mplcolors[val]
+    if val>=0 and val<len(mplcolors()):
+        return mplcolors()[val]
     scale = 255 / maxval
     r = int((val * scale * 611) % 256)
     g = int((val * scale * 551) % 256)
@@ -54,10 +61,36 @@ class Simul():
                  diagram=False,
                  diagram_title=None,
                  diagram_filename=None,
-                 diagram_colors_on=False
+                 diagram_colors_on=False,
+                 profile_objects=False,
+                 resume=None,
+                 plan=False
                  ):
         if len(param_files) < 1:
             raise ValueError('At least one Yaml parameter file must be present')
+        self.param_files = param_files
+        self.verbose = False  #TODO
+        self.reuse_cache = {}
+        self.reset(simul_idx=simul_idx, overrides=overrides)
+        self.stepping = stepping
+        self.diagram = diagram
+        self.diagram_title = diagram_title
+        self.diagram_filename = diagram_filename
+        self.diagram_colors_on = diagram_colors_on
+        self.profile_objects = profile_objects
+        self.resume = resume
+        self.plan = plan
+        print('self.diagram_colors_on', self.diagram_colors_on)
+
+    def reset(self, simul_idx=0, overrides=None):
+        '''
+        Clear all objects and connections, so that run() can be called again
+        with a different *simul_idx* and *overrides*.
+
+        Restored data objects marked as reusable (see BaseDataObj.reusable)
+        are kept in memory and shared with the next run, instead
+        of being read again from disk.
+        '''
         self.is_dataobj = {}
         self.connections = []
         self.references = []
@@ -65,21 +98,35 @@ class Simul():
         self.max_rank = 0
         self.max_target_device_idx = 0
         self.remote_objs_ranks = {}
-        self.param_files = param_files
+        self.packet_tags = {}
+        self.transport = None
+        self.pruned = []
         self.objs = {}
         self.simul_idx = simul_idx
-        self.verbose = False  #TODO
         self.mainParams = None
         if overrides is None:
             self.overrides = []
         else:
             self.overrides = overrides
-        self.stepping = stepping
-        self.diagram = diagram
-        self.diagram_title = diagram_title
-        self.diagram_filename = diagram_filename
-        self.diagram_colors_on = diagram_colors_on
-        print('self.diagram_colors_on', self.diagram_colors_on)
+
+    def restore_data_object(self, klass, filename, target_device_idx):
+        '''
+        Restore a data object from *filename*. Reusable objects restored
+        by a previous run are returned from memory as a shallow copy,
+        so that their arrays are shared, but attributes reassigned
+        by the objects using them do not leak into later runs.
+        '''
+        key = (klass, filename, target_device_idx)
+        if klass.reusable and key in self.reuse_cache:
+            print('Reusing:', filename)
+            return copy(self.reuse_cache[key])
+
+        print('Restoring:', filename)
+        obj = klass.restore(filename, target_device_idx=target_device_idx)
+        obj.printMemUsage()
+        if klass.reusable:
+            self.reuse_cache[key] = copy(obj)
+        return obj
 
     def split_output(self, output_name, get_ref=False, use_inputs=False):
         '''
@@ -293,6 +340,9 @@ class Simul():
 
         self.setSimulParams(params)
 
+        set_fft_backend(self.mainParams.get('fft_backend', 'numpy'),
+                        workers=self.mainParams.get('fft_workers', None))
+
         cm = CalibManager(self.mainParams['root_dir'])
         skip_pars = 'class inputs outputs'.split()
         if 'add_modules' in self.mainParams:
@@ -328,6 +378,10 @@ class Simul():
                     self.max_rank = par_target_rank
                 del pars['target_rank']
 
+            # Generic multi-rate parameters, see BaseProcessingObj.set_trigger_period()
+            trigger_period = pars.pop('trigger_period', None)
+            trigger_phase = pars.pop('trigger_phase', 0)
+
             # create the simulations objects for this process. Data Objects are created
             # on all ranks (processes) by default, unless a specific rank has been specified.
             self.is_dataobj[key] = issubclass(klass, BaseDataObj)
@@ -348,9 +402,7 @@ class Simul():
                     raise ValueError('Extra parameters with "tag" are not allowed')
                 filename = cm.filename(classname, pars['tag'])
                 # tags are restored into each process (multiple copies), target_rank is not checked
-                print('Restoring:', filename)
-                self.objs[key] = klass.restore(filename, target_device_idx=target_device_idx)
-                self.objs[key].printMemUsage()
+                self.objs[key] = self.restore_data_object(klass, filename, target_device_idx)
                 self.objs[key].name = key
                 self.objs[key].tag = pars['tag']
                 continue
@@ -412,9 +464,7 @@ class Simul():
                                     break
                         # data objects are restored into each process (multiple copies), target_rank is not checked
                         filename = cm.filename(parname, value)  # TODO use partype instead of parname?
-                        print('Restoring:', filename)
-                        parobj = partype.restore(filename, target_device_idx=target_device_idx)
-                        parobj.printMemUsage()
+                        parobj = self.restore_data_object(partype, filename, target_device_idx)
 
                         # Set data_tag 
                         parobj.tag = value
@@ -459,11 +509,33 @@ class Simul():
 
             self.objs[key].name = key
 
+            if trigger_period is not None:
+                if not isinstance(self.objs[key], BaseProcessingObj):
+                    raise ValueError(f'Object {key}: trigger_period can only be set for processing objects')
+                self.objs[key].set_trigger_period(trigger_period, trigger_phase)
+
             # TODO this could be more general like the getters above
             if type(self.objs[key]) is DataStore:
                 self.objs[key].setParams(params)
 
-    def connect(self, output_name, input_name, dest_object):
+    def packet_tag(self, output, dest_object):
+        '''
+        Return the MPI tag of the packet that carries *output* to the rank of
+        *dest_object*, or None if the two objects are on the same rank.
+
+        A packet groups all outputs of one object going to the same rank
+        with the same delay sign. Tags are allocated in connection order,
+        which is the same on all ranks.
+        '''
+        dest_rank = self.all_objs_ranks.get(dest_object, 0)
+        if self.all_objs_ranks.get(output.obj_name, 0) == dest_rank:
+            return None
+        key = (output.obj_name, dest_rank, output.delay < 0)
+        if key not in self.packet_tags:
+            self.packet_tags[key] = PACKET_TAG_BASE + len(self.packet_tags)
+        return self.packet_tags[key]
+
+    def connect(self, output_name, input_name, dest_object, packet_tag=None):
         '''
         Connect the output *output_name*, defined by object *output_obj_name*,
         and whose reference is *output_ref*, which might be None if the object is remote,
@@ -473,6 +545,9 @@ class Simul():
         1. local output to local input - use Python references
         2. local output to remote input - use addRemoteOutput() to send the output to the remote object
         3. remote output to local input - use set_remote_rank() to set the remote rank of the input
+
+        If the batched MPI transport is enabled, remote connections are
+        also added to the packet with tag *packet_tag*.
         '''
         output = self.split_output(output_name, get_ref=True)
         local_dest_object = dest_object in self.objs.keys()
@@ -490,6 +565,10 @@ class Simul():
             self.objs[dest_object].inputs[input_name].append(None,
                                                             remote_rank = self.remote_objs_ranks[output.obj_name],
                                                             tag=tag)
+            if self.transport is not None and packet_tag is not None:
+                item = self.objs[dest_object].inputs[input_name].input_values[-1]
+                item.packet = self.transport.recv_packet(packet_tag, self.remote_objs_ranks[output.obj_name])
+                item.packet_index = item.packet.add()
         if local:
             if MPI_DBG: print(process_rank, f'CONNECT Connecting local output {output.obj_name}.{output.output_key} to local input {dest_object}.{input_name}')
             self.objs[dest_object].inputs[input_name].append(output.ref)
@@ -498,9 +577,20 @@ class Simul():
             self.objs[output.obj_name].addRemoteOutput(output.output_key, (self.remote_objs_ranks[dest_object], 
                                                                             tag,
                                                                             output.delay))
+            if self.transport is not None and packet_tag is not None:
+                obj = self.objs[output.obj_name]
+                packet = self.transport.send_packet(packet_tag, self.remote_objs_ranks[dest_object],
+                                                    delayed=output.delay < 0)
+                if packet not in obj.send_packets:
+                    obj.send_packets.append(packet)
+                packet.add(output.output_key, tag)
                 
     def connect_objects(self, params):
-        
+
+        if process_comm is not None and not getattr(process_comm, 'shared_memory', False) \
+           and self.mainParams.get('mpi_batched', False):
+            self.transport = BatchedTransport(process_comm)
+
         for dest_object, pars in params.items():
 
             if MPI_DBG: print(process_rank, 'connect_objects for', dest_object, flush=True)
@@ -550,12 +640,15 @@ class Simul():
                     a_connection['end_label'] = input_name
                     self.connections.append(a_connection)
 
+                    # Allocated on all ranks, to keep packet tags consistent
+                    packet_tag = self.packet_tag(output, dest_object)
+
                     # Remote-to-remote: nothing to do
                     if not local_dest_object and output.ref is None:
                         continue
                     
                     try:
-                        self.connect(single_output_name, input_name, dest_object)
+                        self.connect(single_output_name, input_name, dest_object, packet_tag)
                     except ValueError:
                         print(f'Exception while connecting {single_output_name} {dest_object}.{input_name}')
                         raise
@@ -685,6 +778,65 @@ class Simul():
         
         return replay_params
 
+    def prune(self, params):
+        '''
+        Remove from *params* all objects that are not needed to compute
+        the inputs of sinks (objects whose class sets sink = True, like
+        DataStore and calibrators) or of the objects and outputs listed
+        in the "keep" main parameter. Inputs (including delayed ones)
+        and _ref/_dict_ref references are followed recursively.
+        Returns the list of removed object names.
+        '''
+        main_key = None
+        for key, pars in params.items():
+            if pars['class'] == 'SimulParams':
+                main_key = key
+        if main_key is None:
+            raise ValueError('Parameter file does not contain a SimulParams class')
+
+        additional_modules = params[main_key].get('add_modules', [])
+        roots = []
+        for key, pars in params.items():
+            klass = import_class(pars['class'], additional_modules)
+            if getattr(klass, 'sink', False):
+                roots.append(key)
+
+        for name in params[main_key].get('keep', []):
+            obj_name = self.output_owner(name)
+            if obj_name not in params:
+                raise ValueError(f'Object {obj_name} in the keep list does not exist')
+            roots.append(obj_name)
+
+        if len(roots) == 0:
+            print('Warning: no sinks or kept objects found, pruning skipped')
+            return []
+
+        needed = {main_key}
+
+        def add_key(key):
+            if key in needed:
+                return
+            needed.add(key)
+            for _, output_name in self.iterate_inputs(params[key]):
+                if isinstance(output_name, str):
+                    add_key(self.output_owner(output_name))
+            for k, v in params[key].items():
+                if k.endswith('_ref'):
+                    for objname in (v if type(v) is list else [v]):
+                        add_key(objname)
+
+        for key in roots:
+            add_key(key)
+
+        removed = [key for key in params if key not in needed]
+        for key in removed:
+            del params[key]
+        if len(removed) > 0 and params[main_key].get('display_server', False):
+            print('Warning: objects only shown by the display server are pruned, unless added to the keep list')
+        if len(removed) > 0:
+            print(f'Pruned {len(removed)} objects not needed by {", ".join(roots)}: {", ".join(removed)}')
+        return removed
+
     def iterate_inputs(self, pars):
         '''
         Iterate over all inputs of a parameter dictionary.
@@ -956,6 +1108,10 @@ class Simul():
         # Actual creation code
         self.apply_overrides(params)
 
+        self.setSimulParams(params)
+        if self.mainParams.get('prune', False):
+            self.pruned = self.prune(params)
+
         self.trigger_order, self.trigger_order_idx = self.build_trigger_order(params)
         print(f'{self.trigger_order=}')
         print(f'{self.trigger_order_idx=}')
@@ -968,6 +1124,11 @@ class Simul():
         self.build_objects(params)
         self.create_input_list_inputs(params)
         self.connect_objects(params)
+
+        if self.mainParams.get('event_driven', True):
+            for obj in self.objs.values():
+                if isinstance(obj, BaseProcessingObj):
+                    obj.enable_event_driven()
         
         if (process_rank == 0 or process_rank is None) and \
            (self.diagram or self.diagram_filename or self.diagram_title):
@@ -983,7 +1144,35 @@ class Simul():
                     obj.setReplayParams(replay_params)
 
         # Initialize housekeeping objects
-        self.loop = LoopControl(stepping=self.stepping)
+        if self.profile_objects:
+            from specula.lib.object_profiler import ObjectProfiler
+            prefix = str(Path(self.param_files[0]).with_suffix('')) + f'_profile{self.simul_idx}'
+            profiler = ObjectProfiler(output_prefix=prefix)
+        else:
+            profiler = None
+
+        checkpoint_interval = self.mainParams.get('checkpoint_interval', 0)
+        if self.resume is not None or checkpoint_interval > 0:
+            if process_comm is not None:
+                raise ValueError('Checkpoints are not supported with MPI or multiple processes')
+            for name, obj in self.objs.items():
+                if isinstance(obj, DataStore) and obj.data_format == 'npy':
+                    raise ValueError(f'Checkpoints are not supported with the npy data format of DataStore {name}')
+            checkpoint_dir = self.mainParams.get('checkpoint_dir', None)
+            if checkpoint_dir is None:
+                checkpoint_dir = str(Path(self.mainParams.get('root_dir', '.')) / 'checkpoint')
+            if self.simul_idx > 0:
+                # Each simulation of a multiple run has its own checkpoint
+                checkpoint_dir = str(Path(checkpoint_dir)) + f'_{self.simul_idx}'
+            checkpoint = Checkpoint(self.objs, checkpoint_dir, interval=checkpoint_interval,
+                                    resume=self.resume)
+        else:
+            checkpoint = None
+
+        self.loop = LoopControl(stepping=self.stepping,
+                                parallel_levels=self.mainParams.get('parallel_levels', 0),
+                                profiler=profiler,
+                                checkpoint=checkpoint)
 
         # Build loop
         for name, idx in zip(self.trigger_order, self.trigger_order_idx):
@@ -995,6 +1184,19 @@ class Simul():
         self.loop.max_global_order = max(self.trigger_order_idx)
         print('self.loop.max_global_order', self.loop.max_global_order, flush=True)
 
+        if self.plan:
+            # Report the estimated cost without running the simulation
+            from specula.lib.plan import SimulationPlan
+            dt = self.loop.seconds_to_t(self.mainParams['time_step'])
+            niters = int(self.loop.seconds_to_t(self.mainParams['total_time']) / dt)
+            trigger_order = [name for name in self.trigger_order
+                             if isinstance(self.objs.get(name), BaseProcessingObj)]
+            self.simulation_plan = SimulationPlan(self.objs, trigger_order, niters, dt)
+            self.simulation_plan.setup()
+            self.simulation_plan.compute()
+            print(self.simulation_plan.report(), flush=True)
+            return
+
         # Default display web server
         if 'display_server' in self.mainParams and self.mainParams['display_server'] and process_rank in [0, None]:
             from specula.processing_objects.display_server import DisplayServer
@@ -1006,6 +1208,9 @@ class Simul():
         # Run simulation loop
         self.loop.run(run_time=self.mainParams['total_time'], dt=self.mainParams['time_step'], speed_report=True)
 
+        if self.transport is not None:
+            self.transport.close()
+
         print(process_rank, 'Simulation finished', flush=True)
 #        if data_store.has_key('sr'):
 #            print(f"Mean Strehl Ratio (@{params['psf']['wavelengthInNm']}nm) : {store.mean('sr', init=min([50, 0.1 * self.mainParams['total_time'] / self.mainParams['time_step']])) * 100.}")
@@ -0,0 +1,71 @@
+import sys
+import time
+import tempfile
+
+import numpy as np
+from scipy import ndimage
+
+import specula
+specula.init(-1, precision=1)
+
+from specula.data_objects.simul_params import SimulParams
+from specula.processing_objects.atmo_evolution import AtmoEvolution
+
+
+def make_atmo(pixel_pupil, directions, data_dir):
+    simul_params = SimulParams(pixel_pupil=pixel_pupil, pixel_pitch=0.05, time_step=1)
+    return AtmoEvolution(simul_params,
+                         L0=23,
+                         data_dir=data_dir,
+                         heights=[0.0] * len(directions),
+                         Cn2=[1 / len(directions)] * len(directions),
+                         target_device_idx=-1)
+
+
+def time_update(atmo, directions, niter):
+    '''Time of one _update_layer_list() call, as at each AtmoEvolution step'''
+    wdf, wdi = np.modf(np.array(directions) / 90.0)
+    nlayers = len(directions)
+    last_position = np.zeros(nlayers, dtype=atmo.dtype)
+    t0 = time.time()
+    for _ in range(niter):
+        atmo._update_layer_list(wind_speed=np.full(nlayers, 10.0),
+                                delta_position=np.full(nlayers, 0.37),
+                                extra_delta_time=np.zeros(nlayers),
+                                last_position=last_position,
+                                layer_list=atmo.layer_list,
+                                wdi=wdi, wdf_full=wdf * 90)
+    return (time.time() - t0) / niter
+
+
+def time_shift_and_rotate(atmo, directions, niter):
+    '''Time of the previous implementation: shift, numpy.rot90() and scipy.ndimage.rotate() per layer'''
+    wdf, wdi = np.modf(np.array(directions) / 90.0)
+    t0 = time.time()
+    for _ in range(niter):
+        for ii, p in enumerate(atmo.phasescreens):
+            n = int(atmo.pixel_layer[ii])
+            layer_phase = 0.63 * p[0:n, 10:10 + n] + 0.37 * p[0:n, 11:11 + n]
+            layer_phase -= atmo.phasescreens_mean[ii]
+            layer_phase = np.rot90(layer_phase, wdi[ii])
+            if wdf[ii] != 0:
+                layer_phase = ndimage.rotate(layer_phase, wdf[ii] * 90, reshape=False, order=1)
+            atmo.layer_list[ii].phaseInNm[:] = layer_phase * atmo.phasescreens_coeff[ii]
+    return (time.time() - t0) / niter
+
+
+if __name__ == '__main__':
+    sizes = [int(x) for x in sys.argv[1:]] or [160, 640]
+    cases = {'aligned': [0.0, 90.0, 180.0, 270.0],
+             'rotated': [10.0, 123.4, 213.0, 300.0]}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for pixel_pupil in sizes:
+            for name, directions in cases.items():
+                atmo = make_atmo(pixel_pupil, directions, tmpdir)
+                # The first call builds the extraction plan
+                t_plan = time_update(atmo, directions, 1)
+                t_new = time_update(atmo, directions, 20)
+                t_old = time_shift_and_rotate(atmo, directions, 20)
+                print(f'pupil {pixel_pupil:4d}, {len(directions)} {name} layers:'
+                      f' {t_old * 1e3:8.2f} ms shift and rotate, {t_new * 1e3:8.2f} ms extraction plan'
+                      f' ({t_plan * 1e3:.0f} ms first step)')
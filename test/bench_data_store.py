@@ -0,0 +1,76 @@
+import os
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+import specula
+specula.init(-1, precision=1)
+
+from specula.base_value import BaseValue
+from specula.data_objects.pixels import Pixels
+from specula.processing_objects.data_store import DataStore
+from specula.processing_objects.data_source import DataSource
+
+
+def make_tn(nframes, rng):
+    '''
+    Representative SCAO telemetry: detector frames with photon and
+    readout noise converted to ADU, slopes and modal residuals
+    '''
+    frames = []
+    for _ in range(nframes):
+        pixels = Pixels(240, 240, bits=16, target_device_idx=-1)
+        pixels.set_value(np.round(rng.poisson(50, size=(240, 240)) + rng.normal(100, 3, size=(240, 240))))
+        frames.append({'pixels': pixels,
+                       'slopes': BaseValue(value=rng.normal(size=4000) * 0.1, target_device_idx=-1),
+                       'modes': BaseValue(value=rng.normal(size=500) * 20, target_device_idx=-1)})
+    return frames
+
+
+def bench_one(frames, tmpdir, **kwargs):
+    ds = DataStore(store_dir=tmpdir, create_tn=False, **kwargs)
+    for i, objs in enumerate(frames):
+        ds.local_inputs = objs
+        ds.current_time = i
+        for obj in objs.values():
+            obj.generation_time = i
+        ds.trigger_code()
+    ds.tn_dir = tmpdir
+
+    t0 = time.time()
+    ds.save_fits()
+    write_time = time.time() - t0
+
+    sizes = {k: os.path.getsize(os.path.join(tmpdir, k + '.fits')) for k in frames[0]}
+
+    t0 = time.time()
+    source = DataSource(outputs=list(frames[0].keys()), store_dir=tmpdir)
+    for i in range(len(frames)):
+        for k in frames[0]:
+            source.get_frame(k, i)
+    read_time = time.time() - t0
+    return write_time, read_time, sizes
+
+
+if __name__ == '__main__':
+    nframes = 200
+    frames = make_tn(nframes, np.random.default_rng(0))
+    cases = [('float32, uncompressed', dict(native_dtype=False)),
+             ('native, uncompressed', dict()),
+             ('native, GZIP_2', dict(compression='GZIP_2')),
+             ('native, RICE_1', dict(compression='RICE_1')),
+             ('native, RICE_1, max_error=1e-3', dict(compression='RICE_1', max_error=1e-3))]
+
+    print(f'{nframes} frames of 240x240 pixels, 4000 slopes and 500 modes')
+    for name, kwargs in cases:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            write_time, read_time, sizes = bench_one(frames, tmpdir, **kwargs)
+        finally:
+            shutil.rmtree(tmpdir)
+        total = sum(sizes.values())
+        sizes_str = '  '.join(f'{k} {v / 1e6:7.1f} MB' for k, v in sizes.items())
+        print(f'{name:32s} write {write_time:6.2f} s  read {read_time:6.2f} s'
+              f'  total {total / 1e6:6.1f} MB  ({sizes_str})')
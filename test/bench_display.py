@@ -0,0 +1,90 @@
+import os
+import time
+
+import numpy as np
+import matplotlib
+
+import specula
+specula.init(-1, precision=1)
+
+from specula.base_value import BaseValue
+from specula.data_objects.pixels import Pixels
+from specula.data_objects.electric_field import ElectricField
+from specula.display.pixels_display import PixelsDisplay
+from specula.display.phase_display import PhaseDisplay
+from specula.display.modes_display import ModesDisplay
+from specula.display.plot_display import PlotDisplay
+
+
+def make_inputs(rng):
+    '''Data objects of a small SCAO loop: detector frame, pupil phase, modes and SR'''
+    pixels = Pixels(160, 160, target_device_idx=-1)
+    ef = ElectricField(160, 160, 0.05, S0=1, target_device_idx=-1)
+    modes = BaseValue(value=np.zeros(500, dtype=np.float32), target_device_idx=-1)
+    sr = BaseValue(value=np.zeros(1, dtype=np.float32), target_device_idx=-1)
+    return pixels, ef, modes, sr
+
+
+def make_displays(inputs, **kwargs):
+    pixels, ef, modes, sr = inputs
+    displays = [PixelsDisplay(**kwargs), PhaseDisplay(**kwargs), ModesDisplay(**kwargs), PlotDisplay(**kwargs)]
+    for display, key, obj in zip(displays, ['pixels', 'phase', 'modes', 'value'], inputs):
+        display.inputs[key].set(obj)
+        display.setup()
+    return displays
+
+
+def run_loop(niter, inputs, displays, rng):
+    '''
+    Emulate a simulation step (PSF FFT, reconstruction matrix product and new input values)
+    and trigger the displays. Return the loop rate in Hz and the fraction
+    of the loop time spent in the displays' trigger_code().
+    '''
+    pixels, ef, modes, sr = inputs
+    rec = rng.normal(size=(500, 3200)).astype(np.float32)
+    display_time = 0
+    t0 = time.time()
+    for i in range(1, niter + 1):
+        t = i * 1000000
+        psf = np.abs(np.fft.fft2(ef.ef_at_lambda(500.0), s=(320, 320))) ** 2
+        slopes = rng.normal(size=3200).astype(np.float32)
+        pixels.set_value(rng.poisson(100, size=(160, 160)))
+        ef.phaseInNm[:] = rng.normal(size=(160, 160))
+        modes.value[:] = rec @ slopes
+        sr.value[:] = psf.max() / psf.sum()
+        for obj in inputs:
+            obj.generation_time = t
+        t1 = time.time()
+        for display in displays:
+            display.check_ready(t)
+            display.trigger_code()
+        display_time += time.time() - t1
+    elapsed = time.time() - t0
+    return niter / elapsed, display_time / elapsed
+
+
+if __name__ == '__main__':
+    backend = matplotlib.get_backend()
+    niter = 300
+    rng = np.random.default_rng(0)
+    inputs = make_inputs(rng)
+
+    def report(name, rate, display_fraction):
+        print(f'{name:40s} {rate:8.1f} Hz   {display_fraction * 100:5.1f}% of the loop time in displays')
+
+    print(f'{niter} iterations, matplotlib backend {backend}, {os.cpu_count()} CPUs')
+    report('no displays', *run_loop(niter, inputs, [], rng))
+
+    displays = make_displays(inputs)
+    report('4 displays, inline', *run_loop(niter, inputs, displays, rng))
+    for display in displays:
+        matplotlib.pyplot.close(display.fig)
+
+    for max_fps in [10, 30]:
+        displays = make_displays(inputs, render_process=True, max_fps=max_fps)
+        # Start the render processes outside of the timed loop
+        run_loop(1, inputs, displays, rng)
+        time.sleep(5)
+        report(f'4 displays, render_process, max_fps={max_fps}', *run_loop(niter, inputs, displays, rng))
+        for display in displays:
+            display.finalize()
@@ -0,0 +1,67 @@
+import os
+import time
+import numpy as np
+from collections import defaultdict
+
+from specula.lib.fft_backend import set_fft_backend, get_fft_backend
+
+# FFT shapes and axes used in the hot paths:
+# - SH: one row of padded subapertures per call, e.g. 40x40 or 80x80
+#   subapertures with 24 or 48 pixel padded FFTs
+# - ModulatedPyramid: one padded pupil per modulation step
+# - Coronograph / calc_psf: single large padded pupil
+cases = {
+    'SH 40 x 24 x 24': ((40, 24, 24), (1, 2)),
+    'SH 80 x 48 x 48': ((80, 48, 48), (1, 2)),
+    'Pyramid 480 x 480': ((480, 480), (-2, -1)),
+    'Pyramid 1024 x 1024': ((1024, 1024), (-2, -1)),
+    'PSF 2048 x 2048': ((2048, 2048), (-2, -1)),
+}
+
+
+def bench_one(shape, axes, overwrite_x, niters=20):
+    fft = get_fft_backend(np)
+    rng = np.random.default_rng(0)
+    v = (rng.normal(size=shape) + 1j * rng.normal(size=shape)).astype(np.complex64)
+    buf = v.copy()
+
+    # Warmup (and plan creation for pyfftw)
+    _ = fft.fft2(v, axes=axes)
+
+    t0 = time.time()
+    for _ in range(niters):
+        if overwrite_x:
+            buf[:] = v
+            _ = fft.fft2(buf, axes=axes, overwrite_x=True)
+        else:
+            _ = fft.fft2(v, axes=axes)
+    return (time.time() - t0) / niters
+
+
+if __name__ == '__main__':
+    ncpu = os.cpu_count()
+    configs = [('numpy', None), ('scipy', 1), ('scipy', ncpu)]
+    try:
+        import pyfftw
+        configs += [('pyfftw', 1), ('pyfftw', ncpu)]
+    except ImportError:
+        print('pyfftw not installed, skipping the pyfftw backend')
+
+    results = defaultdict(dict)
+    for backend, workers in configs:
+        set_fft_backend(backend, workers=workers)
+        for case, (shape, axes) in cases.items():
+            for overwrite_x in [False, True]:
+                t = bench_one(shape, axes, overwrite_x)
+                results[case][(backend, workers, overwrite_x)] = t
+                print(f'{case:22s} {backend:8s} workers={str(workers):5s} overwrite_x={str(overwrite_x):5s}'
+                      f'  {t*1000:8.3f} ms')
+
+    print()
+    for case in cases:
+        ref = results[case][('numpy', None, False)]
+        best = min(results[case], key=results[case].get)
+        print(f'{case:22s} best: {best[0]} workers={best[1]} overwrite_x={best[2]}'
+              f'  speedup {ref / results[case][best]:.2f}x')
+
+    set_fft_backend('numpy')
@@ -0,0 +1,38 @@
+import os
+import sys
+import json
+import subprocess
+
+import numpy as np
+
+script = '''
+import json, time
+t0 = time.perf_counter()
+import specula
+t1 = time.perf_counter()
+specula.init(-1)
+import specula.simul
+from specula.processing_objects.atmo_propagation import AtmoPropagation
+from specula.processing_objects.atmo_evolution import AtmoEvolution
+from specula.processing_objects.data_store import DataStore
+t2 = time.perf_counter()
+print(json.dumps({'specula': t1 - t0, 'simul': t2 - t1}))
+'''
+
+
+def time_imports():
+    '''Import times of specula and of the simulation machinery in a fresh interpreter'''
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', script], cwd=root_dir,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    niter = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    results = [time_imports() for _ in range(niter)]
+    t_specula = np.median([r['specula'] for r in results])
+    t_simul = np.median([r['simul'] for r in results])
+    print(f'import specula: {t_specula * 1e3:.1f} ms,'
+          f' import specula.simul and common objects: {t_simul * 1e3:.1f} ms'
+          f' (median of {niter} interpreters)')
@@ -0,0 +1,43 @@
+import sys
+import time
+import tempfile
+
+import specula
+specula.init(-1, precision=1)
+
+from specula.data_objects.infinite_phase_screen import InfinitePhaseScreen
+
+
+def time_setup(mx_size, cache_dir=None):
+    t0 = time.time()
+    ips = InfinitePhaseScreen(mx_size, 0.05, 0.1, 25.0, random_seed=1, cache_dir=cache_dir)
+    return ips, time.time() - t0
+
+
+def time_extrusion(ips, n_lines, niter, batched):
+    '''Time to add *n_lines* new rows and one previewed column, as at each AtmoInfiniteEvolution step'''
+    t0 = time.time()
+    for _ in range(niter):
+        if batched:
+            ips.add_lines(0, 1, n_lines)
+        else:
+            for _ in range(n_lines):
+                ips.add_line(0, 1)
+        ips.preview([(1, 1)])
+    return (time.time() - t0) / niter
+
+
+if __name__ == '__main__':
+    sizes = [int(x) for x in sys.argv[1:]] or [160, 480]
+    for mx_size in sizes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ips, t_nocache = time_setup(mx_size)
+            _, t_first = time_setup(mx_size, tmpdir)
+            _, t_cached = time_setup(mx_size, tmpdir)
+        print(f'size {mx_size} (buffer {ips.stencil_size}): set-up {t_nocache:.2f} s,'
+              f' {t_first:.2f} s saving the A/B cache, {t_cached:.2f} s from the cache')
+        for n_lines in [1, 4, 16]:
+            t_single = time_extrusion(ips, n_lines, 20, batched=False)
+            t_batched = time_extrusion(ips, n_lines, 20, batched=True)
+            print(f'    {n_lines:3d} lines per step: {t_single * 1e3:8.2f} ms with add_line(),'
+                  f' {t_batched * 1e3:8.2f} ms with add_lines()')
@@ -0,0 +1,62 @@
+import time
+import numpy as np
+from collections import defaultdict
+
+from specula.lib.interp2d import Interp2D
+from specula.lib.make_xy import make_xy
+
+
+def make_interpolators(case, engine):
+    '''
+    Build an interpolator with the geometry used by:
+    - EFInterpolator: pupil oversampling with a small rotation
+    - AtmoPropagation: off-axis pupil footprint on a larger layer
+    - ModulatedPyramid: sub-pixel shift of the pupil image
+    '''
+    if case == 'EFInterpolator 240->480':
+        return Interp2D((240, 240), (480, 480), rotInDeg=3.0, rowShiftInPixels=0.3,
+                        colShiftInPixels=-0.2, dtype=np.float32, engine=engine)
+    elif case == 'AtmoPropagation 960->480':
+        xx, yy = make_xy(480, 479.84 / 2, xp=np)
+        return Interp2D((960, 960), (480, 480), xx=xx + 480.3, yy=yy + 479.1,
+                        rotInDeg=30, dtype=np.float32, engine=engine)
+    elif case == 'ModulatedPyramid 1024->1024':
+        return Interp2D((1024, 1024), (1024, 1024), rowShiftInPixels=0.4,
+                        colShiftInPixels=0.7, dtype=np.float32, engine=engine)
+    raise ValueError(case)
+
+
+def bench_one(case, engine, niters=10, nstack=1):
+    t0 = time.time()
+    interp = make_interpolators(case, engine)
+    setup_time = time.time() - t0
+
+    values = np.random.default_rng(0).normal(size=(nstack,) + interp.input_shape).astype(np.float32)
+    out = np.empty((nstack,) + interp.output_shape, dtype=np.float32)
+
+    # Warmup
+    interp.interpolate_stack(values, out=out)
+
+    t0 = time.time()
+    for _ in range(niters):
+        interp.interpolate_stack(values, out=out)
+    return setup_time, (time.time() - t0) / niters
+
+
+if __name__ == '__main__':
+    cases = ['EFInterpolator 240->480', 'AtmoPropagation 960->480', 'ModulatedPyramid 1024->1024']
+    results = defaultdict(dict)
+
+    for case in cases:
+        for engine in Interp2D.engines:
+            for nstack in [1, 2]:
+                setup_time, call_time = bench_one(case, engine, nstack=nstack)
+                results[case][(engine, nstack)] = call_time
+                print(f'{case:30s} {engine:14s} stack={nstack}  setup {setup_time*1000:8.2f} ms'
+                      f'  call {call_time*1000:8.2f} ms')
+
+    print()
+    for case in cases:
+        for nstack in [1, 2]:
+            speedup = results[case][('regular_grid', nstack)] / results[case][('sparse', nstack)]
+            print(f'{case:30s} stack={nstack}  sparse speedup: {speedup:.1f}x')
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+import specula
+specula.init(-1, precision=1)
+
+from specula.lib.calc_phasescreen import calc_phasescreen, calc_phasescreen_rfft
+
+
+def run_case(method, dimension, precision):
+    '''Generate one screen and return the elapsed time and the peak RSS in MB'''
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.time()
+    if method == 'fft':
+        calc_phasescreen(23.0, dimension, 0.05, np, precision, seed=1)
+    elif method == 'rfft':
+        calc_phasescreen_rfft(23.0, dimension, 0.05, precision, seed=1)
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dtype = np.float32 if precision == 1 else np.float64
+            out = np.memmap(os.path.join(tmpdir, 'ps.raw'), dtype=dtype, mode='w+', shape=(dimension, dimension))
+            calc_phasescreen_rfft(23.0, dimension, 0.05, precision, seed=1, out=out)
+            out.flush()
+            del out
+    elapsed = time.time() - t0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, (rss - rss0) / 1024
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4:
+        # Single case, run in a separate process to measure its peak memory
+        elapsed, peak = run_case(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
+        print(elapsed, peak)
+        sys.exit(0)
+
+    print(f'{os.cpu_count()} CPUs')
+    for dimension in [2048, 4096, 8192]:
+        for precision in [1, 0]:
+            for method in ['fft', 'rfft', 'rfft+memmap']:
+                if method == 'fft' and dimension * dimension * (8 - 4 * precision) * 12 > 4e9:
+                    print(f'{dimension:6d} {"single" if precision else "double"} {method:12s} skipped, not enough memory')
+                    continue
+                result = subprocess.run([sys.executable, __file__, method, str(dimension), str(precision)],
+                                        capture_output=True, text=True, check=True)
+                elapsed, peak = map(float, result.stdout.split()[-2:])
+                print(f'{dimension:6d} {"single" if precision else "double"} {method:12s}'
+                      f' {elapsed:7.2f} s  peak memory {peak:8.0f} MB')
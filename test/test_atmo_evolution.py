@@ -1,5 +1,7 @@
 
 import os
+import shutil
+import tempfile
 import specula
 specula.init(0)  # Default target device
 
@@ -26,8 +28,10 @@ class TestAtmoEvolution(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         """Clean up after all tests by removing generated files"""
-        files = ['ps_seed1_dim8192_pixpit0.050_L023.0000_double.fits',
-                 'ps_seed1_dim8192_pixpit0.050_L023.0000_single.fits']
+        files = ['ps_seed1_dim8192_pixpit0.050_L023.0000_double.raw',
+                 'ps_seed1_dim8192_pixpit0.050_L023.0000_double.json',
+                 'ps_seed1_dim8192_pixpit0.050_L023.0000_single.raw',
+                 'ps_seed1_dim8192_pixpit0.050_L023.0000_single.json']
         for fname in files:
             fpath = os.path.join(cls.data_dir, fname)
             if os.path.exists(fpath):
@@ -428,3 +432,52 @@ class TestAtmoEvolution(unittest.TestCase):
                              target_device_idx=target_device_idx)
         expected = cpuArray(heights) * airmass
         np.testing.assert_allclose(atmo.pupil_distances, expected, rtol=1e-8)
+
+    @cpu_and_gpu
+    def test_layer_extraction_matches_shift_and_rotate(self, target_device_idx, xp):
+        """
+        Layers are the screens shifted with linear interpolation,
+        rotated by numpy.rot90() and then by scipy.ndimage.rotate()
+        """
+        from scipy import ndimage
+
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        simul_params = SimulParams(pixel_pupil=40, pixel_pitch=0.05, time_step=1)
+        directions = [0.0, 90.0, 200.0, 33.3, -10.0, 100.0, 290.0, -100.0]
+        atmo = AtmoEvolution(simul_params,
+                             L0=23,
+                             data_dir=data_dir,
+                             heights=[0.0] * len(directions),
+                             Cn2=[1 / len(directions)] * len(directions),
+                             pixel_phasescreens=256,
+                             target_device_idx=target_device_idx)
+        atmo.scale_coeff = 0.7
+
+        wind_direction = np.array(directions)
+        wdf, wdi = np.modf(wind_direction / 90.0)
+        last_position = np.zeros(len(directions), dtype=atmo.dtype)
+        atmo._update_layer_list(wind_speed=np.full(len(directions), 10.0),
+                                delta_position=np.array([0.0, 3.25, 7.5, 11.8, 20.4, 1.5, 2.6, 30.1]),
+                                extra_delta_time=np.zeros(len(directions)),
+                                last_position=last_position,
+                                layer_list=atmo.layer_list,
+                                wdi=wdi, wdf_full=wdf * 90)
+
+        n = int(atmo.pixel_layer[0])
+        for ii, layer in enumerate(atmo.layer_list):
+            p = cpuArray(atmo.phasescreens[ii])
+            pos = int(last_position[ii])
+            rem = last_position[ii] - pos
+            expected = (1 - rem) * p[:n, pos:pos + n] + rem * p[:n, pos + 1:pos + n + 1]
+            expected = (expected - cpuArray(atmo.phasescreens_mean[ii])) \
+                * atmo.phasescreens_coeff[ii] * atmo.scale_coeff
+            expected = np.rot90(expected, wdi[ii])
+            phase = cpuArray(layer.phaseInNm)
+            if wdf[ii] == 0:
+                np.testing.assert_allclose(phase, expected, rtol=1e-4, atol=1e-3)
+            else:
+                expected = ndimage.rotate(expected, wdf[ii] * 90, reshape=False, order=1)
+                np.testing.assert_allclose(phase, expected, rtol=1e-4, atol=1e-3)
+                # Corners outside of the rotated layer are zero
+                self.assertEqual(phase[0, 0], 0)
@@ -23,8 +23,10 @@ class TestAtmoEvolutionUpDown(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         """Clean up after all tests by removing generated files"""
-        files = ['ps_seed1_dim8192_pixpit0.050_L023.0000_double.fits',
-                 'ps_seed1_dim8192_pixpit0.050_L023.0000_single.fits']
+        files = ['ps_seed1_dim8192_pixpit0.050_L023.0000_double.raw',
+                 'ps_seed1_dim8192_pixpit0.050_L023.0000_double.json',
+                 'ps_seed1_dim8192_pixpit0.050_L023.0000_single.raw',
+                 'ps_seed1_dim8192_pixpit0.050_L023.0000_single.json']
         for fname in files:
             fpath = os.path.join(cls.data_dir, fname)
             if os.path.exists(fpath):
@@ -2,6 +2,8 @@ import specula
 specula.init(0)  # Default target device
 
 import os
+import shutil
+import tempfile
 import unittest
 
 from specula import np
@@ -11,6 +13,7 @@ from specula.data_objects.source import Source
 from specula.data_objects.pupilstop import Pupilstop
 from specula.data_objects.layer import Layer
 from specula.processing_objects.atmo_propagation import AtmoPropagation
+from specula.lib.interp_cache import InterpCache
 from specula.data_objects.simul_params import SimulParams
 
 from test.specula_testlib import cpu_and_gpu
@@ -359,4 +362,86 @@ class TestAtmoPropagation(unittest.TestCase):
         diff = output_amplitude - expected_amplitude
 
         max_diff = np.max(np.abs(diff))
-        assert max_diff < 0.02, f"Max difference after rotation is {max_diff}, should be < 0.02"
\ No newline at end of file
+        assert max_diff < 0.02, f"Max difference after rotation is {max_diff}, should be < 0.02"
+    @cpu_and_gpu
+    def test_batched_sources_match_per_source(self, target_device_idx, xp):
+        """Test that batched multi-source propagation gives the same result as the per-source path"""
+        pixel_pupil = 60
+        pixel_pitch = 0.1
+        simul_params = SimulParams(pixel_pupil, pixel_pitch)
+        rng = np.random.default_rng(1)
+
+        def make_layers():
+            layers = []
+            for height, dim in [(0.0, 60), (5000.0, 100), (12000.0, 120)]:
+                layer = Layer(dimx=dim, dimy=dim, pixel_pitch=pixel_pitch, height=height,
+                              target_device_idx=target_device_idx)
+                layer.A = xp.asarray(rng.uniform(0.5, 1.0, (dim, dim)))
+                layer.phaseInNm = xp.asarray(rng.normal(0, 100, (dim, dim)))
+                layer.generation_time = 1
+                layers.append(layer)
+            return layers
+
+        source_dict = {'on_axis': Source(polar_coordinates=[0.0, 0.0], magnitude=8, wavelengthInNm=750),
+                       'off1': Source(polar_coordinates=[10.0, 0.0], magnitude=8, wavelengthInNm=750),
+                       'off2': Source(polar_coordinates=[20.0, 120.0], magnitude=8, wavelengthInNm=750),
+                       'lgs': Source(polar_coordinates=[15.0, 45.0], magnitude=8, wavelengthInNm=589, height=90000)}
+
+        layers = make_layers()
+        outputs = {}
+        for batch_sources in [True, False]:
+            prop = AtmoPropagation(simul_params, source_dict=source_dict, batch_sources=batch_sources,
+                                   target_device_idx=target_device_idx)
+            prop.inputs['atmo_layer_list'].set(layers[1:])
+            prop.inputs['common_layer_list'].set(layers[:1])
+            prop.setup()
+            prop.check_ready(1)
+            prop.trigger()
+            prop.post_trigger()
+            outputs[batch_sources] = {name: cpuArray(prop.outputs['out_'+name+'_ef'].field).copy()
+                                      for name in source_dict}
+
+        for name in source_dict:
+            np.testing.assert_array_equal(outputs[True][name], outputs[False][name])
+
+    @cpu_and_gpu
+    def test_interpolator_cache(self, target_device_idx, xp):
+        """Test that cached interpolators are saved to disk and give the same results when reloaded"""
+        pixel_pupil = 40
+        pixel_pitch = 0.1
+        simul_params = SimulParams(pixel_pupil, pixel_pitch)
+        rng = np.random.default_rng(2)
+        layer = Layer(dimx=80, dimy=80, pixel_pitch=pixel_pitch, height=8000.0, rotInDeg=30.0,
+                      target_device_idx=target_device_idx)
+        layer.phaseInNm = xp.asarray(rng.normal(0, 100, (80, 80)))
+        layer.generation_time = 1
+        pupil_layer = Layer(dimx=pixel_pupil, dimy=pixel_pupil, pixel_pitch=pixel_pitch, height=0.0,
+                            target_device_idx=target_device_idx)
+        pupil_layer.generation_time = 1
+
+        source_dict = {'off1': Source(polar_coordinates=[10.0, 30.0], magnitude=8, wavelengthInNm=750),
+                       'off2': Source(polar_coordinates=[20.0, 200.0], magnitude=8, wavelengthInNm=750)}
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            results = []
+            for cache_interpolators in [False, True, True]:
+                # Force reload from disk
+                InterpCache._memory.clear()
+                prop = AtmoPropagation(simul_params, source_dict=source_dict,
+                                       cache_interpolators=cache_interpolators, data_dir=cache_dir,
+                                       target_device_idx=target_device_idx)
+                prop.inputs['atmo_layer_list'].set([layer])
+                prop.inputs['common_layer_list'].set([pupil_layer])
+                prop.setup()
+                prop.check_ready(1)
+                prop.trigger()
+                prop.post_trigger()
+                results.append(cpuArray(prop.outputs['out_off1_ef'].field).copy())
+                if cache_interpolators:
+                    assert len([f for f in os.listdir(cache_dir) if f.endswith('.npz')]) == 2
+
+            np.testing.assert_array_equal(results[0], results[1])
+            np.testing.assert_array_equal(results[1], results[2])
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
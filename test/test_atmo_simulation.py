@@ -34,12 +34,16 @@ class TestAtmoSimulation(unittest.TestCase):
 
         # Clean up copied calibration files
         # this can be "single" or "double"
-        files = ['ps_seed1_dim8192_pixpit0.100_L010.0000_single.fits',
-                 'ps_seed1_dim8192_pixpit0.100_L010.0000_double.fits']
-        if os.path.exists(os.path.join(cls.calibdir, 'phasescreens', files[0])):
-            os.remove(os.path.join(cls.calibdir, 'phasescreens', files[0]))
-        elif os.path.exists(os.path.join(cls.calibdir, 'phasescreens', files[1])):
-            os.remove(os.path.join(cls.calibdir, 'phasescreens', files[1]))
+        files = ['ps_seed1_dim8192_pixpit0.100_L010.0000_single.raw',
+                 'ps_seed1_dim8192_pixpit0.100_L010.0000_single.json',
+                 'ps_seed1_dim8192_pixpit0.100_L010.0000_double.raw',
+                 'ps_seed1_dim8192_pixpit0.100_L010.0000_double.json']
+        for fname in files:
+            if os.path.exists(os.path.join(cls.calibdir, 'phasescreens', fname)):
+                os.remove(os.path.join(cls.calibdir, 'phasescreens', fname))
+        # Extrusion matrices cached by AtmoInfiniteEvolution
+        for fpath in glob.glob(os.path.join(cls.calibdir, 'phasescreens', 'infinite_ps_AB_*.fits')):
+            os.remove(fpath)
         
         # Remove test/data directory with timestamp
         output_dirs = glob.glob(os.path.join(cls.datadir, '2*'))
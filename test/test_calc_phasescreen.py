@@ -0,0 +1,130 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import specula
+specula.init(0)  # Default target device
+
+from specula import np
+from astropy.io import fits
+
+from specula.lib.calc_phasescreen import calc_phasescreen_rfft
+from specula.lib.phasescreen_manager import phasescreens_manager
+
+
+class TestCalcPhasescreenRfft(unittest.TestCase):
+
+    def test_independent_of_blocks_and_workers(self):
+        """The screen only depends on the seed"""
+        ref = calc_phasescreen_rfft(23.0, 128, 0.05, precision=1, seed=3, block_size=1024, workers=1)
+        for block_size, workers in [(1, 1), (7, 3), (64, -1)]:
+            screen = calc_phasescreen_rfft(23.0, 128, 0.05, precision=1, seed=3,
+                                           block_size=block_size, workers=workers)
+            np.testing.assert_array_equal(screen, ref)
+
+        other = calc_phasescreen_rfft(23.0, 128, 0.05, precision=1, seed=4)
+        self.assertFalse(np.allclose(other, ref))
+        self.assertEqual(ref.dtype, np.float32)
+        self.assertEqual(ref.shape, (128, 128))
+
+    def test_structure_function(self):
+        """Structure function along both axes, compared with the one of the discrete spectrum"""
+        dim, pitch, L0 = 128, 0.05, 23.0
+        m_dim = dim * pitch
+        norm = np.sqrt(0.033/2./m_dim**2) * (2*np.pi)**(2./3.) * np.sqrt(0.06) * (1/pitch)**(5./6.)
+        k = np.fft.fftfreq(dim, 1.0 / dim)
+        ky, kx = np.meshgrid(k, k, indexing='ij')
+        power = 2 * norm**2 * ((kx**2 + ky**2) / m_dim**2 + 1. / L0**2)**(-11./6.)
+        power[dim // 2, :] = 0
+        power[:, dim // 2] = 0
+
+        lags = [1, 4, 16]
+        dx = np.zeros(len(lags))
+        dy = np.zeros(len(lags))
+        nseeds = 30
+        for seed in range(nseeds):
+            screen = calc_phasescreen_rfft(L0, dim, pitch, precision=0, seed=seed)
+            for i, lag in enumerate(lags):
+                dx[i] += np.mean((screen[:, lag:] - screen[:, :-lag])**2) / nseeds
+                dy[i] += np.mean((screen[lag:] - screen[:-lag])**2) / nseeds
+
+        for i, lag in enumerate(lags):
+            expected = np.sum(power * 2 * (1 - np.cos(2 * np.pi * kx * lag / dim)))
+            np.testing.assert_allclose(dx[i], expected, rtol=0.1)
+            np.testing.assert_allclose(dy[i], expected, rtol=0.1)
+
+    def test_manager_writes_raw_memmap(self):
+        """phasescreens_manager with method='rfft' saves the screens in raw files with a JSON index"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            screens = phasescreens_manager(np.array([23.0]), 100, 0.05, tmpdir, xp=np,
+                                           precision=1, seed=[1, 2], method='rfft')
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             ['ps_seed1_dim100_pixpit0.050_L023.0000_single_rfft.json',
+                              'ps_seed1_dim100_pixpit0.050_L023.0000_single_rfft.raw',
+                              'ps_seed2_dim100_pixpit0.050_L023.0000_single_rfft.json',
+                              'ps_seed2_dim100_pixpit0.050_L023.0000_single_rfft.raw'])
+            for seed, screen in zip([1, 2], screens):
+                self.assertEqual(screen.shape, (128, 128))
+                np.testing.assert_array_equal(screen,
+                                              calc_phasescreen_rfft(23.0, 128, 0.05, precision=1, seed=seed))
+
+            basename = os.path.join(tmpdir, 'ps_seed1_dim100_pixpit0.050_L023.0000_single_rfft')
+            with open(basename + '.json') as f:
+                index = json.load(f)
+            self.assertEqual(index['shape'], [128, 128])
+            self.assertEqual(np.dtype(index['dtype']), np.float32)
+            self.assertEqual(index['seed'], 1)
+            self.assertEqual(os.path.getsize(basename + '.raw'), 128 * 128 * 4)
+
+            # Loaded from disk the second time
+            mtime = os.path.getmtime(basename + '.raw')
+            again = phasescreens_manager(np.array([23.0]), 100, 0.05, tmpdir, xp=np,
+                                         precision=1, seed=[1], method='rfft')
+            self.assertEqual(os.path.getmtime(basename + '.raw'), mtime)
+            np.testing.assert_array_equal(again[0], screens[0])
+            del screens, again
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_manager_returns_read_only_memmap(self):
+        """Screens are read-only memory maps of the same file, whatever the caller"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            screen1 = phasescreens_manager(np.array([23.0]), 64, 0.05, tmpdir, xp=np,
+                                           precision=0, seed=[5])[0]
+            screen2 = phasescreens_manager(np.array([23.0]), 64, 0.05, tmpdir, xp=np,
+                                           precision=0, seed=[5])[0]
+            self.assertIsInstance(screen1, np.memmap)
+            self.assertFalse(screen1.flags.writeable)
+            self.assertEqual(screen1.dtype, np.float64)
+            self.assertTrue(screen1.dtype.isnative)
+            self.assertEqual(screen1.filename, screen2.filename)
+            np.testing.assert_array_equal(screen1, screen2)
+            with self.assertRaises(ValueError):
+                screen1[0, 0] = 0
+            del screen1, screen2
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_manager_converts_legacy_fits(self):
+        """FITS phase screens saved by previous versions are converted and not computed again"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            legacy = np.arange(64 * 64, dtype=np.float32).reshape(64, 64)
+            fits.writeto(os.path.join(tmpdir, 'ps_seed3.0_dim64_pixpit0.050_L023.0000_single.fits'), legacy)
+            screen = phasescreens_manager(np.array([23.0]), 64, 0.05, tmpdir, xp=np,
+                                          precision=1, seed=[3])[0]
+            np.testing.assert_array_equal(screen, legacy)
+            self.assertTrue(screen.dtype.isnative)
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, 'ps_seed3_dim64_pixpit0.050_L023.0000_single.json')))
+            del screen
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_manager_unknown_method(self):
+        with self.assertRaises(ValueError):
+            phasescreens_manager(np.array([23.0]), 64, 0.05, tempfile.gettempdir(), xp=np,
+                                 precision=1, seed=[1], method='wrong')
@@ -0,0 +1,210 @@
+import specula
+specula.init(0)  # Default target device
+
+import os
+import pickle
+import tempfile
+import unittest
+from collections import OrderedDict, defaultdict
+
+import yaml
+
+from specula import np
+from specula.simul import Simul
+from specula.processing_objects.data_store import DataStore
+from specula.data_objects.simul_params import SimulParams
+from specula.processing_objects.wave_generator import WaveGenerator
+from specula.processing_objects.atmo_infinite_evolution import AtmoInfiniteEvolution
+from specula.lib.checkpoint import to_state, from_state, Checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def test_state_roundtrip(self):
+        a = np.arange(5, dtype=np.float32)
+        rng = np.random.default_rng(1)
+        storage = defaultdict(OrderedDict)
+        storage['x'][10] = np.ones(3)
+        value = {'a': a, 'rng': rng, 'storage': storage, 'n': 3, 'l': [a, None]}
+
+        state = to_state(value)
+        expected = rng.standard_normal(4)
+        a[:] = -1
+        storage['x'][20] = np.zeros(3)
+
+        restored = from_state(state, value, np)
+        # Arrays and generators are restored in place
+        assert restored['a'] is a
+        assert restored['rng'] is rng
+        np.testing.assert_array_equal(a, np.arange(5))
+        np.testing.assert_array_equal(rng.standard_normal(4), expected)
+        assert type(restored['storage']) is defaultdict
+        assert list(restored['storage']['x'].keys()) == [10]
+        assert restored['n'] == 3
+        assert restored['l'][1] is None
+
+    def test_unsupported_type(self):
+        with self.assertRaises(TypeError):
+            to_state(object())
+
+    def test_atmo_infinite_evolution_state(self):
+        '''
+        Phase screens evolved after a restore must be the same ones
+        evolved after the snapshot, including the extruded rows
+        '''
+        simul_params = SimulParams(pixel_pupil=40, pixel_pitch=0.05, time_step=0.01)
+        seeing = WaveGenerator(constant=0.65, target_device_idx=-1)
+        wind_speed = WaveGenerator(constant=[20.0, 10.0], target_device_idx=-1)
+        wind_direction = WaveGenerator(constant=[0, 120], target_device_idx=-1)
+        atmo = AtmoInfiniteEvolution(simul_params, L0=23, heights=[30.0, 10000.0],
+                                     Cn2=[0.5, 0.5], fov=0.0, seed=3, target_device_idx=-1)
+        atmo.inputs['seeing'].set(seeing.output)
+        atmo.inputs['wind_speed'].set(wind_speed.output)
+        atmo.inputs['wind_direction'].set(wind_direction.output)
+        objs = [seeing, wind_speed, wind_direction, atmo]
+        for obj in objs:
+            obj.setup()
+
+        def step(t):
+            for obj in objs:
+                obj.check_ready(atmo.seconds_to_t(t))
+                obj.trigger()
+                obj.post_trigger()
+            return [layer.phaseInNm.copy() for layer in atmo.outputs['layer_list']]
+
+        for i in range(3):
+            step(i * 0.01)
+        state = atmo.get_state()
+        expected = [step(i * 0.01) for i in range(3, 6)]
+
+        atmo.set_state(state)
+        for i in range(3, 6):
+            for phase, ref in zip(step(i * 0.01), expected[i - 3]):
+                np.testing.assert_array_equal(phase, ref)
+
+    def test_resume(self):
+        '''
+        A run resumed from a checkpoint taken half-way must
+        produce the same data as an uninterrupted run
+        '''
+        with tempfile.TemporaryDirectory() as tmpdir:
+            params = {
+                'main': {'class': 'SimulParams', 'root_dir': tmpdir,
+                         'total_time': 0.010, 'time_step': 0.001,
+                         'checkpoint_interval': 3},
+                'disturbance': {'class': 'RandomGenerator', 'amp': 1.0, 'seed': 4, 'vsize': 3},
+                'diff': {'class': 'BaseOperation', 'sub': True,
+                         'inputs': {'in_value1': 'disturbance.output',
+                                    'in_value2': 'control.out_comm:-1'},
+                         'outputs': ['out_value']},
+                'control': {'class': 'Integrator', 'simul_params_ref': 'main',
+                            'delay': 1, 'int_gain': [0.5, 0.5, 0.5],
+                            'inputs': {'delta_comm': 'diff.out_value'}},
+                'data_store': {'class': 'DataStore', 'store_dir': tmpdir,
+                               'reductions': {'stat': 'mean_var'},
+                               'inputs': {'input_list': ['res-diff.out_value',
+                                                         'comm-control.out_comm',
+                                                         'stat-diff.out_value']}},
+            }
+            yml_file = os.path.join(tmpdir, 'params.yml')
+            with open(yml_file, 'w') as f:
+                yaml.dump(params, f)
+
+            simul = Simul(yml_file)
+            simul.run()
+            full = simul.objs['data_store'].storage
+            full_mean = simul.objs['data_store'].reducers['stat'][0].mean
+
+            checkpoint_dir = os.path.join(tmpdir, 'checkpoint')
+            with open(os.path.join(checkpoint_dir, 'checkpoint.yml')) as f:
+                assert yaml.safe_load(f)['iter_counter'] == 9
+
+            # Stored values are appended to a file in the TN folder at each checkpoint,
+            # and only its size is saved in the checkpoint
+            with open(os.path.join(checkpoint_dir, 'data_store.pickle'), 'rb') as f:
+                state = pickle.load(f)
+            assert 'storage' not in state['attrs']
+            storage_file = state['storage_file']
+            assert os.path.dirname(storage_file['filename']) == simul.objs['data_store'].tn_dir
+            stored = DataStore.read_checkpoint_storage(**storage_file)
+            assert len(stored['res']) == 9
+
+            resumed = Simul(yml_file, resume=checkpoint_dir)
+            resumed.run()
+            assert resumed.loop.iter_counter == 10
+            storage = resumed.objs['data_store'].storage
+
+            for key in ['res', 'comm']:
+                assert list(storage[key].keys()) == list(full[key].keys())
+                for t in full[key]:
+                    np.testing.assert_array_equal(storage[key][t], full[key][t])
+            np.testing.assert_array_equal(resumed.objs['data_store'].reducers['stat'][0].mean, full_mean)
+
+    def _params(self, tmpdir):
+        return {
+            'main': {'class': 'SimulParams', 'root_dir': tmpdir,
+                     'total_time': 0.004, 'time_step': 0.001,
+                     'checkpoint_interval': 2},
+            'disturbance': {'class': 'RandomGenerator', 'amp': 1.0, 'seed': 4, 'vsize': 3},
+        }
+
+    def test_interrupted_save_keeps_previous_checkpoint(self):
+        '''
+        If a save is interrupted after the previous checkpoint
+        has been moved away, restore() finds it under its .old name
+        '''
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yml_file = os.path.join(tmpdir, 'params.yml')
+            with open(yml_file, 'w') as f:
+                yaml.dump(self._params(tmpdir), f)
+
+            simul = Simul(yml_file)
+            simul.run()
+            checkpoint_dir = os.path.join(tmpdir, 'checkpoint')
+            assert sorted(os.listdir(tmpdir)) == ['checkpoint', 'params.yml']
+
+            os.replace(checkpoint_dir, Checkpoint.old_dirname(checkpoint_dir))
+            resumed = Simul(yml_file, resume=checkpoint_dir)
+            resumed.run()
+            assert resumed.loop.iter_counter == 4
+
+            # The next save replaces the .old checkpoint
+            Checkpoint(resumed.objs, checkpoint_dir).save(resumed.loop)
+            assert sorted(os.listdir(tmpdir)) == ['checkpoint', 'params.yml']
+
+    def test_multiple_simulations(self):
+        '''Each simulation index has its own checkpoint, and resume needs a single simulation'''
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yml_file = os.path.join(tmpdir, 'params.yml')
+            with open(yml_file, 'w') as f:
+                yaml.dump(self._params(tmpdir), f)
+
+            simul = Simul(yml_file)
+            for simul_idx in range(2):
+                simul.reset(simul_idx=simul_idx)
+                simul.run()
+            assert os.path.exists(os.path.join(tmpdir, 'checkpoint', 'checkpoint.yml'))
+            assert os.path.exists(os.path.join(tmpdir, 'checkpoint_1', 'checkpoint.yml'))
+
+            with self.assertRaises(ValueError):
+                specula.main_simul([yml_file], nsimul=2, cpu=True,
+                                   resume=os.path.join(tmpdir, 'checkpoint'))
+
+    def test_npy_data_store_rejected(self):
+        '''Checkpoints with the npy DataStore format are rejected before the loop starts'''
+        with tempfile.TemporaryDirectory() as tmpdir:
+            params = self._params(tmpdir)
+            params['data_store'] = {'class': 'DataStore', 'store_dir': tmpdir, 'data_format': 'npy',
+                                    'inputs': {'input_list': ['dist-disturbance.output']}}
+            yml_file = os.path.join(tmpdir, 'params.yml')
+            with open(yml_file, 'w') as f:
+                yaml.dump(params, f)
+
+            simul = Simul(yml_file)
+            with self.assertRaisesRegex(ValueError, 'npy'):
+                simul.run()
+            assert not os.path.exists(os.path.join(tmpdir, 'checkpoint'))
+
+
+if __name__ == '__main__':
+    unittest.main()
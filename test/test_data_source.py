@@ -1,6 +1,7 @@
 
 
 import os
+import mmap
 import shutil
 from unittest.mock import patch, MagicMock, mock_open
 
@@ -74,7 +75,7 @@ class TestDataSource(unittest.TestCase):
 
             self.assertIn("test", ds.storage)
             self.assertEqual(ds.obj_type["test"], "BaseValue")
-            self.assertTrue(np.allclose(ds.storage["test"][1.0], np.array([10, 20])))
+            self.assertTrue(np.allclose(ds.get_frame("test", 1.0), np.array([10, 20])))
 
     def test_load_fits_success(self):
         """Test DataSource.load_fits() correctly reads FITS files using astropy."""
@@ -92,7 +93,7 @@ class TestDataSource(unittest.TestCase):
 
             self.assertIn("mydata", ds.storage)
             self.assertEqual(ds.obj_type["mydata"], "BaseValue")
-            self.assertTrue(np.allclose(ds.storage["mydata"][0.1], np.array([1, 2])))
+            self.assertTrue(np.allclose(ds.get_frame("mydata", 0.1), np.array([1, 2])))
 
     def test_loadFromFile_invalid_duplicate(self):
         """Test DataSource.loadFromFile() raises ValueError when reloading same key."""
@@ -150,8 +151,34 @@ class TestDataSource(unittest.TestCase):
         ds.outputs["sig"] = mock_output
 
         # Storage with matching current_time
-        ds.storage["sig"] = {123.4: np.array([5, 6, 7])}
+        ds.set_storage("sig", np.array([[5, 6, 7]]), np.array([123.4]))
 
         ds.trigger_code()
         mock_output.set_value.assert_called_once()
         self.assertEqual(mock_output.generation_time, ds.current_time)
+
+    def test_time_index_lookup(self):
+        """Test that frames are found for sequential, random and unsorted times."""
+        ds = DataSource(outputs=[], store_dir="/tmp")
+        times = np.array([30, 10, 20, 40], dtype=np.uint64)
+        data = np.arange(8).reshape(4, 2)
+        ds.set_storage("x", data, times)
+
+        # Sequential replay
+        for t, ref in zip([10, 20, 30, 40], [1, 2, 0, 3]):
+            np.testing.assert_array_equal(ds.get_frame("x", t), data[ref])
+        # Random access
+        np.testing.assert_array_equal(ds.get_frame("x", 20), data[2])
+        np.testing.assert_array_equal(ds.get_frame("x", 10), data[1])
+
+        with self.assertRaises(KeyError):
+            ds.get_frame("x", 15)
+
+    def test_fits_data_is_memory_mapped(self):
+        """Test that FITS data is not copied into memory at load time."""
+        self._create_test_files()
+        source = DataSource(store_dir=self.tmp_dir, outputs=['gen'], data_format='fits')
+        base = source.storage['gen']
+        while isinstance(base, np.ndarray):
+            base = base.base
+        assert isinstance(base, mmap.mmap)
@@ -92,6 +92,183 @@ class TestDataStore(unittest.TestCase):
         np.testing.assert_array_almost_equal(gen_times, ref_times)
         assert gen_times.dtype == np.uint64
 
+    @cpu_and_gpu
+    def test_data_store_npy_streaming(self, target_device_idx, xp):
+        params = {'main': {'class': 'SimulParams', 'root_dir': self.tmp_dir,
+                           'time_step': 0.1, 'total_time': 0.5},
+                  'generator': {'class': 'WaveGenerator', 'target_device_idx': target_device_idx, 'amp': 1, 'freq': 2},
+                  'store': {'class': 'DataStore', 'store_dir': self.tmp_dir,
+                            'data_format': 'npy', 'chunk_size': 2,
+                            'inputs': {'input_list': ['gen-generator.output']},
+                            }
+                  }
+        filename = os.path.join(self.tmp_dir, 'test_data_store.yaml')
+        with open(filename, 'w') as outfile:
+            yaml.dump(params, outfile)
+
+        simul = Simul(filename)
+        simul.run()
+
+        tn_dirs = sorted([d for d in os.listdir(self.tmp_dir) if d.startswith('2')])
+        last_tn_dir = os.path.join(self.tmp_dir, tn_dirs[-1])
+
+        # A single memory-mappable dataset with all time steps (5 steps, with a partial last chunk)
+        gen_data = np.load(os.path.join(last_tn_dir, 'gen.npy'), mmap_mode='r')
+        ref_data = np.sin(2 * np.pi * 2 * np.arange(5) * 0.1)[:, np.newaxis]
+        np.testing.assert_array_almost_equal(gen_data, ref_data)
+
+        gen_times = fits.getdata(os.path.join(last_tn_dir, 'gen_times.fits'))
+        assert gen_times.dtype == np.uint64
+        assert len(gen_times) == 5
+
+        # Read back with DataSource
+        from specula.processing_objects.data_source import DataSource
+        source = DataSource(outputs=['gen'], store_dir=last_tn_dir, data_format='npy')
+        source.check_ready(int(gen_times[3]))
+        source.trigger()
+        source.post_trigger()
+        np.testing.assert_array_almost_equal(source.outputs['gen'].value, ref_data[3])
+
+    @cpu_and_gpu
+    def test_data_store_reductions(self, target_device_idx, xp):
+        from scipy.signal import welch
+        from specula.processing_objects.data_source import DataSource
+
+        params = {'main': {'class': 'SimulParams', 'root_dir': self.tmp_dir,
+                           'time_step': 0.01, 'total_time': 0.64},
+                  'generator': {'class': 'RandomGenerator', 'target_device_idx': target_device_idx,
+                                'seed': 1, 'vsize': 3},
+                  'store': {'class': 'DataStore', 'store_dir': self.tmp_dir,
+                            'target_device_idx': target_device_idx,
+                            'reductions': {'red': ['mean_var', 'min_max', {'psd': {'nfft': 16}},
+                                                   {'histogram': {'bins': 10, 'range': [-3, 3]}}],
+                                           'dec': {'decimate': 4}},
+                            'inputs': {'input_list': ['raw-generator.output',
+                                                      'red-generator.output',
+                                                      'dec-generator.output']},
+                            }
+                  }
+        filename = os.path.join(self.tmp_dir, 'test_data_store.yaml')
+        with open(filename, 'w') as outfile:
+            yaml.dump(params, outfile)
+
+        simul = Simul(filename)
+        simul.run()
+
+        tn_dirs = sorted([d for d in os.listdir(self.tmp_dir) if d.startswith('2')])
+        last_tn_dir = os.path.join(self.tmp_dir, tn_dirs[-1])
+        raw = fits.getdata(os.path.join(last_tn_dir, 'raw.fits')).astype(np.float64)
+        raw_times = fits.getdata(os.path.join(last_tn_dir, 'raw.fits'), ext=1)
+        assert raw.shape == (64, 3)
+
+        # Reduced keys are not stored in full
+        assert not os.path.exists(os.path.join(last_tn_dir, 'red.fits'))
+
+        def product(name):
+            return fits.getdata(os.path.join(last_tn_dir, name + '.fits'))
+
+        np.testing.assert_allclose(product('red_mean')[0], raw.mean(axis=0), rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(product('red_var')[0], raw.var(axis=0, ddof=1), rtol=1e-4)
+        np.testing.assert_allclose(product('red_min')[0], raw.min(axis=0))
+        np.testing.assert_allclose(product('red_max')[0], raw.max(axis=0))
+
+        hist, _ = np.histogram(raw, bins=10, range=(-3, 3))
+        np.testing.assert_array_equal(product('red_hist')[0], hist)
+
+        freq, psd = welch(raw, fs=100.0, nperseg=16, axis=0)
+        np.testing.assert_allclose(product('red_psd')[0], psd, rtol=1e-3, atol=1e-7)
+        hdr = fits.getheader(os.path.join(last_tn_dir, 'red_psd.fits'))
+        assert hdr['PSD_DF'] == freq[1]
+        assert hdr['PSD_NSEG'] == 7
+        assert hdr['NSAMPLES'] == 64
+
+        # Decimated values and times
+        np.testing.assert_array_equal(product('dec'), raw[::4])
+        np.testing.assert_array_equal(fits.getdata(os.path.join(last_tn_dir, 'dec.fits'), ext=1),
+                                      raw_times[::4])
+
+        # Products can be read back with DataSource, at the time of the last sample
+        source = DataSource(outputs=['red_mean'], store_dir=last_tn_dir)
+        source.check_ready(int(raw_times[-1]))
+        source.trigger()
+        source.post_trigger()
+        np.testing.assert_allclose(source.outputs['red_mean'].value, product('red_mean')[0])
+
+    def _store_frames(self, ds, frames):
+        '''Store a list of {key: data object} dictionaries, one per time step'''
+        for i, objs in enumerate(frames):
+            ds.local_inputs = objs
+            ds.current_time = i * 10
+            for obj in objs.values():
+                obj.generation_time = ds.current_time
+            ds.trigger_code()
+        ds.tn_dir = self.tmp_dir
+        ds.save_fits()
+
+    def test_data_store_native_dtype_and_compression(self):
+        from specula.base_value import BaseValue
+        from specula.data_objects.pixels import Pixels
+        from specula.processing_objects.data_source import DataSource
+
+        rng = np.random.default_rng(1)
+        counts = rng.integers(0, 4000, size=(5, 8, 8))
+        slopes = rng.normal(size=(5, 20))
+        frames = []
+        for i in range(5):
+            pixels = Pixels(8, 8, bits=16, target_device_idx=-1)
+            pixels.set_value(counts[i])
+            frames.append({'pix': pixels, 'sl': BaseValue(value=slopes[i], target_device_idx=-1)})
+
+        ds = DataStore(store_dir=self.tmp_dir, compression='RICE_1', max_error=0.01)
+        self._store_frames(ds, frames)
+
+        with fits.open(os.path.join(self.tmp_dir, 'pix.fits')) as hdul:
+            assert isinstance(hdul[1], fits.CompImageHDU)
+            assert hdul[1].data.dtype == np.uint16
+            np.testing.assert_array_equal(hdul[1].data, counts)
+
+        source = DataSource(outputs=['pix', 'sl'], store_dir=self.tmp_dir)
+        source.check_ready(30)
+        source.trigger()
+        source.post_trigger()
+        np.testing.assert_array_equal(source.outputs['pix'].pixels, counts[3])
+        assert np.abs(source.outputs['sl'].value - slopes[3]).max() <= 0.01 + 1e-6
+
+    def test_data_store_lossless_float_compression(self):
+        from specula.base_value import BaseValue
+
+        values = np.random.default_rng(2).normal(size=(4, 30)).astype(np.float32)
+        ds = DataStore(store_dir=self.tmp_dir, compression='RICE_1', precision=1)
+        self._store_frames(ds, [{'v': BaseValue(value=v, target_device_idx=-1)} for v in values])
+        np.testing.assert_array_equal(fits.getdata(os.path.join(self.tmp_dir, 'v.fits'), ext=1), values)
+
+    def test_data_store_non_integer_pixels_stay_float(self):
+        from specula.data_objects.pixels import Pixels
+
+        pixels = Pixels(4, 4, target_device_idx=-1)
+        pixels.set_value(np.full((4, 4), 1.5))
+        ds = DataStore(store_dir=self.tmp_dir)
+        self._store_frames(ds, [{'pix': pixels}])
+        data = fits.getdata(os.path.join(self.tmp_dir, 'pix.fits'))
+        assert data.dtype.kind == 'f'
+        np.testing.assert_array_equal(data[0], 1.5)
+
+    def test_data_store_compression_errors(self):
+        with self.assertRaises(ValueError):
+            DataStore(store_dir='/tmp', data_format='pickle', compression='GZIP_2')
+        with self.assertRaises(ValueError):
+            DataStore(store_dir='/tmp', compression='ZIP')
+        with self.assertRaises(ValueError):
+            DataStore(store_dir='/tmp', max_error=0.1)
+
+    def test_data_store_unknown_reduction(self):
+        with self.assertRaises(ValueError):
+            DataStore(store_dir='/tmp', reductions={'res': 'median'})
+
+    def test_data_store_npy_split_size_not_supported(self):
+        with self.assertRaises(ValueError):
+            DataStore(store_dir='/tmp', data_format='npy', split_size=10)
+
     def test_data_store_fails_early(self):
         """Test that DataStore fails during setup() if a
         class without get_value() is set as an input"""
@@ -609,3 +609,133 @@ class TestDisplays(unittest.TestCase):
         self.assertTrue(np.all(displayed >= 1.0))  # Data is unchanged
 
         matplotlib.pyplot.close(display.fig)
+
+    @cpu_and_gpu
+    def test_render_process_publishes_snapshot(self, target_device_idx, xp):
+        """Test that a display in render process mode only publishes a snapshot"""
+        from specula.lib.shm_snapshot import ShmSnapshot
+
+        pix = Pixels(16, 16, target_device_idx=target_device_idx)
+        pix.set_value(xp.arange(256).reshape((16, 16)))
+        pix.generation_time = 1
+
+        display = PixelsDisplay(render_process=True, max_fps=5)
+        display.inputs['pixels'].set(pix)
+        display.setup()
+        display.check_ready(1)
+        display.trigger_code()
+
+        try:
+            # No figure in the simulation process
+            self.assertIsNone(display.fig)
+            self.assertFalse(display._opened)
+            self.assertIsNotNone(display._renderer)
+
+            reader = ShmSnapshot.attach(display._snapshot.name)
+            seq, generation_time, arrays = reader.read()
+            reader.close()
+            self.assertEqual(generation_time, 1)
+            np.testing.assert_array_equal(arrays[0], cpuArray(pix.pixels))
+
+            # Rate-limited: a second trigger right away is not published
+            display.check_ready(2)
+            display.trigger_code()
+            self.assertEqual(display._snapshot.seq, seq)
+        finally:
+            renderer = display._renderer
+            display.finalize()
+
+        self.assertIsNone(display._renderer)
+        self.assertFalse(renderer.is_alive())
+
+    def test_render_process_restarts_on_new_shapes(self):
+        """Test that the render process is restarted when the input values grow"""
+        from specula.lib.shm_snapshot import ShmSnapshot
+
+        pix = Pixels(16, 16, target_device_idx=-1)
+        pix.generation_time = 1
+
+        display = PixelsDisplay(render_process=True, max_fps=5)
+        display.inputs['pixels'].set(pix)
+        display.setup()
+        display.check_ready(1)
+        display.trigger_code()
+
+        try:
+            renderer = display._renderer
+            big_pix = Pixels(32, 32, target_device_idx=-1)
+            big_pix.set_value(np.arange(1024).reshape((32, 32)))
+            big_pix.generation_time = 2
+            display.inputs['pixels'].set(big_pix)
+            display._last_publish = 0
+            display.check_ready(2)
+            display.trigger_code()
+
+            self.assertIsNot(display._renderer, renderer)
+            self.assertFalse(renderer.is_alive())
+            reader = ShmSnapshot.attach(display._snapshot.name)
+            _, generation_time, arrays = reader.read()
+            reader.close()
+            self.assertEqual(generation_time, 2)
+            np.testing.assert_array_equal(arrays[0], big_pix.pixels)
+        finally:
+            display.finalize()
+
+    def test_render_process_with_profiling(self):
+        """Test that a profiled display can start its render process"""
+        from specula.lib.object_profiler import ObjectProfiler
+
+        pix = Pixels(16, 16, target_device_idx=-1)
+        pix.set_value(np.arange(256).reshape((16, 16)))
+        pix.generation_time = 1
+
+        display = PixelsDisplay(render_process=True, max_fps=5)
+        display.inputs['pixels'].set(pix)
+        display.setup()
+        profiler = ObjectProfiler(trace_memory=False)
+        display.enable_profiling(profiler)
+        try:
+            display.check_ready(1)
+            display.trigger_code()
+            self.assertIsNotNone(display._renderer)
+            # The simulation process copy is still instrumented
+            self.assertIn('check_ready', vars(display))
+            self.assertEqual(profiler.ncalls[(display.name, 'check_ready')], 1)
+        finally:
+            display.finalize()
+
+    @pytest.mark.filterwarnings('ignore:.*FigureCanvasAgg is non-interactive.*:UserWarning')
+    @pytest.mark.filterwarnings('ignore:.*Matplotlib is currently using agg*:UserWarning')
+    def test_render_loop_blit(self):
+        """Test the render loop, and that unchanged axes are blitted"""
+        import threading
+        from specula.lib.shm_snapshot import ShmSnapshot
+
+        pix = Pixels(16, 16, target_device_idx=-1)
+        pix.generation_time = 1
+
+        display = PixelsDisplay()
+        display.inputs['pixels'].set(pix)
+        display.setup()
+        display._rendering = True
+
+        snapshot = ShmSnapshot.create(None, [pix.pixels])
+        stop_event = threading.Event()
+        stop_event.set()   # Draw the last snapshot and return
+        try:
+            frame1 = np.arange(256, dtype=pix.pixels.dtype).reshape((16, 16))
+            snapshot.publish([frame1], generation_time=3)
+            display.render_loop(snapshot, stop_event)
+            np.testing.assert_array_equal(display.img.get_array(), frame1)
+            self.assertEqual(display.current_time, 3)
+            background = display._background
+            self.assertIsNotNone(background)
+
+            frame2 = frame1[::-1].copy()
+            snapshot.publish([frame2], generation_time=4)
+            display.render_loop(snapshot, stop_event)
+            np.testing.assert_array_equal(display.img.get_array(), frame2)
+            self.assertIs(display._background, background)
+        finally:
+            snapshot.close(unlink=True)
+            matplotlib.pyplot.close(display.fig)
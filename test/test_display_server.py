@@ -3,10 +3,16 @@
 import specula
 specula.init(0)  # Default target device
 
+import time
+import queue
 import unittest
 import tempfile
 
+import numpy as np
+
 from specula.simul import Simul
+from specula.base_value import BaseValue
+from specula.lib.shm_snapshot import ShmSnapshot
 
 
 class TestDisplayServer(unittest.TestCase):
@@ -38,3 +44,62 @@ class TestDisplayServer(unittest.TestCase):
         simul = Simul(yml_path)
         simul.run()
 
+    def test_publish_snapshot(self):
+        '''
+        Requested objects are copied into shared memory snapshots,
+        only when updated and at most max_rate times per second
+        '''
+        from specula.processing_objects.display_server import DisplayServer, downsample
+
+        value = BaseValue(value=np.arange(6, dtype=np.float32).reshape(2, 3), target_device_idx=-1)
+        value.generation_time = 10
+        objs = {'obj.out': value, 'obj.none': None}
+
+        def getter(name):
+            return objs[name]
+
+        disp = DisplayServer({}, getter, getter, lambda: ('test', ''), max_rate=1000)
+        # Messages are read here instead of the web server
+        disp.p.terminate()
+        disp.p.join()
+        try:
+            disp.qin.put(['obj.out', 'obj.none'])
+            time.sleep(0.1)
+            disp.trigger()
+
+            messages = {}
+            while len(messages) < 2:
+                kind, name, data = disp.qout.get(timeout=5)
+                messages[kind] = (name, data)
+            self.assertEqual(messages['text'], ('obj.none', 'This is None'))
+            name, shm_name = messages['snapshot']
+            self.assertEqual(name, 'obj.out')
+
+            reader = ShmSnapshot.attach(shm_name)
+            seq, generation_time, arrays = reader.read()
+            self.assertEqual(generation_time, 10)
+            np.testing.assert_array_equal(arrays[0], value.value)
+
+            # Not updated: no new copy
+            time.sleep(0.01)
+            disp.trigger()
+            self.assertEqual(reader.seq, seq)
+
+            value.value[:] = 1
+            value.generation_time = 20
+            time.sleep(0.01)
+            disp.trigger()
+            seq, generation_time, arrays = reader.read()
+            self.assertEqual(generation_time, 20)
+            np.testing.assert_array_equal(arrays[0], 1)
+            reader.close()
+            with self.assertRaises(queue.Empty):
+                disp.qout.get(timeout=0.1)
+        finally:
+            disp.finalize()
+
+        np.testing.assert_array_equal(downsample(np.ones((1000, 10)), 512), np.ones((500, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+
+import specula
+specula.init(0)  # Default target device
+
+from specula import np
+from specula import cpuArray
+
+from specula.base_time_obj import BaseTimeObj
+from specula.lib.calc_psf import calc_psf
+from specula.lib.fft_backend import set_fft_backend, get_fft_backend, fft_backends
+
+from test.specula_testlib import cpu_and_gpu
+
+
+class TestFFTBackend(unittest.TestCase):
+
+    def tearDown(self):
+        set_fft_backend('numpy')
+
+    def _backends(self):
+        backends = ['numpy', 'scipy']
+        try:
+            import pyfftw
+            backends.append('pyfftw')
+        except ImportError:
+            pass
+        return backends
+
+    @cpu_and_gpu
+    def test_backends_match_numpy(self, target_device_idx, xp):
+        rng = np.random.default_rng(1)
+        v = rng.normal(size=(3, 32, 48)) + 1j * rng.normal(size=(3, 32, 48))
+        v = xp.array(v.astype(np.complex64))
+
+        for norm in [None, 'ortho', 'forward']:
+            ref_fft = cpuArray(xp.fft.fft2(v, axes=(1, 2), norm=norm))
+            ref_ifft = cpuArray(xp.fft.ifft2(v, axes=(1, 2), norm=norm))
+            for backend in self._backends():
+                set_fft_backend(backend, workers=2)
+                fft = get_fft_backend(xp)
+                np.testing.assert_allclose(cpuArray(fft.fft2(v, axes=(1, 2), norm=norm)),
+                                           ref_fft, rtol=1e-4, atol=1e-3)
+                np.testing.assert_allclose(cpuArray(fft.ifft2(v, axes=(1, 2), norm=norm)),
+                                           ref_ifft, rtol=1e-4, atol=1e-6)
+
+                # Input must be left untouched when overwrite_x is not set
+                v_copy = v.copy()
+                _ = fft.fft2(v, axes=(1, 2), norm=norm)
+                np.testing.assert_array_equal(cpuArray(v), cpuArray(v_copy))
+
+                # The returned array is correct when overwrite_x is set
+                out = fft.fft2(v_copy, axes=(1, 2), norm=norm, overwrite_x=True)
+                np.testing.assert_allclose(cpuArray(out), ref_fft, rtol=1e-4, atol=1e-3)
+
+    def test_pyfftw_norms_match_numpy(self):
+        """All normalizations, including 'ortho', with the pyfftw backend"""
+        try:
+            import pyfftw
+        except ImportError:
+            self.skipTest('pyfftw is not installed')
+
+        rng = np.random.default_rng(2)
+        v = (rng.normal(size=(16, 24)) + 1j * rng.normal(size=(16, 24))).astype(np.complex128)
+        set_fft_backend('pyfftw')
+        fft = get_fft_backend(np)
+        for norm in [None, 'backward', 'ortho', 'forward']:
+            np.testing.assert_allclose(fft.fft2(v, norm=norm), np.fft.fft2(v, norm=norm), rtol=1e-10, atol=1e-10)
+            np.testing.assert_allclose(fft.ifft2(v, norm=norm), np.fft.ifft2(v, norm=norm), rtol=1e-10, atol=1e-10)
+
+    @cpu_and_gpu
+    def test_base_time_obj_uses_selected_backend(self, target_device_idx, xp):
+        obj = BaseTimeObj(target_device_idx=target_device_idx)
+        v = xp.ones((16, 16), dtype=obj.complex_dtype)
+
+        set_fft_backend('scipy', workers=2)
+        if target_device_idx < 0:
+            self.assertEqual(get_fft_backend(obj.xp).kwargs['workers'], 2)
+        np.testing.assert_allclose(cpuArray(obj.fft2(v))[0, 0], 256)
+        np.testing.assert_allclose(cpuArray(obj.ifft2(v))[0, 0], 1)
+
+    @cpu_and_gpu
+    def test_calc_psf_backend(self, target_device_idx, xp):
+        rng = np.random.default_rng(2)
+        phase = xp.array(rng.normal(size=(32, 32)).astype(np.float32))
+        amp = xp.ones((32, 32), dtype=np.float32)
+
+        ref = cpuArray(calc_psf(phase, amp, imwidth=64, xp=xp, normalize=True))
+        set_fft_backend('scipy', workers=2)
+        psf = cpuArray(calc_psf(phase, amp, imwidth=64, xp=xp, normalize=True))
+        np.testing.assert_allclose(psf, ref, rtol=1e-4, atol=1e-8)
+
+    def test_wrong_backend(self):
+        with self.assertRaises(ValueError):
+            set_fft_backend('wrong')
+        self.assertNotIn('wrong', fft_backends)
+
+    def test_missing_pyfftw(self):
+        try:
+            import pyfftw
+        except ImportError:
+            with self.assertRaises(ImportError):
+                set_fft_backend('pyfftw')
+        else:
+            self.skipTest('pyfftw is installed')
@@ -0,0 +1,34 @@
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+# Modules that must not be imported by headless simulations
+heavy_modules = ['matplotlib', 'flask', 'flask_socketio', 'orthogram', 'skimage', 'symao']
+
+script = '''
+import sys, json
+import specula
+specula.init(-1)
+import specula.simul
+from specula.processing_objects.atmo_propagation import AtmoPropagation
+from specula.processing_objects.atmo_evolution import AtmoEvolution
+from specula.processing_objects.data_store import DataStore
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+class TestImports(unittest.TestCase):
+
+    def _imported_modules(self):
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-c', script], cwd=root_dir,
+                                capture_output=True, text=True, check=True)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_no_heavy_imports(self):
+        modules = self._imported_modules()
+        for name in heavy_modules:
+            with self.subTest(module=name):
+                self.assertNotIn(name, modules)
@@ -1,5 +1,6 @@
 import unittest
 import os
+import tempfile
 import specula
 specula.init(0)  # Default target device
 
@@ -210,4 +211,86 @@ class TestInfinitePhaseScreen(unittest.TestCase):
 
         # Should still be identical after evolution
         np.testing.assert_array_equal(screen1_evolved, screen2_evolved,
-                                     "Evolved screens with same seed should remain identical")
\ No newline at end of file
+                                     "Evolved screens with same seed should remain identical")
+
+    @cpu_and_gpu
+    def test_add_lines_same_as_add_line(self, target_device_idx, xp):
+        """Batched extrusion gives the same screen as one line at a time"""
+
+        # moved here to avoid CI issues
+        from specula.data_objects.infinite_phase_screen import InfinitePhaseScreen
+
+        ips1 = InfinitePhaseScreen(64, 0.05, 0.15, 30.0, random_seed=5,
+                                   target_device_idx=target_device_idx)
+        ips2 = InfinitePhaseScreen(64, 0.05, 0.15, 30.0, random_seed=5,
+                                   target_device_idx=target_device_idx)
+
+        # Enough lines in each direction to wrap around the circular buffer
+        for row, after, n_lines in [(1, 1, 300), (0, 1, 7), (1, 0, 3), (0, 0, 280)]:
+            for _ in range(n_lines):
+                ips1.add_line(row, after)
+            ips2.add_lines(row, after, n_lines)
+            np.testing.assert_allclose(cpuArray(ips2.full_scrn), cpuArray(ips1.full_scrn), atol=1e-10)
+
+        self.assertEqual(ips2.scrn.shape, (64, 64))
+
+    @cpu_and_gpu
+    def test_add_lines_no_flush(self, target_device_idx, xp):
+        """Without flush, each line gets new random data and the last one is kept"""
+
+        # moved here to avoid CI issues
+        from specula.data_objects.infinite_phase_screen import InfinitePhaseScreen
+
+        ips1 = InfinitePhaseScreen(64, 0.05, 0.15, 30.0, random_seed=8,
+                                   target_device_idx=target_device_idx)
+        ips2 = InfinitePhaseScreen(64, 0.05, 0.15, 30.0, random_seed=8,
+                                   target_device_idx=target_device_idx)
+        ips1.add_lines(1, 1, 5)
+        ips2.add_lines(1, 1, 5, flush=False)
+        np.testing.assert_array_equal(cpuArray(ips2.full_scrn), cpuArray(ips1.full_scrn))
+        self.assertIsNone(ips1.random_data_row)
+        self.assertEqual(ips2.random_data_row.shape, (ips2.stencil_size,))
+
+    @cpu_and_gpu
+    def test_preview(self, target_device_idx, xp):
+        """preview() does not change the screen, and shows the lines added next"""
+
+        # moved here to avoid CI issues
+        from specula.data_objects.infinite_phase_screen import InfinitePhaseScreen
+
+        ips = InfinitePhaseScreen(64, 0.05, 0.15, 30.0, random_seed=6,
+                                  target_device_idx=target_device_idx)
+        ips.add_lines(1, 1, 10)
+        before = cpuArray(ips.full_scrn).copy()
+        preview = cpuArray(ips.preview([(1, 0)]))
+        np.testing.assert_array_equal(cpuArray(ips.full_scrn), before)
+
+        ips.add_line(1, 0)
+        np.testing.assert_allclose(preview, ips.scrn, atol=1e-10)
+        np.testing.assert_array_equal(preview[:, 1:], before[:64, :63])
+
+    @cpu_and_gpu
+    def test_AB_cache(self, target_device_idx, xp):
+        """A and B matrices are saved in cache_dir and loaded by the next screens"""
+
+        # moved here to avoid CI issues
+        from specula.data_objects.infinite_phase_screen import InfinitePhaseScreen
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ips1 = InfinitePhaseScreen(64, 0.05, 0.15, 30.0, random_seed=7, cache_dir=tmpdir,
+                                       target_device_idx=target_device_idx)
+            self.assertEqual(os.listdir(tmpdir), [os.path.basename(ips1.AB_cache_filename())])
+
+            ips2 = InfinitePhaseScreen(64, 0.05, 0.15, 30.0, random_seed=7, cache_dir=tmpdir,
+                                       target_device_idx=target_device_idx)
+            np.testing.assert_array_equal(cpuArray(ips2.A_mat[0]), cpuArray(ips1.A_mat[0]))
+            np.testing.assert_array_equal(cpuArray(ips2.B_mat[0]), cpuArray(ips1.B_mat[0]))
+
+            ips1.add_lines(0, 1, 5)
+            ips2.add_lines(0, 1, 5)
+            np.testing.assert_array_equal(ips2.scrn, ips1.scrn)
+
+            # A different r0 needs different matrices
+            InfinitePhaseScreen(64, 0.05, 0.2, 30.0, random_seed=7, cache_dir=tmpdir,
+                                target_device_idx=target_device_idx)
+            self.assertEqual(len(os.listdir(tmpdir)), 2)
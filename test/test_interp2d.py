@@ -68,3 +68,28 @@ class TestInterp2D(unittest.TestCase):
         interpolator = Interp2D(input_shape=(10, 10), output_shape=(5,5), rotInDeg=45, xp=xp, dtype=xp.float32)
         with self.assertRaises(ValueError):
             _ = interpolator.interpolate(xp.zeros((20,20)))
+
+    def test_interp2d_sparse_engine(self):
+        '''
+        Test that the sparse CPU engine gives the same results
+        as the default engine, also for stacks of arrays.
+        '''
+        rng = np.random.default_rng(0)
+        values = rng.normal(size=(3, 40, 50)).astype(np.float32)
+
+        kwargs = dict(input_shape=(40, 50), output_shape=(30, 35), rotInDeg=17,
+                      rowShiftInPixels=1.3, colShiftInPixels=-2.1, xp=np, dtype=np.float32)
+        ref = Interp2D(**kwargs)
+        sparse = Interp2D(engine='sparse', **kwargs)
+
+        for v in values:
+            np.testing.assert_allclose(sparse.interpolate(v), ref.interpolate(v), rtol=1e-5, atol=1e-5)
+
+        stack = sparse.interpolate_stack(values)
+        ref_stack = ref.interpolate_stack(values)
+        assert stack.shape == (3, 30, 35)
+        np.testing.assert_allclose(stack, ref_stack, rtol=1e-5, atol=1e-5)
+
+    def test_interp2d_wrong_engine(self):
+        with self.assertRaises(ValueError):
+            _ = Interp2D(input_shape=(10, 10), output_shape=(5,5), rotInDeg=45, engine='foo')
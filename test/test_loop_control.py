@@ -6,6 +6,8 @@ import unittest
 
 from specula.loop_control import LoopControl
 from specula.base_processing_obj import BaseProcessingObj
+from specula.base_value import BaseValue
+from specula.connections import InputValue
 
 from test.specula_testlib import cpu_and_gpu
 
@@ -40,6 +42,36 @@ class MockProcessingObjReady(BaseProcessingObj):
         self.post_triggered = True
 
 
+class MockProducer(BaseProcessingObj):
+    '''Class without inputs that updates its output every *period* steps'''
+
+    def __init__(self, period, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.period = period
+        self.counter = 0
+        self.outputs['out_value'] = BaseValue(value=0, target_device_idx=-1)
+
+    def trigger_code(self):
+        if self.counter % self.period == 0:
+            self.outputs['out_value'].value = self.counter
+            self.outputs['out_value'].generation_time = self.current_time
+        self.counter += 1
+
+
+class MockConsumer(BaseProcessingObj):
+    '''Class with a single input, that counts how many times it has been triggered'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.inputs['in_value'] = InputValue(type=BaseValue)
+        self.ntriggers = 0
+        self.trigger_times = []
+
+    def trigger_code(self):
+        self.ntriggers += 1
+        self.trigger_times.append(self.current_time_seconds)
+
+
 class TestLoopControl(unittest.TestCase):
 
     @cpu_and_gpu
@@ -68,3 +100,109 @@ class TestLoopControl(unittest.TestCase):
 
 
 
+
+    def test_parallel_levels(self):
+        '''Test that all objects in a level are triggered when using a thread pool'''
+
+        loop = LoopControl(parallel_levels=4)
+        objs = [MockProcessingObjReady(target_device_idx=-1) for _ in range(6)]
+        for obj in objs:
+            loop.add(obj, idx=0)
+        loop.run(run_time=1, dt=1)
+
+        for obj in objs:
+            assert obj.triggered
+            assert obj.post_triggered
+        # Thread pool must have been released
+        assert loop._executor is None
+
+    def test_parallel_levels_exception(self):
+        '''Test that exceptions raised in worker threads are reported in trigger order'''
+
+        class MockProcessingObjRaising(MockProcessingObjReady):
+            def trigger(self):
+                raise ValueError(self.name)
+
+        loop = LoopControl(parallel_levels=4)
+        objs = [MockProcessingObjReady(target_device_idx=-1),
+                MockProcessingObjRaising(target_device_idx=-1),
+                MockProcessingObjRaising(target_device_idx=-1)]
+        for i, obj in enumerate(objs):
+            obj.name = f'obj{i}'
+            loop.add(obj, idx=0)
+
+        with self.assertRaisesRegex(ValueError, 'obj1'):
+            loop.run(run_time=1, dt=1)
+        # Thread pool must have been released
+        assert loop._executor is None
+
+    def test_event_driven_skip(self):
+        '''Test that event-driven objects are skipped when their inputs have not been
+        updated, and triggered exactly as often as when they are always checked'''
+
+        ntriggers = {}
+        for event_driven in [False, True]:
+            loop = LoopControl()
+            producer = MockProducer(period=5, target_device_idx=-1)
+            consumer = MockConsumer(target_device_idx=-1)
+            consumer.inputs['in_value'].set(producer.outputs['out_value'])
+            if event_driven:
+                assert consumer.enable_event_driven()
+                # Objects without inputs are never skipped
+                assert not producer.enable_event_driven()
+            loop.add(producer, idx=0)
+            loop.add(consumer, idx=1)
+            loop.run(run_time=20, dt=1)
+            ntriggers[event_driven] = consumer.ntriggers
+            if event_driven:
+                assert loop.skipped_counter == 16
+
+        assert ntriggers[True] == ntriggers[False] == 4
+
+    def test_event_driven_not_enabled_for_remote_inputs(self):
+        '''Test that objects with remote inputs are never skipped'''
+        consumer = MockConsumer(target_device_idx=-1)
+        consumer.inputs['in_value'].set(None, remote_rank=1, tag=0)
+        assert not consumer.enable_event_driven()
+
+    def test_trigger_period_jumps(self):
+        '''Test that the loop jumps directly to the trigger times of periodic objects'''
+
+        loop = LoopControl()
+        producer = MockProducer(period=1, target_device_idx=-1)
+        producer.set_trigger_period(5, phase=2)
+        consumer = MockConsumer(target_device_idx=-1)
+        consumer.inputs['in_value'].set(producer.outputs['out_value'])
+        consumer.enable_event_driven()
+        loop.add(producer, idx=0)
+        loop.add(consumer, idx=1)
+        loop.run(run_time=20, dt=1)
+
+        assert consumer.trigger_times == [2, 7, 12, 17]
+        assert producer.outputs['out_value'].generation_time == producer.seconds_to_t(17)
+        # Steps 0, 2, 7, 12 and 17 are executed, all others are jumped over
+        assert loop.iter_counter == 20
+        assert loop.jumped_counter == 15
+
+    def test_trigger_period_without_jumps(self):
+        '''Test that periodic objects run at their trigger times
+        when other objects prevent the loop from jumping'''
+
+        loop = LoopControl()
+        producer = MockProducer(period=1, target_device_idx=-1)
+        producer.set_trigger_period(5, phase=2)
+        always_ready = MockProcessingObjReady()
+        consumer = MockConsumer(target_device_idx=-1)
+        consumer.inputs['in_value'].set(producer.outputs['out_value'])
+        loop.add(producer, idx=0)
+        loop.add(always_ready, idx=0)
+        loop.add(consumer, idx=1)
+        loop.run(run_time=20, dt=1)
+
+        assert consumer.trigger_times == [2, 7, 12, 17]
+        assert loop.jumped_counter == 0
+
+    def test_trigger_period_invalid(self):
+        p = MockProducer(period=1, target_device_idx=-1)
+        with self.assertRaises(ValueError):
+            p.set_trigger_period(0)
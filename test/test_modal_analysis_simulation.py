@@ -18,7 +18,7 @@ class TestModalAnalysisSimulation(unittest.TestCase):
         os.makedirs(self.datadir, exist_ok=True)
         os.makedirs(self.outputdir, exist_ok=True)
         self.phasescreen_path = os.path.join(self.calibdir, 'phasescreens',
-                                   'ps_seed1_dim2048_pixpit0.301_L025.0000_single.fits')
+                                   'ps_seed1_dim2048_pixpit0.301_L025.0000_single')
         self.cwd = os.getcwd()
 
     def tearDown(self):
@@ -27,8 +27,9 @@ class TestModalAnalysisSimulation(unittest.TestCase):
         for data_dir in data_dirs:
             if os.path.isdir(data_dir):
                 shutil.rmtree(data_dir)
-        if os.path.exists(self.phasescreen_path):
-            os.remove(self.phasescreen_path)
+        for ext in ['.raw', '.json']:
+            if os.path.exists(self.phasescreen_path + ext):
+                os.remove(self.phasescreen_path + ext)
         os.chdir(self.cwd)
 
     def test_modal_analysis_simulation(self):
@@ -0,0 +1,126 @@
+import specula
+specula.init(0)  # Default target device
+
+import unittest
+from collections import defaultdict, deque
+
+from specula import np
+from specula.base_value import BaseValue
+from specula.lib.mpi_transport import PacketBuffer, SendPacket, RecvPacket, PACKET_TAG_BASE
+
+
+class _LoopbackRequest():
+    '''Persistent request of _LoopbackComm'''
+    def __init__(self, comm, buf, tag, send):
+        self.comm = comm
+        self.buf = buf
+        self.tag = tag
+        self.send = send
+        self.cancelled = False
+
+    def Start(self):
+        if self.send:
+            self.comm.queues[self.tag].append(self.buf.copy())
+
+    def Wait(self):
+        if not self.send and not self.cancelled:
+            self.buf[...] = self.comm.queues[self.tag].popleft()
+
+    def Cancel(self):
+        self.cancelled = True
+
+    def Free(self):
+        self.comm.freed += 1
+
+
+class _LoopbackComm():
+    '''
+    Single-process communicator where every message is sent to ourselves.
+    Only the calls used by the batched transport are implemented.
+    '''
+    def __init__(self):
+        self.queues = defaultdict(deque)
+        self.freed = 0
+
+    def ibsend(self, obj, dest, tag):
+        self.queues[tag].append(obj)
+
+    def recv(self, source, tag):
+        return self.queues[tag].popleft()
+
+    def Send_init(self, buf, dest, tag):
+        return _LoopbackRequest(self, buf, tag, send=True)
+
+    def Recv_init(self, buf, source, tag):
+        return _LoopbackRequest(self, buf, tag, send=False)
+
+
+class TestMPITransport(unittest.TestCase):
+
+    def test_packet_buffer_layout(self):
+        layout = [((3, 5), 'float32'), ((7,), 'complex128'), ((2, 2), 'int16')]
+        packet = PacketBuffer(layout)
+        values = [np.arange(15, dtype=np.float32).reshape(3, 5),
+                  np.arange(7) * (1 + 2j),
+                  np.array([[1, -2], [3, -4]], dtype=np.int16)]
+        for i, v in enumerate(values):
+            packet.pack(i, v, generation_time=100 + i)
+
+        copy = PacketBuffer(layout)
+        copy.buf[...] = packet.buf
+        for i, v in enumerate(values):
+            np.testing.assert_array_equal(copy.views[i], v)
+            assert copy.views[i].dtype == v.dtype
+            assert copy.views[i].ctypes.data % 64 == 0
+            assert copy.gen_times[i] == 100 + i
+
+    def test_packet_rejects_changed_shape(self):
+        packet = PacketBuffer([((4,), 'float32')])
+        with self.assertRaises(ValueError):
+            packet.pack(0, np.zeros(5, dtype=np.float32), 0)
+
+    def test_send_recv_packets(self):
+        comm = _LoopbackComm()
+        tag = PACKET_TAG_BASE
+        a = BaseValue(value=np.zeros((4, 4), dtype=np.float32), target_device_idx=-1)
+        b = BaseValue(value=np.zeros(3, dtype=np.float64), target_device_idx=-1)
+        outputs = {'a': a, 'b': b}
+
+        send = SendPacket(comm, dest_rank=0, tag=tag, delayed=False)
+        send.add('a', 10)
+        send.add('b', 20)
+        recv = RecvPacket(comm, source_rank=0, tag=tag)
+        assert recv.add() == 0
+        assert recv.add() == 1
+
+        # Outputs must have been sent once before switching to packets
+        assert not send.can_start(outputs, sent_valid={10: True})
+        assert send.can_start(outputs, sent_valid={10: True, 20: True})
+
+        send.start(outputs)
+        recv.setup()
+
+        for t in range(3):
+            a.value[:] = t
+            b.value[:] = -t
+            a.generation_time = t
+            b.generation_time = t + 1
+            send.send(outputs)
+
+            value, gen_time = recv.get(1)
+            np.testing.assert_array_equal(value, -t)
+            assert gen_time == t + 1
+            recv.release(1)
+            value, gen_time = recv.get(0)
+            np.testing.assert_array_equal(value, t)
+            assert gen_time == t
+            recv.release(0)
+
+        send.close()
+        recv.close()
+        assert comm.freed == 2
+        assert len(comm.queues[tag]) == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+
+import specula
+specula.init(0)  # Default target device
+
+import os
+import json
+import shutil
+import unittest
+from unittest import mock
+
+from specula.loop_control import LoopControl
+from specula.base_processing_obj import BaseProcessingObj
+from specula.lib.object_profiler import ObjectProfiler
+
+from test.specula_testlib import cpu_and_gpu
+
+
+class AllocatingObj(BaseProcessingObj):
+    '''Object without inputs (always triggered) that allocates memory in trigger_code()'''
+
+    def trigger_code(self):
+        self.buf = self.xp.ones(100000, dtype=self.dtype)
+
+
+class TestObjectProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = os.path.join(os.path.dirname(__file__), 'tmp_object_profiler')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    @cpu_and_gpu
+    def test_profile_report(self, target_device_idx, xp):
+        prefix = os.path.join(self.tmp_dir, 'profile')
+        profiler = ObjectProfiler(output_prefix=prefix)
+        loop = LoopControl(profiler=profiler)
+        obj = AllocatingObj(target_device_idx=target_device_idx)
+        obj.name = 'alloc'
+        loop.add(obj, idx=0)
+        loop.run(run_time=3, dt=1)
+
+        for method in ObjectProfiler.methods:
+            assert profiler.ncalls[('alloc', method)] == 3
+
+        if target_device_idx < 0:
+            # 100000 elements of 4 or 8 bytes each
+            assert profiler.total_bytes[('alloc', 'trigger')] >= 3 * 100000 * 4
+
+        assert os.path.exists(prefix + '.txt')
+        with open(prefix + '.json') as f:
+            trace = json.load(f)
+        names = set(ev['name'] for ev in trace['traceEvents'])
+        assert names == set(ObjectProfiler.methods)
+        assert 'alloc' in profiler.summary()
+
+    def test_memory_without_reset_peak(self):
+        """Python 3.8 has no tracemalloc.reset_peak(): the net allocation is measured"""
+        with mock.patch('specula.lib.object_profiler._has_reset_peak', False):
+            profiler = ObjectProfiler(output_prefix=os.path.join(self.tmp_dir, 'profile'))
+            loop = LoopControl(profiler=profiler)
+            obj = AllocatingObj(target_device_idx=-1)
+            obj.name = 'alloc'
+            loop.add(obj, idx=0)
+            loop.run(run_time=1, dt=1)
+
+        # The buffer allocated by the first call is still referenced
+        assert profiler.ncalls[('alloc', 'trigger')] == 1
+        assert profiler.total_bytes[('alloc', 'trigger')] >= 100000 * 4
@@ -0,0 +1,74 @@
+import specula
+specula.init(0)  # Default target device
+
+import os
+import tempfile
+import unittest
+
+import yaml
+
+from specula import np
+from specula.simul import Simul
+from specula.base_value import BaseValue
+from specula.data_objects.recmat import Recmat
+from specula.processing_objects.modalrec import Modalrec
+from specula.lib.plan import object_bytes, fft_flops, matmul_flops
+
+from test.specula_testlib import cpu_and_gpu
+
+
+class TestPlan(unittest.TestCase):
+
+    def test_flop_counts(self):
+        assert fft_flops((4, 4)) == 5 * 16 * 4
+        assert fft_flops((4, 4), batch=3) == 3 * 5 * 16 * 4
+        assert matmul_flops(10, 20) == 400
+
+    def test_shared_memory_counted_once(self):
+        a = np.zeros(1000, dtype=np.float32)
+        v1 = BaseValue(target_device_idx=-1)
+        v2 = BaseValue(target_device_idx=-1)
+        v1.value = a
+        v2.value = a[10:20]
+
+        seen = set()
+        assert object_bytes(v1, seen) == (4000, 0)
+        assert object_bytes(v2, seen) == (0, 0)
+
+    @cpu_and_gpu
+    def test_modalrec_flops(self, target_device_idx, xp):
+        recmat = Recmat(xp.zeros((30, 100)), target_device_idx=target_device_idx)
+        rec = Modalrec(recmat=recmat, target_device_idx=target_device_idx)
+        assert rec.estimate_flops() == {'matmul': 2 * 30 * 100}
+
+    def test_plan_does_not_run(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            params = {
+                'main': {'class': 'SimulParams', 'root_dir': tmpdir,
+                         'total_time': 0.010, 'time_step': 0.001},
+                'disturbance': {'class': 'RandomGenerator', 'amp': 1.0, 'seed': 4, 'vsize': 100},
+                'control': {'class': 'Integrator', 'simul_params_ref': 'main',
+                            'int_gain': [0.5] * 100,
+                            'inputs': {'delta_comm': 'disturbance.output'}},
+                'data_store': {'class': 'DataStore', 'store_dir': tmpdir,
+                               'inputs': {'input_list': ['comm-control.out_comm']}},
+            }
+            yml_file = os.path.join(tmpdir, 'params.yml')
+            with open(yml_file, 'w') as f:
+                yaml.dump(params, f)
+
+            simul = Simul(yml_file, plan=True)
+            simul.run()
+
+            plan = simul.simulation_plan
+            assert plan.niters == 10
+            names = [entry.name for entry in plan.entries]
+            assert set(names) == {'main', 'disturbance', 'control', 'data_store'}
+            assert 'control' in plan.report()
+            assert simul.loop.iter_counter == 0
+            # No data has been saved
+            assert os.listdir(tmpdir) == ['params.yml']
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,7 +19,7 @@ class TestPyramidSimulation(unittest.TestCase):
         # Make sure the calib directory exists
         os.makedirs(os.path.join(self.calibdir, 'phasescreens'), exist_ok=True)
         self.phasescreen_path = os.path.join(self.calibdir, 'phasescreens',
-                                   'ps_seed1_dim1024_pixpit0.050_L025.0000_single.fits')
+                                   'ps_seed1_dim1024_pixpit0.050_L025.0000_single')
         
         # Get current working directory
         self.cwd = os.getcwd()
@@ -31,8 +31,9 @@ class TestPyramidSimulation(unittest.TestCase):
         for data_dir in data_dirs:
             if os.path.isdir(data_dir) and os.path.exists(f"{data_dir}/intensity1.fits"):
                 shutil.rmtree(data_dir)
-        if os.path.exists(self.phasescreen_path):
-            os.remove(self.phasescreen_path)
+        for ext in ['.raw', '.json']:
+            if os.path.exists(self.phasescreen_path + ext):
+                os.remove(self.phasescreen_path + ext)
 
         # Change back to original directory
         os.chdir(self.cwd)
@@ -32,7 +32,7 @@ class TestShSimulation(unittest.TestCase):
         self.sn_path = os.path.join(self.calibdir, 'slopenulls', 'scao_sn_n8_th0.5.fits')
         self.rec_path = os.path.join(self.calibdir, 'rec', 'scao_rec_n8_th0.5.fits')
         self.phasescreen_path = os.path.join(self.calibdir, 'phasescreens',
-                                   'ps_seed1_dim1024_pixpit0.016_L025.0000_single.fits')
+                                   'ps_seed1_dim1024_pixpit0.016_L025.0000_single')
 
         # Copy reference calibration files
         if os.path.exists(self.subap_ref_path):
@@ -61,8 +61,9 @@ class TestShSimulation(unittest.TestCase):
             os.remove(self.subap_path)
         if os.path.exists(self.rec_path):
             os.remove(self.rec_path)
-        if os.path.exists(self.phasescreen_path):
-            os.remove(self.phasescreen_path)
+        for ext in ['.raw', '.json']:
+            if os.path.exists(self.phasescreen_path + ext):
+                os.remove(self.phasescreen_path + ext)
 
         # Change back to original directory
         os.chdir(self.cwd)
@@ -0,0 +1,99 @@
+import os
+import unittest
+import multiprocessing
+
+import numpy as np
+
+import specula
+specula.init(0)  # Default target device
+
+from specula.lib.shm_snapshot import ShmSnapshot
+from test.specula_testlib import cpu_and_gpu
+
+STRESS_SNAPSHOTS = 20000
+
+
+def _stress_writer(name):
+    '''Publish STRESS_SNAPSHOTS arrays filled with their generation time'''
+    writer = ShmSnapshot.attach(name)
+    for i in range(1, STRESS_SNAPSHOTS + 1):
+        writer.publish([np.full(1000, i, dtype=np.int64)], generation_time=i)
+    writer.close()
+
+
+class TestShmSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.name = f'sptestsnap{os.getpid():x}'
+
+    @cpu_and_gpu
+    def test_publish_and_read(self, target_device_idx, xp):
+        a = xp.arange(12, dtype=xp.float32).reshape(3, 4)
+        b = xp.array([1, 2, 3], dtype=xp.uint16)
+        writer = ShmSnapshot.create(self.name, [a, b])
+        reader = ShmSnapshot.attach(self.name)
+        try:
+            # Nothing published yet
+            self.assertIsNone(reader.read())
+
+            writer.publish([a, b], generation_time=1234)
+            seq, generation_time, arrays = reader.read()
+            self.assertEqual(generation_time, 1234)
+            self.assertEqual(len(arrays), 2)
+            np.testing.assert_array_equal(arrays[0], specula.cpuArray(a))
+            np.testing.assert_array_equal(arrays[1], [1, 2, 3])
+            self.assertEqual(arrays[1].dtype, np.uint16)
+
+            # Snapshots are copies, and the sequence number changes at each publish
+            writer.publish([a * 2, b], generation_time=1235)
+            np.testing.assert_array_equal(arrays[0], specula.cpuArray(a))
+            self.assertGreater(reader.read()[0], seq)
+        finally:
+            reader.close()
+            writer.close(unlink=True)
+
+    def test_fits(self):
+        writer = ShmSnapshot.create(self.name, [np.zeros(100)])
+        try:
+            self.assertTrue(writer.fits([np.zeros(10, dtype=np.float32)]))
+            self.assertFalse(writer.fits([np.zeros(200)]))
+            self.assertFalse(writer.fits([np.zeros(1)] * 20))
+        finally:
+            writer.close(unlink=True)
+
+    def test_read_during_publish(self):
+        '''A reader never returns a snapshot that is being written'''
+        writer = ShmSnapshot.create(self.name, [np.zeros(10)])
+        try:
+            writer.publish([np.zeros(10)])
+            writer.header[0] += 1   # As in the middle of publish()
+            self.assertIsNone(writer.read())
+        finally:
+            writer.close(unlink=True)
+
+    def test_stress(self):
+        '''Snapshots read while another process publishes are never mixed'''
+        snapshot = ShmSnapshot.create(self.name, [np.zeros(1000, dtype=np.int64)])
+        multiprocessing.resource_tracker.ensure_running()
+        writer = multiprocessing.get_context('spawn').Process(target=_stress_writer, args=(self.name,))
+        writer.start()
+        try:
+            nread = 0
+            generation_time = 0
+            while generation_time < STRESS_SNAPSHOTS:
+                data = snapshot.read()
+                if data is None:
+                    self.assertTrue(writer.is_alive() or snapshot.read() is not None)
+                    continue
+                _, generation_time, arrays = data
+                np.testing.assert_array_equal(arrays[0], generation_time)
+                nread += 1
+            self.assertGreater(nread, 0)
+        finally:
+            writer.join(timeout=10)
+            snapshot.close(unlink=True)
+        self.assertEqual(writer.exitcode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
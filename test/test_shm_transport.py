@@ -0,0 +1,144 @@
+import os
+import glob
+import time
+import shutil
+import unittest
+import multiprocessing
+
+import yaml
+import numpy as np
+from astropy.io import fits
+
+import specula
+specula.init(0)  # Default target device
+
+from specula.lib.shm_transport import ShmComm, ShmChannel, MSG_ARRAY
+
+STRESS_MESSAGES = 20000
+
+
+def _stress_sender(name):
+    '''Send STRESS_MESSAGES arrays filled with their index'''
+    channel = ShmChannel.attach(name)
+    for i in range(STRESS_MESSAGES):
+        while not channel.can_write():
+            time.sleep(0)
+        channel.write(MSG_ARRAY, np.full(64, i, dtype=np.int64), generation_time=i)
+    channel.close()
+
+
+class TestShmTransport(unittest.TestCase):
+
+    def setUp(self):
+        sync = (multiprocessing.Lock(), multiprocessing.Value('q', 0, lock=False),
+                multiprocessing.Value('q', 0, lock=False))
+        prefix = f'sptest{os.getpid():x}'
+        self.comm0 = ShmComm(0, 2, prefix, sync)
+        self.comm1 = ShmComm(1, 2, prefix, sync)
+
+    def tearDown(self):
+        self.comm1.close()
+        self.comm0.close()
+
+    def test_channel_stress(self):
+        '''Every message received from another process is complete'''
+        name = f'sptest{os.getpid():x}stress'
+        channel = ShmChannel.create(name, nslots=2, slot_size=1024)
+        multiprocessing.resource_tracker.ensure_running()
+        sender = multiprocessing.get_context('spawn').Process(target=_stress_sender, args=(name,))
+        sender.start()
+        try:
+            for i in range(STRESS_MESSAGES):
+                while not channel.can_read():
+                    self.assertTrue(sender.is_alive() or channel.can_read())
+                    time.sleep(0)
+                kind, data, generation_time = channel.read()
+                self.assertEqual(kind, MSG_ARRAY)
+                self.assertEqual(generation_time, i)
+                self.assertTrue(np.all(data == i), f'Message {i} received before being written')
+                del data
+                channel.release()
+        finally:
+            sender.join(timeout=10)
+            channel.close(unlink=True)
+        self.assertEqual(sender.exitcode, 0)
+
+    def test_pickle_and_values(self):
+        self.comm0.ibsend({'a': 1}, dest=1, tag=10)
+        self.assertEqual(self.comm1.recv(source=0, tag=10), {'a': 1})
+
+        v = np.arange(12, dtype=np.float32).reshape(3, 4)
+        self.comm0.send_value(v, 1234, dest=1, tag=11)
+        data, gen_time = self.comm1.recv_value(source=0, tag=11)
+        np.testing.assert_array_equal(data, v)
+        self.assertEqual(data.dtype, np.float32)
+        self.assertEqual(gen_time, 1234)
+        self.comm1.release(source=0, tag=11)
+
+        buffer = np.zeros((3, 4), dtype=np.float32)
+        self.comm0.Ibsend(v * 2, dest=1, tag=12)
+        self.comm1.Recv(buffer, source=0, tag=12)
+        np.testing.assert_array_equal(buffer, v * 2)
+
+    def test_sends_do_not_block(self):
+        '''More messages than slots are queued and delivered in order'''
+        for i in range(5):
+            self.comm0.send_value(np.full(4, i, dtype=np.int32), i, dest=1, tag=1)
+        self.assertEqual(len(self.comm0.pending[(1, 1)]), 3)
+
+        for i in range(5):
+            # Receiving frees slots, but queued messages are
+            # only written when the sender makes progress
+            self.comm0.progress()
+            data, gen_time = self.comm1.recv_value(source=0, tag=1)
+            np.testing.assert_array_equal(data, i)
+            self.assertEqual(gen_time, i)
+            self.comm1.release(source=0, tag=1)
+
+    def test_large_message(self):
+        '''Messages larger than a slot use a separate segment'''
+        small = np.zeros(10, dtype=np.float64)
+        large = np.arange(200000, dtype=np.float64)
+        self.comm0.send_value(small, 0, dest=1, tag=2)
+        self.comm0.send_value(large, 1, dest=1, tag=2)
+        channel = self.comm0.send_channels[(1, 2)]
+        self.assertLess(channel.slot_size, large.nbytes)
+
+        for expected in [small, large]:
+            data, _ = self.comm1.recv_value(source=0, tag=2)
+            np.testing.assert_array_equal(data, expected)
+            self.comm1.release(source=0, tag=2)
+
+
+class TestProcsSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = os.path.join(os.path.dirname(__file__), 'tmp_shm_transport')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_two_processes(self):
+        '''Objects on two local processes give the same result as a single process'''
+        params = {'main': {'class': 'SimulParams', 'root_dir': self.tmp_dir,
+                           'time_step': 0.1, 'total_time': 1.0},
+                  'generator': {'class': 'WaveGenerator', 'amp': 1, 'freq': 2,
+                                'target_device_idx': -1, 'target_rank': 0},
+                  'store': {'class': 'DataStore', 'store_dir': self.tmp_dir,
+                            'target_rank': 1,
+                            'inputs': {'input_list': ['gen-generator.output']},
+                            }
+                  }
+        filename = os.path.join(self.tmp_dir, 'test_shm_transport.yml')
+        with open(filename, 'w') as outfile:
+            yaml.dump(params, outfile)
+
+        specula.main_simul([filename], cpu=True, procs=2)
+
+        gen_file = glob.glob(os.path.join(self.tmp_dir, '2*', 'gen.fits'))[0]
+        gen_data = fits.getdata(gen_file)
+        gen_times = fits.getdata(gen_file, ext=1)
+        t = gen_times / 1e9
+        np.testing.assert_allclose(gen_data.ravel(), np.sin(2 * np.pi * 2 * t), atol=1e-5)
+        self.assertEqual(len(gen_times), 10)
@@ -245,3 +245,111 @@ class TestSimul(unittest.TestCase):
         assert 'dm2' not in params
 
 
+
+    def test_prune(self):
+        yml = '''
+        main:
+          class: 'SimulParams'
+          keep: ['psf2.out_sr']
+
+        pupilstop:
+          class: 'Pupilstop'
+          simul_params_ref: 'main'
+
+        gen:
+          class: 'WaveGenerator'
+
+        control:
+          class: 'Integrator'
+          simul_params_ref: 'main'
+          inputs:
+            delta_comm: 'gen.output'
+            gain_mod: 'feedback.output:-1'
+
+        feedback:
+          class: 'WaveGenerator'
+
+        psf1:
+          class: 'PSF'
+          simul_params_ref: 'main'
+          inputs:
+            in_ef: 'prop.out_ef'
+
+        psf2:
+          class: 'PSF'
+          simul_params_ref: 'main'
+          inputs:
+            in_ef: 'prop.out_ef'
+
+        prop:
+          class: 'AtmoPropagation'
+          pupilstop_ref: 'pupilstop'
+
+        display:
+          class: 'PlotDisplay'
+          inputs:
+            value: 'psf1.out_sr'
+
+        data_store:
+          class: 'DataStore'
+          store_dir: 'dummy'
+          inputs:
+            input_list: ['comm-control.out_comm']
+        '''
+        simul = Simul([])
+        params = yaml.safe_load(yml)
+        removed = simul.prune(params)
+
+        assert sorted(removed) == ['display', 'psf1']
+        assert sorted(params.keys()) == ['control', 'data_store', 'feedback', 'gen',
+                                         'main', 'prop', 'psf2', 'pupilstop']
+
+    def test_prune_unknown_keep(self):
+        params = {'main': {'class': 'SimulParams', 'keep': ['missing.output']},
+                  'gen': {'class': 'WaveGenerator'}}
+        simul = Simul([])
+        with self.assertRaises(ValueError):
+            simul.prune(params)
+
+    def test_reset_reuses_data_objects(self):
+        '''
+        Test that reusable data objects restored by a previous run
+        share the same arrays after reset(), while being different objects
+        '''
+        import os
+        import tempfile
+        import numpy as np
+        from specula.calib_manager import CalibManager
+        from specula.data_objects.m2c import M2C
+
+        with tempfile.TemporaryDirectory() as root_dir:
+            filename = CalibManager(root_dir).filename('M2C', 'test_m2c')
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            M2C(np.arange(12, dtype=np.float32).reshape(3, 4), target_device_idx=-1).save(filename)
+
+            yml = f'''
+            main:
+              class: 'SimulParams'
+              root_dir: {root_dir}
+
+            m2c:
+              class: 'M2C'
+              tag: 'test_m2c'
+              target_device_idx: -1
+            '''
+            simul = Simul([])
+            simul.build_objects(yaml.safe_load(yml))
+            m2c1 = simul.objs['m2c']
+
+            # Reassigning an attribute must not affect the next run
+            m2c1.m2c = m2c1.m2c * 2
+
+            simul.reset(simul_idx=1)
+            self.assertEqual(simul.objs, {})
+            self.assertEqual(simul.simul_idx, 1)
+            simul.build_objects(yaml.safe_load(yml))
+            m2c2 = simul.objs['m2c']
+
+            self.assertIsNot(m2c1, m2c2)
+            np.testing.assert_array_equal(m2c2.m2c, np.arange(12).reshape(3, 4))
+            self.assertTrue(np.shares_memory(m2c2.m2c, simul.reuse_cache[(M2C, filename, -1)].m2c))